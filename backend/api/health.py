@@ -0,0 +1,23 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from core.embeddings import is_model_ready
+
+# Create router
+router = APIRouter()
+
+@router.get("/api/health")
+async def health():
+    """
+    Liveness check; answers as soon as the process is serving requests.
+    """
+    return {"status": "ok"}
+
+@router.get("/api/ready")
+async def ready():
+    """
+    Readiness check; reports ready only after startup warmup has initialized
+    the vector store and run the embedding model on a dummy batch.
+    """
+    if not is_model_ready():
+        return JSONResponse(status_code=503, content={"status": "warming_up"})
+    return {"status": "ready"}
@@ -1,54 +1,165 @@
-from fastapi import APIRouter, HTTPException
-from models.qa import QuestionAnswerRequest, QuestionAnswerResponse, Citation
+import json
+import time
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from core.config import settings
+from core.embeddings import get_query_embedding_async
+from core.metrics import timed, record_stage, CACHE_REQUESTS
+from models.qa import QuestionAnswerRequest, QuestionAnswerResponse
 from models.search import SimilaritySearchRequest
-from services.openai_service import generate_answer
-from api.search import similarity_search
+from services.openai_service import generate_answer, stream_answer, ANSWER_MODEL, PROMPT_VERSION
+from services.answer_cache import answer_cache, semantic_answer_cache
+from services.context_builder import build_context
+from services.usage_counter import record_chunk_hits
+from api.search import run_search
 
 # Create router
 router = APIRouter()
 
+NO_RESULTS_ANSWER = "I couldn't find any relevant information to answer your question."
+
+async def retrieve_context(request):
+    """Find chunks relevant to a question and build the LLM context from them
+    
+    Args:
+        request (QuestionAnswerRequest): The question request
+        
+    Returns:
+        tuple: (context string, list of Citation, list of (chunk id, chunk text),
+            dict of context token metrics), with empty values if nothing matched
+    """
+    search_request = SimilaritySearchRequest(
+        query=request.question,
+        k=request.k,
+        min_score=request.min_score,
+        filters=request.filters,
+        mode=request.mode
+    )
+    
+    try:
+        search_response = await run_search(search_request)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error performing similarity search: {str(e)}")
+    
+    # Pack the best results into the context within the token budget
+    with timed("build_context"):
+        context, citations, chunks, metrics = build_context(search_response.results)
+    
+    # Only the chunks the answer is built from count as used
+    record_chunk_hits(chunk_id for chunk_id, _ in chunks)
+    return context, citations, chunks, metrics
+
+def context_headers(metrics):
+    """Report context packing metrics as response headers
+    
+    Args:
+        metrics (dict): Metrics from build_context
+        
+    Returns:
+        dict: Header names and values
+    """
+    return {
+        "X-Context-Tokens": str(metrics["context_tokens"]),
+        "X-Context-Tokens-Saved": str(metrics["tokens_saved"]),
+    }
+
+def use_semantic_cache(mode):
+    """Check whether the semantic cache applies to a search mode
+    
+    The semantic cache embeds the question, so lexical questions, which
+    never touch the embedding model, skip it.
+    
+    Args:
+        mode (str): The request's search mode
+        
+    Returns:
+        bool: True if the semantic cache is enabled and applies
+    """
+    return settings.semantic_cache_enabled and mode != "lexical"
+
+async def get_cached_answer(question, chunks, mode="vector"):
+    """Look up a cached answer for a question and its retrieved chunks
+    
+    The exact cache is tried first, then the semantic cache for differently
+    worded questions over the same evidence.
+    
+    Args:
+        question (str): The question
+        chunks (list): (chunk id, chunk text) pairs from retrieve_context
+        mode (str): The request's search mode
+        
+    Returns:
+        tuple: (cached answer or None, cache status "hit", "semantic-hit" or "miss")
+    """
+    if settings.answer_cache_enabled:
+        key = answer_cache.make_key(question, chunks, ANSWER_MODEL, PROMPT_VERSION)
+        answer = await run_in_threadpool(answer_cache.get, key)
+        CACHE_REQUESTS.inc(cache="answer", result="miss" if answer is None else "hit")
+        if answer is not None:
+            return answer, "hit"
+    
+    if use_semantic_cache(mode):
+        # Already computed (and cached) by the similarity search
+        embedding = await get_query_embedding_async(question)
+        chunk_ids = [chunk_id for chunk_id, _ in chunks]
+        answer = await run_in_threadpool(semantic_answer_cache.lookup, question, embedding, chunk_ids)
+        CACHE_REQUESTS.inc(cache="semantic_answer", result="miss" if answer is None else "hit")
+        if answer is not None:
+            return answer, "semantic-hit"
+    
+    return None, "miss"
+
+async def store_answer(question, chunks, answer, latency, mode="vector"):
+    """Cache a generated answer, ignoring cache failures
+    
+    Args:
+        question (str): The question
+        chunks (list): (chunk id, chunk text) pairs the answer was generated from
+        answer (str): The generated answer
+        latency (float): Seconds spent generating the answer
+        mode (str): The request's search mode
+    """
+    try:
+        if settings.answer_cache_enabled:
+            key = answer_cache.make_key(question, chunks, ANSWER_MODEL, PROMPT_VERSION)
+            await run_in_threadpool(answer_cache.set, key, answer)
+        if use_semantic_cache(mode):
+            embedding = await get_query_embedding_async(question)
+            chunk_ids = [chunk_id for chunk_id, _ in chunks]
+            await run_in_threadpool(semantic_answer_cache.add, question, embedding, chunk_ids, answer, latency)
+    except Exception as e:
+        print(f"Warning: failed to cache answer: {e}")
+
 @router.post("/api/question_answer")
-async def question_answer(request: QuestionAnswerRequest):
+async def question_answer(request: QuestionAnswerRequest, response: Response):
     """
     Generate an answer to a question using relevant chunks from the vector database.
     
     1. Performs semantic search to find relevant chunks
-    2. Sends chunks to LLM to generate an answer
+    2. Sends chunks to LLM to generate an answer, unless the same or a closely
+       similar question was already answered from the same chunks (see the
+       X-Answer-Cache header)
     3. Returns the answer with proper citations
     """
     try:
         # First, perform similarity search to find relevant chunks
-        search_request = SimilaritySearchRequest(
-            query=request.question,
-            k=request.k,
-            min_score=request.min_score
-        )
+        context, citations, chunks, metrics = await retrieve_context(request)
+        response.headers.update(context_headers(metrics))
         
-        search_response = await similarity_search(search_request)
+        if not citations:
+            return QuestionAnswerResponse(answer=NO_RESULTS_ANSWER, citations=[])
         
-        if not search_response.results:
-            return QuestionAnswerResponse(
-                answer="I couldn't find any relevant information to answer your question.",
-                citations=[]
-            )
+        with timed("answer_cache"):
+            answer, cache_status = await get_cached_answer(request.question, chunks, request.mode)
+        response.headers["X-Answer-Cache"] = cache_status
         
-        # Prepare context from search results
-        context = ""
-        citations = []
-        
-        for i, result in enumerate(search_response.results):
-            context += f"\n\nCHUNK {i+1}:\n{result.text}\n"
-            context += f"SOURCE: {result.metadata.source_doc_id}, SECTION: {result.metadata.section_heading}\n"
-            
-            citation = Citation(
-                source_doc_id=result.metadata.source_doc_id,
-                section_heading=result.metadata.section_heading,
-                link=result.metadata.link
-            )
-            citations.append(citation)
-        
-        # Generate answer using OpenAI
-        answer = generate_answer(request.question, context)
+        if answer is None:
+            # Generate answer using OpenAI
+            start = time.perf_counter()
+            with timed("llm"):
+                answer = await generate_answer(request.question, context)
+            await store_answer(request.question, chunks, answer, time.perf_counter() - start, request.mode)
         
         return QuestionAnswerResponse(
             answer=answer,
@@ -57,3 +168,78 @@ async def question_answer(request: QuestionAnswerRequest):
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating answer: {str(e)}")
+
+def sse_event(event, data):
+    """Format a Server-Sent Event with a JSON payload
+    
+    Args:
+        event (str): The event name
+        data: JSON-serializable payload
+        
+    Returns:
+        str: The encoded event
+    """
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@router.post("/api/question_answer/stream")
+async def question_answer_stream(request: QuestionAnswerRequest, http_request: Request):
+    """
+    Stream an answer to a question as Server-Sent Events.
+    
+    Emits a `citations` event as soon as retrieval finishes, then a `token`
+    event for each piece of the answer, and finally `done` (or `error`).
+    Generation is cancelled if the client disconnects.
+    """
+    try:
+        context, citations, chunks, metrics = await retrieve_context(request)
+        with timed("answer_cache"):
+            cached, cache_status = await get_cached_answer(request.question, chunks, request.mode) if citations else (None, "miss")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error generating answer: {str(e)}")
+    
+    async def events():
+        yield sse_event("citations", [citation.model_dump() for citation in citations])
+        
+        if not citations:
+            yield sse_event("token", {"text": NO_RESULTS_ANSWER})
+            yield sse_event("done", {})
+            return
+        
+        if cached is not None:
+            yield sse_event("token", {"text": cached})
+            yield sse_event("done", {})
+            return
+        
+        start = time.perf_counter()
+        tokens = stream_answer(request.question, context)
+        parts = []
+        try:
+            async for text in tokens:
+                if await http_request.is_disconnected():
+                    break
+                parts.append(text)
+                yield sse_event("token", {"text": text})
+            else:
+                # Headers are already sent, so this only reaches the metrics
+                record_stage("llm", time.perf_counter() - start)
+                # Only complete answers are cached
+                await store_answer(request.question, chunks, "".join(parts), time.perf_counter() - start, request.mode)
+                yield sse_event("done", {})
+        except HTTPException as e:
+            yield sse_event("error", {"detail": e.detail})
+        except Exception as e:
+            yield sse_event("error", {"detail": f"Error generating answer: {str(e)}"})
+        finally:
+            # Closing the generator closes the upstream OpenAI stream
+            await tokens.aclose()
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+            "X-Answer-Cache": cache_status,
+            **context_headers(metrics)
+        }
+    )
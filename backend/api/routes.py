@@ -2,6 +2,9 @@ from fastapi import APIRouter
 from .upload import router as upload_router
 from .search import router as search_router
 from .qa import router as qa_router
+from .stats import router as stats_router
+from .health import router as health_router
+from .metrics import router as metrics_router
 
 # Create main router
 router = APIRouter()
@@ -10,3 +13,6 @@ router = APIRouter()
 router.include_router(upload_router)
 router.include_router(search_router)
 router.include_router(qa_router)
+router.include_router(stats_router)
+router.include_router(health_router)
+router.include_router(metrics_router)
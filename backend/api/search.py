@@ -1,63 +1,201 @@
+import asyncio
 from fastapi import APIRouter, HTTPException
-from models.search import SimilaritySearchRequest, SimilaritySearchResponse, SimilaritySearchResult
+from fastapi.concurrency import run_in_threadpool
+from core.config import settings
+from models.search import (
+    SimilaritySearchRequest, SimilaritySearchResponse, SimilaritySearchResult,
+    BatchSimilaritySearchRequest, BatchSimilaritySearchItem, BatchSimilaritySearchResponse
+)
 from models.chunks import ChunkMetadata
-from core.embeddings import generate_embedding
-from services.pinecone_service import query_vectors
+from core.embeddings import get_query_embedding_async, get_query_embeddings_async
+from core.metrics import timed, BATCH_SIZE
+from services.vector_store import query_vectors, build_metadata_filter
+from services.lexical_index import lexical_query
+from services.usage_counter import record_chunk_hits
 
 # Create router
 router = APIRouter()
 
+def build_search_response(search_results, min_score):
+    """Turn raw vector store matches into a search response
+    
+    Args:
+        search_results (dict): Result of query_vectors
+        min_score (float, optional): Matches scoring below this are dropped
+        
+    Returns:
+        SimilaritySearchResponse: The filtered results
+    """
+    # Process and filter results
+    results = []
+    for match in search_results.get("matches", []):
+        if min_score is not None and match["score"] < min_score:
+            continue
+            
+        # Extract metadata and create result object
+        metadata = match["metadata"]
+        text = metadata.pop("text", "")  # Remove text from metadata
+        
+        # Add missing fields with defaults if needed
+        required_fields = ["id", "source_doc_id", "chunk_index", "section_heading", 
+                        "doi", "journal", "publish_year", "usage_count", 
+                        "attributes", "link"]
+        
+        for field in required_fields:
+            if field not in metadata:
+                if field == "attributes":
+                    metadata[field] = {}
+                elif field in ["chunk_index", "publish_year", "usage_count"]:
+                    metadata[field] = 0
+                else:
+                    metadata[field] = ""
+        
+        result = SimilaritySearchResult(
+            id=match["id"],
+            score=match["score"],
+            metadata=ChunkMetadata(**metadata),
+            text=text
+        )
+        results.append(result)
+    
+    return SimilaritySearchResponse(results=results)
+
+def fuse_results(result_sets, top_k):
+    """Merge ranked result lists with reciprocal rank fusion
+    
+    Each match scores the sum of 1 / (HYBRID_RRF_K + rank) over the lists it
+    appears in, so chunks ranked well by both retrievers come first.
+    
+    Args:
+        result_sets (list): Query results, each with a 'matches' list ordered by score
+        top_k (int): Number of results to return
+        
+    Returns:
+        dict: Fused query results, scored by their fusion score
+    """
+    fused = {}
+    for search_results in result_sets:
+        for rank, match in enumerate(search_results.get("matches", []), start=1):
+            entry = fused.setdefault(match["id"], {"id": match["id"], "score": 0.0, "metadata": match["metadata"]})
+            entry["score"] += 1.0 / (settings.hybrid_rrf_k + rank)
+    
+    matches = sorted(fused.values(), key=lambda match: match["score"], reverse=True)
+    return {"matches": matches[:top_k]}
+
+async def run_search(request, query_embedding=None):
+    """Run one search in the retrieval mode it selects
+    
+    Args:
+        request (SimilaritySearchRequest): The search request
+        query_embedding (list, optional): Precomputed embedding of the query
+        
+    Returns:
+        SimilaritySearchResponse: The search results
+    """
+    metadata_filter = build_metadata_filter(request.filters)
+    
+    if request.mode == "lexical":
+        # BM25 scores are not comparable to cosine similarity, so min_score does not apply
+        with timed("lexical_query"):
+            search_results = await run_in_threadpool(
+                lexical_query, request.query, top_k=request.k, filter=metadata_filter
+            )
+        with timed("build_response"):
+            return build_search_response(search_results, None)
+    
+    # Generate embedding for the query (repeated queries are served from cache)
+    if query_embedding is None:
+        with timed("embed"):
+            query_embedding = await get_query_embedding_async(request.query)
+    
+    # Fuse deeper lists than requested so chunks found by only one retriever can still rank
+    top_k = request.k if request.mode == "vector" else 2 * request.k
+    
+    # Perform similarity search (vector store clients are synchronous)
+    async def vector_search():
+        with timed("vector_query"):
+            return await run_in_threadpool(
+                query_vectors,
+                query_vector=query_embedding,
+                top_k=top_k,
+                include_metadata=True,
+                nprobe=request.nprobe,
+                filter=metadata_filter,
+                min_score=request.min_score
+            )
+    
+    if request.mode == "vector":
+        search_results = await vector_search()
+        with timed("build_response"):
+            return build_search_response(search_results, request.min_score)
+    
+    async def lexical_search():
+        with timed("lexical_query"):
+            return await run_in_threadpool(lexical_query, request.query, top_k=top_k, filter=metadata_filter)
+    
+    vector_results, lexical_results = await asyncio.gather(vector_search(), lexical_search())
+    with timed("build_response"):
+        return build_search_response(fuse_results([vector_results, lexical_results], request.k), None)
+
 @router.post("/api/similarity_search")
 async def similarity_search(request: SimilaritySearchRequest):
     """
     Perform semantic similarity search using the provided query.
     
-    Returns top-k semantic matches above the minimum similarity score.
+    Returns top-k semantic matches above the minimum similarity score. Metadata
+    filters are applied inside the vector query, so k counts matching chunks.
+    With mode "lexical" the BM25 index is searched instead, without embedding
+    the query, and with "hybrid" both are searched and fused by rank.
     """
     try:
-        # Generate embedding for the query
-        query_embedding = generate_embedding(request.query)
-        
-        # Perform similarity search
-        search_results = query_vectors(
-            query_vector=query_embedding,
-            top_k=request.k,
-            include_metadata=True
+        response = await run_search(request)
+    
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error performing similarity search: {str(e)}")
+    
+    # Counted in memory and written to usage_count in the background
+    record_chunk_hits(result.id for result in response.results)
+    return response
+
+@router.post("/api/similarity_search/batch")
+async def batch_similarity_search(request: BatchSimilaritySearchRequest):
+    """
+    Perform many semantic similarity searches in one request.
+    
+    All vector and hybrid queries are embedded in a single batched encode, then
+    the searches run concurrently (up to BATCH_SEARCH_CONCURRENCY at a time). Results
+    come back in request order; a query that fails carries an error instead of
+    failing the whole batch.
+    """
+    if len(request.queries) > settings.batch_search_max_queries:
+        raise HTTPException(
+            status_code=422,
+            detail=f"At most {settings.batch_search_max_queries} queries are allowed per batch"
         )
-        
-        # Process and filter results
-        results = []
-        for match in search_results.get("matches", []):
-            if match["score"] < request.min_score:
-                continue
-                
-            # Extract metadata and create result object
-            metadata = match["metadata"]
-            text = metadata.pop("text", "")  # Remove text from metadata
-            
-            # Add missing fields with defaults if needed
-            required_fields = ["id", "source_doc_id", "chunk_index", "section_heading", 
-                            "doi", "journal", "publish_year", "usage_count", 
-                            "attributes", "link"]
-            
-            for field in required_fields:
-                if field not in metadata:
-                    if field == "attributes":
-                        metadata[field] = {}
-                    elif field in ["chunk_index", "publish_year", "usage_count"]:
-                        metadata[field] = 0
-                    else:
-                        metadata[field] = ""
-            
-            result = SimilaritySearchResult(
-                id=match["id"],
-                score=match["score"],
-                metadata=ChunkMetadata(**metadata),
-                text=text
-            )
-            results.append(result)
-        
-        return SimilaritySearchResponse(results=results)
     
+    BATCH_SIZE.observe(len(request.queries), kind="search_batch")
+    
+    # Lexical queries need no embedding
+    embedded = [item for item in request.queries if item.mode != "lexical"]
+    try:
+        with timed("embed"):
+            embeddings = await get_query_embeddings_async([item.query for item in embedded]) if embedded else []
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error performing similarity search: {str(e)}")
+    embeddings = iter(embeddings)
+    
+    semaphore = asyncio.Semaphore(settings.batch_search_concurrency)
+    
+    async def search_one(item, embedding):
+        async with semaphore:
+            try:
+                response = await run_search(item, embedding)
+                return BatchSimilaritySearchItem(results=response.results)
+            except Exception as e:
+                return BatchSimilaritySearchItem(error=f"Error performing similarity search: {str(e)}")
+    
+    items = await asyncio.gather(*(
+        search_one(item, None if item.mode == "lexical" else next(embeddings)) for item in request.queries
+    ))
+    record_chunk_hits(result.id for item in items for result in item.results or [])
+    return BatchSimilaritySearchResponse(results=list(items))
@@ -0,0 +1,46 @@
+from fastapi import APIRouter, Query
+from fastapi.concurrency import run_in_threadpool
+from core.config import settings
+from core.embeddings import query_cache, query_batcher
+from services.answer_cache import answer_cache, semantic_answer_cache, SemanticAnswerCache
+from services.usage_counter import get_usage_counter
+
+# Create router
+router = APIRouter()
+
+@router.get("/api/stats")
+async def get_stats():
+    """
+    Report runtime statistics for the service caches.
+    """
+    return {
+        "query_embedding_cache": query_cache.stats(),
+        "query_embedding_batcher": query_batcher.stats(),
+        "answer_cache": await run_in_threadpool(answer_cache.stats),
+        "semantic_answer_cache": await run_in_threadpool(semantic_answer_cache.stats),
+        "usage_counts": get_usage_counter().stats() if settings.usage_tracking_enabled else None
+    }
+
+@router.get("/api/stats/semantic_cache/audit")
+async def get_semantic_cache_audit(limit: int = Query(default=100, ge=1, le=SemanticAnswerCache.AUDIT_LOG_SIZE)):
+    """
+    List recent semantic answer cache hits, newest first, pairing each question
+    with the stored question whose answer it reused, for spotting false hits.
+    """
+    return {"hits": await run_in_threadpool(semantic_answer_cache.audit_log, limit)}
+
+@router.get("/api/stats/most_used_chunks")
+async def get_most_used_chunks(limit: int = Query(default=20, ge=1, le=settings.usage_most_used_max)):
+    """
+    List the chunks most often returned by similarity search or cited in
+    answers, most used first. Served from memory; counts include hits recorded
+    by other workers as of their last usage flush.
+    """
+    if not settings.usage_tracking_enabled:
+        return {"chunks": []}
+    return {
+        "chunks": [
+            {"id": chunk_id, "usage_count": count}
+            for chunk_id, count in get_usage_counter().most_used(limit)
+        ]
+    }
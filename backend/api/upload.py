@@ -1,100 +1,42 @@
 from fastapi import APIRouter, UploadFile, File, Form, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from typing import Optional
-import json
-from models.chunks import Chunk
-from core.embeddings import generate_embedding
-from services.pinecone_service import store_vectors
+from core.metrics import timed
+from models.jobs import IngestionJobStatus
+from services.ingestion import process_document_chunks
+from services.jobs import get_job, job_status, spool_upload
+from utils.json_stream import read_first_record
 
 # Create router
 router = APIRouter()
 
-def process_document_chunks(chunks_data):
-    """Process document chunks and prepare them for storage
-    
-    Args:
-        chunks_data (list): Raw chunks data
-        
-    Returns:
-        list: List of processed Chunk objects
-    """
-    chunks = []
-    for chunk_data in chunks_data:
-        # Ensure attributes is a dictionary
-        if isinstance(chunk_data.get('attributes', []), list):
-            # Convert list of attributes to a dictionary
-            attributes = {attr: True for attr in chunk_data.get('attributes', [])}
-            chunk_data['attributes'] = attributes
-            
-        # Set default values for optional fields
-        if 'doi' not in chunk_data:
-            chunk_data['doi'] = 'Unknown'
-            
-        # Create Chunk object with validation
-        try:
-            chunk = Chunk(**chunk_data)
-            chunks.append(chunk)
-        except Exception as e:
-            print(f"Error processing chunk {chunk_data.get('id', 'unknown')}: {str(e)}")
-            raise
-    
-    return chunks
-
-def prepare_vectors_for_storage(chunks):
-    """Prepare vectors for storage in the vector database
-    
-    Args:
-        chunks (list): List of Chunk objects
-        
-    Returns:
-        list: List of vector objects ready for storage
-    """
-    vectors = []
-    for chunk in chunks:
-        chunk_dict = chunk.model_dump() if hasattr(chunk, 'model_dump') else chunk.dict()
-        embedding = generate_embedding(chunk.text)
-        
-        # Prepare metadata - Pinecone only accepts simple types
-        metadata = {}
-        for key, value in chunk_dict.items():
-            if key == 'attributes':
-                # Convert attributes dict to a list of strings for Pinecone
-                if isinstance(value, dict):
-                    metadata['attribute_keys'] = list(value.keys())
-                else:
-                    metadata['attribute_keys'] = []
-            elif isinstance(value, (str, int, float, bool)) or (
-                isinstance(value, list) and all(isinstance(item, str) for item in value)
-            ):
-                metadata[key] = value
-        
-        # Always include text in metadata for retrieval
-        metadata['text'] = chunk.text
-        
-        # Prepare record for insertion
-        vector = {
-            'id': chunk.id,
-            'values': embedding,
-            'metadata': metadata
-        }
-        
-        vectors.append(vector)
-    
-    return vectors
-
 @router.put("/api/upload", status_code=202)
-async def upload_chunks(schema_version: str = Form(...), file: Optional[UploadFile] = File(None), file_url: Optional[str] = Form(None)):
+async def upload_chunks(schema_version: str = Form(...), file: Optional[UploadFile] = File(None), file_url: Optional[str] = Form(None),
+                        replace_documents: bool = Form(False)):
     """
-    Upload journal chunks, generate embeddings, and store them in the vector database.
+    Upload journal chunks to be embedded and stored in the vector database.
     
-    - Request can include either file_url or direct file upload
+    - Request can include either file_url or direct file upload (JSON array or NDJSON)
     - Schema version must be provided for data validation
+    - replace_documents marks the upload as the complete new version of its documents
+    - The upload is queued as a background ingestion job and its id returned right
+      away; poll GET /api/upload/{job_id} for progress
     """
     try:
         # Handle file upload or URL
         if file:
-            # Read uploaded file content
-            content = await file.read()
-            chunks_data = json.loads(content)
+            # Reject files with the wrong chunk schema up front by checking the first record
+            try:
+                with timed("upload_validate"):
+                    first_record = await run_in_threadpool(read_first_record, file.file)
+                    if first_record is not None:
+                        await run_in_threadpool(process_document_chunks, [first_record])
+            except Exception as validation_error:
+                raise HTTPException(status_code=422, detail=f"Invalid chunk format: {str(validation_error)}")
+            
+            await run_in_threadpool(file.file.seek, 0)
+            with timed("upload_spool"):
+                job = await run_in_threadpool(spool_upload, file.file, schema_version, replace_documents)
         elif file_url:
             # TODO: Implement fetching from URL
             # For now, raise an error
@@ -102,22 +44,26 @@ async def upload_chunks(schema_version: str = Form(...), file: Optional[UploadFi
         else:
             raise HTTPException(status_code=400, detail="Either file or file_url must be provided")
         
-        # Process chunks
-        try:
-            chunks = process_document_chunks(chunks_data)
-        except Exception as validation_error:
-            raise HTTPException(status_code=422, detail=f"Invalid chunk format: {str(validation_error)}")
-        
-        # Prepare vectors
-        vectors = prepare_vectors_for_storage(chunks)
-        
-        # Store in vector database
-        num_stored = store_vectors(vectors)
-        
-        return {"message": f"Successfully processed and stored {num_stored} chunks", "status": "accepted"}
+        return {
+            "message": "Upload accepted for processing",
+            "status": "accepted",
+            "job_id": job["id"],
+            "status_url": f"/api/upload/{job['id']}"
+        }
     
     except HTTPException:
         # Re-raise HTTP exceptions as-is
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing upload: {str(e)}")
+
+@router.get("/api/upload/{job_id}", response_model=IngestionJobStatus)
+async def get_upload_status(job_id: str):
+    """
+    Report progress, throughput, failed chunks and ETA for an upload job.
+    """
+    job = await run_in_threadpool(get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Upload job {job_id} not found")
+    
+    return job_status(job)
@@ -0,0 +1,74 @@
+"""Recall@k and QPS of the local IVF index against exact search.
+
+Builds two local vector stores over the same synthetic clustered vectors,
+one flat (exact) and one IVF, and compares them across nprobe settings.
+
+    python benchmarks/bench_ann.py --vectors 200000 --nlist 1024 --nprobe 4 16 64
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+
+# Add parent directory to path to import backend modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.local_vector_store import LocalVectorStore
+
+def make_vectors(n, dimension, clusters, seed=0):
+    """Gaussian-mixture vectors, which are closer to real embeddings than uniform noise"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dimension)).astype(np.float32)
+    labels = rng.integers(0, clusters, n)
+    return centers[labels] + 0.6 * rng.standard_normal((n, dimension)).astype(np.float32)
+
+def fill(store, vectors, batch_size=10000):
+    for start in range(0, len(vectors), batch_size):
+        store.upsert([
+            {"id": f"chunk_{i}", "values": vectors[i], "metadata": {}}
+            for i in range(start, min(start + batch_size, len(vectors)))
+        ])
+
+def run_queries(store, queries, k, nprobe=None):
+    results = []
+    start = time.perf_counter()
+    for query in queries:
+        matches = store.query(query, top_k=k, include_metadata=False, nprobe=nprobe)["matches"]
+        results.append({match["id"] for match in matches})
+    return results, len(queries) / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--vectors", type=int, default=100000)
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nlist", type=int, default=256)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 16, 64])
+    args = parser.parse_args()
+
+    vectors = make_vectors(args.vectors, args.dimension, clusters=max(args.nlist // 2, 1))
+    queries = make_vectors(args.queries, args.dimension, clusters=max(args.nlist // 2, 1), seed=1)
+
+    with tempfile.TemporaryDirectory() as flat_dir, tempfile.TemporaryDirectory() as ivf_dir:
+        flat = LocalVectorStore(flat_dir, args.dimension)
+        fill(flat, vectors)
+        ivf = LocalVectorStore(ivf_dir, args.dimension, index_type="ivf", nlist=args.nlist)
+        start = time.perf_counter()
+        fill(ivf, vectors)
+        print(f"ivf build (incl. training) {time.perf_counter() - start:8.2f}s for {args.vectors} vectors")
+
+        exact, exact_qps = run_queries(flat, queries, args.k)
+        print(f"exact                      recall@{args.k}=1.000 qps={exact_qps:9.1f}")
+        for nprobe in args.nprobe:
+            approx, qps = run_queries(ivf, queries, args.k, nprobe=nprobe)
+            recall = np.mean([len(a & e) / len(e) for a, e in zip(approx, exact)])
+            print(f"ivf nprobe={nprobe:<4d}            recall@{args.k}={recall:.3f} qps={qps:9.1f} ({qps / exact_qps:.1f}x)")
+
+        flat.close()
+        ivf.close()
+
+if __name__ == "__main__":
+    main()
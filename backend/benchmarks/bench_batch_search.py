@@ -0,0 +1,84 @@
+"""Compare looping /api/similarity_search with one /api/similarity_search/batch call.
+
+The vector store is replaced with a Pinecone stand-in that sleeps for an
+injected round-trip latency, so the benchmark runs offline. The query cache is
+disabled so both modes pay for every embedding.
+
+    python benchmarks/bench_batch_search.py --queries 500 --latency 0.02
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+import numpy as np
+
+# Add parent directory to path to import backend modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+import api.search
+from benchmarks.fakes import FakePineconeIndex
+from core.config import settings
+from core.embeddings import get_model_dimension
+from main import app
+
+def install_index(vectors, latency):
+    """Route vector queries to a populated FakePineconeIndex"""
+    rng = np.random.default_rng(0)
+    index = FakePineconeIndex(latency=0)
+    index.upsert([
+        {"id": f"chunk_{i}", "values": vector.tolist(), "metadata": {"source_doc_id": "doc", "text": f"chunk {i}"}}
+        for i, vector in enumerate(rng.standard_normal((vectors, get_model_dimension())))
+    ])
+    index.latency = latency
+    
+    def query_vectors(query_vector, top_k=10, include_metadata=True, **kwargs):
+        return index.query(vector=query_vector, top_k=top_k, include_metadata=include_metadata)
+    
+    api.search.query_vectors = query_vectors
+
+async def run_loop(client, queries):
+    start = time.perf_counter()
+    for query in queries:
+        response = await client.post("/api/similarity_search", json={"query": query, "min_score": -1})
+        response.raise_for_status()
+    return time.perf_counter() - start
+
+async def run_batch(client, queries):
+    start = time.perf_counter()
+    response = await client.post(
+        "/api/similarity_search/batch",
+        json={"queries": [{"query": query, "min_score": -1} for query in queries]}
+    )
+    response.raise_for_status()
+    assert not any(item["error"] for item in response.json()["results"])
+    return time.perf_counter() - start
+
+async def run(queries):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=None) as client:
+        loop_elapsed = await run_loop(client, queries)
+        batch_elapsed = await run_batch(client, queries)
+    return loop_elapsed, batch_elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--vectors", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.02, help="median seconds per vector query")
+    args = parser.parse_args()
+    
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    settings.query_cache_size = 0
+    install_index(args.vectors, args.latency)
+    queries = [f"how do legumes improve soil fertility, variant {i}" for i in range(args.queries)]
+    
+    loop_elapsed, batch_elapsed = asyncio.run(run(queries))
+    print(f"loop  {args.queries / loop_elapsed:8.1f} queries/s ({loop_elapsed:6.2f}s)")
+    print(f"batch {args.queries / batch_elapsed:8.1f} queries/s ({batch_elapsed:6.2f}s)")
+    print(f"speedup {loop_elapsed / batch_elapsed:6.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""Benchmark batched embedding against the per-chunk encode loop.
+
+Run from the backend directory:
+
+    python benchmarks/bench_embeddings.py --chunks 5000 --batch-sizes 32 64 128 --workers 0 4
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+# Add parent directory to path to import backend modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.embeddings import generate_embedding, generate_embeddings, close_embedding_pool
+
+WORDS = (
+    "soil fertility legume nitrogen fixation cover crop yield rotation maize "
+    "cassava velvet bean mulch erosion organic matter smallholder farmers"
+).split()
+
+def make_texts(n, seed=0):
+    """Build n synthetic chunk texts with a realistic spread of lengths"""
+    rng = random.Random(seed)
+    return [" ".join(rng.choices(WORDS, k=rng.randint(8, 250))) for _ in range(n)]
+
+def rate(n, seconds):
+    return n / seconds if seconds else float("inf")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[32, 64, 128])
+    parser.add_argument("--workers", type=int, nargs="+", default=[0])
+    parser.add_argument("--skip-baseline", action="store_true")
+    args = parser.parse_args()
+
+    texts = make_texts(args.chunks)
+    generate_embeddings(texts[:64])  # warm up kernels before timing
+
+    if not args.skip_baseline:
+        start = time.perf_counter()
+        for text in texts:
+            generate_embedding(text)
+        elapsed = time.perf_counter() - start
+        print(f"per-chunk loop                   {rate(len(texts), elapsed):10.1f} chunks/sec")
+
+    for workers in args.workers:
+        for batch_size in args.batch_sizes:
+            start = time.perf_counter()
+            generate_embeddings(texts, batch_size=batch_size, num_workers=workers)
+            elapsed = time.perf_counter() - start
+            print(f"batched (batch={batch_size:4d}, workers={workers}) {rate(len(texts), elapsed):10.1f} chunks/sec")
+        close_embedding_pool()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""Measure search latency with and without the per-query describe_index_stats call.
+
+Runs query_vectors against a local Pinecone stand-in with injected round-trip
+latency. The "before" mode calls describe_index_stats ahead of each query,
+as the old query path did, so it pays two round trips per search.
+
+    python benchmarks/bench_index_stats.py --queries 500 --latency 0.02
+"""
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+# Add parent directory to path to import backend modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fakes import FakePineconeIndex
+import services.pinecone_service as pinecone_service
+
+def measure(queries, before):
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        if before:
+            pinecone_service.index.describe_index_stats()
+        pinecone_service.query_vectors(query.tolist(), top_k=10)
+        latencies.append(time.perf_counter() - start)
+    return np.percentile(np.array(latencies) * 1000, [50, 99])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--vectors", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.02, help="median seconds per round trip")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    pinecone_service.index = FakePineconeIndex(latency=0)
+    pinecone_service.store_vectors([
+        {"id": f"chunk_{i}", "values": vector.tolist(), "metadata": {}}
+        for i, vector in enumerate(rng.standard_normal((args.vectors, 384)))
+    ])
+    pinecone_service.index.latency = args.latency
+    queries = rng.standard_normal((args.queries, 384)).astype(np.float32)
+
+    for label, before in (("before (stats per query)", True), ("after (query only)", False)):
+        p50, p99 = measure(queries, before)
+        print(f"{label:26s} p50={p50:7.2f}ms p99={p99:7.2f}ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Measure BM25 lexical query latency on a synthetic corpus.
+
+Builds a LexicalIndex in a temporary directory from random chunks drawn from a
+Zipf-distributed vocabulary, then times queries of a few terms each. Lexical
+queries never touch the embedding model.
+
+    python benchmarks/bench_lexical.py --chunks 100000 --queries 500
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+
+# Add parent directory to path to import backend modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.lexical_index import LexicalIndex
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=100_000)
+    parser.add_argument("--words", type=int, default=120, help="words per chunk")
+    parser.add_argument("--vocabulary", type=int, default=50_000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--batch", type=int, default=256, help="chunks per add, like an ingestion batch")
+    args = parser.parse_args()
+    
+    rng = np.random.default_rng(0)
+    vocabulary = np.array([f"term{i}" for i in range(args.vocabulary)])
+    
+    def draw(n):
+        return vocabulary[np.minimum(rng.zipf(1.2, n) - 1, args.vocabulary - 1)]
+    
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "lexical.sqlite3")
+        index = LexicalIndex(path)
+        start = time.perf_counter()
+        for offset in range(0, args.chunks, args.batch):
+            index.add([
+                {"id": f"chunk_{i}", "metadata": {"text": " ".join(draw(args.words))}}
+                for i in range(offset, min(offset + args.batch, args.chunks))
+            ])
+        print(f"indexed {args.chunks} chunks in {time.perf_counter() - start:.1f}s")
+        index.close()
+        
+        start = time.perf_counter()
+        index = LexicalIndex(path)
+        print(f"reopened in {time.perf_counter() - start:.1f}s, {os.path.getsize(path) / 1e6:.0f}MB on disk")
+        
+        latencies = []
+        for _ in range(args.queries):
+            query = " ".join(vocabulary[rng.integers(0, 2000, 3)])
+            start = time.perf_counter()
+            index.query(query, top_k=10)
+            latencies.append(time.perf_counter() - start)
+        p50, p95, p99 = np.percentile(np.array(latencies) * 1000, [50, 95, 99])
+        print(f"query p50={p50:.2f}ms p95={p95:.2f}ms p99={p99:.2f}ms")
+        index.close()
+
+if __name__ == "__main__":
+    main()
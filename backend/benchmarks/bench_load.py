@@ -0,0 +1,74 @@
+"""Load test showing that concurrent QA requests overlap instead of queueing.
+
+Pinecone and OpenAI are replaced with stand-ins that sleep for a configurable
+latency, so the test runs offline. With a non-blocking handler the wall time
+for N concurrent requests stays close to a single request's latency.
+
+    python benchmarks/bench_load.py --concurrency 1 8 32 --llm-latency 0.5
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+
+# Add parent directory to path to import backend modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+import api.qa
+import api.search
+from main import app
+
+def install_stand_ins(query_latency, llm_latency):
+    """Replace Pinecone and OpenAI calls with sleeping stand-ins"""
+    def query_vectors(query_vector, top_k=10, include_metadata=True, **kwargs):
+        time.sleep(query_latency)  # blocking, like the Pinecone client
+        return {"matches": [{
+            "id": "doc_01",
+            "score": 0.9,
+            "metadata": {
+                "id": "doc_01", "source_doc_id": "doc", "chunk_index": 1,
+                "section_heading": "Intro", "journal": "J", "publish_year": 2020,
+                "usage_count": 0, "link": "", "text": "Legumes fix nitrogen."
+            }
+        }]}
+
+    async def generate_answer(question, context):
+        await asyncio.sleep(llm_latency)
+        return "Legumes fix nitrogen."
+
+    api.search.query_vectors = query_vectors
+    api.qa.generate_answer = generate_answer
+
+async def run(concurrency):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        async def one(i):
+            response = await client.post("/api/question_answer", json={"question": f"question {i}"})
+            response.raise_for_status()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(concurrency)))
+        return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--query-latency", type=float, default=0.05)
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    args = parser.parse_args()
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    install_stand_ins(args.query_latency, args.llm_latency)
+    serial = args.query_latency + args.llm_latency
+    for concurrency in args.concurrency:
+        elapsed = asyncio.run(run(concurrency))
+        print(
+            f"concurrency={concurrency:4d} wall={elapsed:6.2f}s "
+            f"serialized={serial * concurrency:7.2f}s overlap={serial * concurrency / elapsed:6.1f}x"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Compare the PyTorch and ONNX Runtime embedding backends.
+
+Reports single-query latency and batch throughput for each backend, then checks
+that the ONNX embeddings agree with PyTorch: per-text cosine similarity and
+recall@k of nearest-neighbor search over the same synthetic corpus. Needs
+ONNX Runtime (pip install "sentence-transformers[onnx]").
+
+    python benchmarks/bench_onnx.py --chunks 2000 --quantize --threads 4
+"""
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+# Add parent directory to path to import backend modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.bench_embeddings import make_texts
+from core.config import settings
+from core.embeddings import load_model
+
+def normalize(matrix):
+    return matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+
+def measure(model, texts, queries, batch_size):
+    """Time single-query latency and batch throughput, returning the corpus embeddings"""
+    model.encode(texts[:batch_size], batch_size=batch_size)  # warm up kernels before timing
+    
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        model.encode(query)
+        latencies.append(time.perf_counter() - start)
+    
+    start = time.perf_counter()
+    embeddings = model.encode(texts, batch_size=batch_size, convert_to_numpy=True)
+    elapsed = time.perf_counter() - start
+    
+    p50, p99 = np.percentile(np.array(latencies) * 1000, [50, 99])
+    return embeddings, p50, p99, len(texts) / elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--threads", type=int, default=0, help="ONNX Runtime intra-op threads, 0 for the default")
+    parser.add_argument("--quantize", action="store_true", help="use the dynamic int8 ONNX model")
+    parser.add_argument("--quantization", default=settings.embedding_onnx_quantization)
+    args = parser.parse_args()
+    
+    settings.embedding_onnx_threads = args.threads
+    settings.embedding_onnx_quantize = args.quantize
+    settings.embedding_onnx_quantization = args.quantization
+    
+    texts = make_texts(args.chunks)
+    queries = make_texts(args.queries, seed=1)
+    
+    results = {}
+    for backend in ("torch", "onnx"):
+        model = load_model(backend)
+        corpus, p50, p99, throughput = measure(model, texts, queries, args.batch_size)
+        query_embeddings = model.encode(queries, batch_size=args.batch_size, convert_to_numpy=True)
+        results[backend] = (normalize(corpus), normalize(query_embeddings))
+        print(
+            f"{backend:6s} dim={corpus.shape[1]} query p50={p50:6.2f}ms p99={p99:6.2f}ms "
+            f"batch={throughput:8.1f} chunks/sec"
+        )
+    
+    torch_corpus, torch_queries = results["torch"]
+    onnx_corpus, onnx_queries = results["onnx"]
+    assert torch_corpus.shape == onnx_corpus.shape, "backends disagree on the embedding dimension"
+    
+    cosine = np.sum(torch_corpus * onnx_corpus, axis=1)
+    print(f"cosine agreement mean={cosine.mean():.4f} min={cosine.min():.4f}")
+    
+    # Recall@k: how many of PyTorch's exact top-k neighbors the ONNX embeddings also return
+    k = args.k
+    expected = np.argsort(-(torch_queries @ torch_corpus.T), axis=1)[:, :k]
+    found = np.argsort(-(onnx_queries @ onnx_corpus.T), axis=1)[:, :k]
+    recall = np.mean([len(set(e) & set(f)) / k for e, f in zip(expected, found)])
+    print(f"recall@{k}={recall:.3f}")
+
+if __name__ == "__main__":
+    main()
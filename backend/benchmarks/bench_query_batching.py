@@ -0,0 +1,86 @@
+"""Compare micro-batched query embedding with one encode call per request.
+
+Closed-loop clients each embed distinct queries through
+get_query_embedding_async, as search and QA requests do, with the query cache
+disabled so every query is encoded. Reports QPS and p50/p95/p99 latency per
+concurrency level for per-request encoding and for the batcher.
+
+    python benchmarks/bench_query_batching.py --concurrency 1 4 16 64 256 --window-ms 2 5
+
+--fake-embeddings swaps the model for a stand-in costing --call-latency per
+encode call plus --text-latency per text, to see the scheduling effect
+without the model.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+# Add parent directory to path to import backend modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import core.embeddings
+from benchmarks.bench_embeddings import make_texts
+from benchmarks.suite import percentiles
+from core.config import settings
+from core.embeddings import get_query_embedding_async, query_batcher
+
+async def run_clients(texts, concurrency):
+    """Embed texts from concurrency clients, each awaiting one query at a time"""
+    latencies = []
+    remaining = iter(texts)
+    
+    async def client():
+        for text in remaining:
+            start = time.perf_counter()
+            await get_query_embedding_async(text)
+            latencies.append(time.perf_counter() - start)
+    
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return latencies, time.perf_counter() - start
+
+def measure(label, texts, concurrency):
+    batches = query_batcher.batches
+    latencies, elapsed = asyncio.run(run_clients(texts, concurrency))
+    summary = percentiles(latencies)
+    batches = query_batcher.batches - batches
+    mean_batch = f"{len(texts) / batches:6.1f}" if batches else "     -"
+    print(
+        f"{concurrency:5d}  {label:14s} {len(texts) / elapsed:9.1f} {summary['p50']:9.2f} "
+        f"{summary['p95']:9.2f} {summary['p99']:9.2f}  {mean_batch}"
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32, 64, 128, 256])
+    parser.add_argument("--requests", type=int, default=1000, help="Queries per run")
+    parser.add_argument("--window-ms", type=float, nargs="+", default=[2.0, 5.0])
+    parser.add_argument("--max-batch-size", type=int, default=settings.query_batch_max_size)
+    parser.add_argument("--fake-embeddings", action="store_true")
+    parser.add_argument("--call-latency", type=float, default=0.004, help="Fake model seconds per encode call")
+    parser.add_argument("--text-latency", type=float, default=0.0002, help="Fake model seconds per text")
+    args = parser.parse_args()
+    
+    if args.fake_embeddings:
+        from benchmarks.fakes import FakeEmbeddingModel
+        core.embeddings.model = FakeEmbeddingModel(latency_per_text=args.text_latency, latency_per_call=args.call_latency)
+    settings.query_cache_size = 0
+    settings.query_batch_max_size = args.max_batch_size
+    
+    core.embeddings.generate_embeddings(make_texts(64), num_workers=0)  # warm up kernels before timing
+    # Search queries are short, so keep the first dozen words of each text
+    texts = [f"query {i}: " + " ".join(text.split()[:12]) for i, text in enumerate(make_texts(args.requests, seed=1))]
+    
+    print("clients  mode                 QPS   p50(ms)   p95(ms)   p99(ms)  batch")
+    for concurrency in args.concurrency:
+        settings.query_batching_enabled = False
+        measure("per-request", texts, concurrency)
+        settings.query_batching_enabled = True
+        for window_ms in args.window_ms:
+            settings.query_batch_window_ms = window_ms
+            measure(f"batched {window_ms:g}ms", texts, concurrency)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""Measure per-worker memory of the API with and without a shared embedding model.
+
+Starts the API with N workers in each deployment mode, waits until every
+worker has warmed up its model, then reads RSS, PSS and USS (private memory)
+of each process from /proc/<pid>/smaps_rollup (Linux only):
+
+- uvicorn: `uvicorn --workers N`, every worker loads its own model
+- preload: gunicorn with gunicorn.conf.py, the master loads the model before
+  forking and the workers share its pages copy-on-write (needs gunicorn)
+- server: `uvicorn --workers N` with EMBEDDING_SERVER_SOCKET set, one
+  `python -m core.embedding_server` process holds the model
+
+RSS counts shared pages in every process that maps them, so compare PSS,
+which splits each shared page between its processes, or the PSS total.
+
+    python benchmarks/bench_worker_memory.py --workers 4 --modes uvicorn preload server
+"""
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def memory_kb(pid):
+    """Read RSS, PSS and USS of a process in KiB"""
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1])
+    return {
+        "rss": fields.get("Rss", 0),
+        "pss": fields.get("Pss", 0),
+        "uss": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)
+    }
+
+def descendants(pid):
+    """Pids of every process below pid"""
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # The command name may contain spaces, so split after its closing parenthesis
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    found, stack = [], [pid]
+    while stack:
+        for child in children.get(stack.pop(), []):
+            found.append(child)
+            stack.append(child)
+    return found
+
+def command_name(pid):
+    with open(f"/proc/{pid}/cmdline", "rb") as f:
+        return f.read().replace(b"\0", b" ").decode(errors="replace").strip()[:60]
+
+def wait_until_ready(url, workers, timeout):
+    """Wait until enough consecutive /api/ready answers succeed that every worker is likely warm"""
+    deadline = time.monotonic() + timeout
+    streak = 0
+    while streak < workers * 8:
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"workers not ready after {timeout}s")
+        try:
+            streak = streak + 1 if httpx.get(url, timeout=5).status_code == 200 else 0
+        except httpx.HTTPError:
+            streak = 0
+        time.sleep(0.05 if streak else 0.5)
+
+def start(command, env):
+    return subprocess.Popen(command, cwd=BACKEND_DIR, env=env, start_new_session=True,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+def stop(process):
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait(timeout=30)
+    except (ProcessLookupError, subprocess.TimeoutExpired):
+        os.killpg(process.pid, signal.SIGKILL)
+
+def measure_mode(mode, args, workdir):
+    """Start the API in a deployment mode and measure each of its processes"""
+    env = dict(
+        os.environ,
+        OPENAI_API_KEY=os.environ.get("OPENAI_API_KEY", "unused"),
+        PINECONE_API_KEY=os.environ.get("PINECONE_API_KEY", "unused"),
+        VECTOR_STORE_BACKEND="local",
+        LOCAL_VECTOR_STORE_PATH=os.path.join(workdir, f"{mode}_vectors"),
+        LEXICAL_INDEX_PATH=os.path.join(workdir, f"{mode}_lexical.sqlite3"),
+        EMBEDDING_STORE_PATH=os.path.join(workdir, f"{mode}_embeddings.sqlite3"),
+        ANSWER_CACHE_PATH=os.path.join(workdir, f"{mode}_answers.sqlite3"),
+        INGEST_JOBS_DB_PATH=os.path.join(workdir, f"{mode}_jobs.sqlite3"),
+        INGEST_SPOOL_DIR=os.path.join(workdir, f"{mode}_spool")
+    )
+    env.pop("EMBEDDING_SERVER_SOCKET", None)
+    bind = f"127.0.0.1:{args.port}"
+    processes = []
+    try:
+        if mode == "server":
+            socket_path = os.path.join(workdir, "embeddings.sock")
+            processes.append(start([sys.executable, "-m", "core.embedding_server", "--socket", socket_path], env))
+            deadline = time.monotonic() + args.timeout
+            while not os.path.exists(socket_path):
+                if time.monotonic() > deadline or processes[0].poll() is not None:
+                    raise RuntimeError("embedding server did not start")
+                time.sleep(0.2)
+            env["EMBEDDING_SERVER_SOCKET"] = socket_path
+        if mode == "preload":
+            command = [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "-w", str(args.workers), "-b", bind, "main:app"]
+        else:
+            command = [sys.executable, "-m", "uvicorn", "main:app", "--workers", str(args.workers), "--port", str(args.port)]
+        processes.append(start(command, env))
+        
+        wait_until_ready(f"http://{bind}/api/ready", args.workers, args.timeout)
+        time.sleep(args.settle)
+        rows = []
+        for process in processes:
+            for pid in [process.pid] + descendants(process.pid):
+                try:
+                    rows.append({"pid": pid, "command": command_name(pid), **memory_kb(pid)})
+                except OSError:
+                    pass
+        return rows
+    finally:
+        for process in reversed(processes):
+            stop(process)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--modes", nargs="+", default=["uvicorn", "preload", "server"], choices=["uvicorn", "preload", "server"])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--timeout", type=float, default=300.0, help="Seconds to wait for the workers to warm up")
+    parser.add_argument("--settle", type=float, default=2.0, help="Seconds to wait after the workers are ready")
+    parser.add_argument("--output", help="Write the measurements as JSON to this file")
+    args = parser.parse_args()
+    
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="citeme-memory-") as workdir:
+        for mode in args.modes:
+            rows = measure_mode(mode, args, workdir)
+            results[mode] = rows
+            print(f"\n{mode} ({args.workers} workers)")
+            print(f"{'pid':>8}  {'RSS MiB':>8}  {'PSS MiB':>8}  {'USS MiB':>8}  command")
+            for row in rows:
+                print(f"{row['pid']:8d}  {row['rss'] / 1024:8.1f}  {row['pss'] / 1024:8.1f}  {row['uss'] / 1024:8.1f}  {row['command']}")
+            print(f"{'total':>8}  {sum(r['rss'] for r in rows) / 1024:8.1f}  {sum(r['pss'] for r in rows) / 1024:8.1f}  {sum(r['uss'] for r in rows) / 1024:8.1f}")
+    
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"workers": args.workers, "results": results}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
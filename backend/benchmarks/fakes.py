@@ -0,0 +1,200 @@
+"""Offline stand-ins for external services used by the benchmarks.
+
+FakePineconeIndex mimics the subset of the Pinecone ``Index`` API that the
+services use, answering from memory after sleeping for an injected network
+latency so that round trips show up in the measurements. FakeOpenAIClient does
+the same for chat completions, and FakeEmbeddingModel replaces the
+SentenceTransformer when the model's own cost should be left out.
+"""
+import asyncio
+import random
+import threading
+import time
+import zlib
+from types import SimpleNamespace
+import numpy as np
+
+class FakePineconeIndex:
+    """In-memory Pinecone index with injected per-call latency
+    
+    Args:
+        latency (float): Median seconds slept per API call
+        jitter (float): Log-normal sigma applied to the latency, for realistic tails
+        seed (int): Seed for the latency jitter
+    """
+    
+    def __init__(self, latency=0.02, jitter=0.3, seed=0, keep_vectors=True):
+        self.latency = latency
+        self.keep_vectors = keep_vectors
+        self.jitter = jitter
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._ids = []
+        self._rows = {}
+        self._vectors = []
+        self._metadata = []
+        self._matrix = None  # stacked, row-normalized vectors, rebuilt after upserts
+        self._discarded = 0
+        self.calls = {}
+    
+    def _round_trip(self, name):
+        with self._lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+            delay = self.latency * self._rng.lognormvariate(0, self.jitter) if self.latency else 0
+        if delay:
+            time.sleep(delay)
+    
+    def upsert(self, vectors, **kwargs):
+        self._round_trip("upsert")
+        with self._lock:
+            if not self.keep_vectors:
+                # Only count the vectors, so large ingestion runs measure the
+                # service rather than this stand-in
+                self._discarded += len(vectors)
+                return {"upserted_count": len(vectors)}
+            for vector in vectors:
+                row = self._rows.get(vector["id"])
+                values = np.asarray(vector["values"], dtype=np.float32)
+                if row is None:
+                    self._rows[vector["id"]] = len(self._ids)
+                    self._ids.append(vector["id"])
+                    self._vectors.append(values)
+                    self._metadata.append(dict(vector.get("metadata", {})))
+                else:
+                    self._vectors[row] = values
+                    self._metadata[row] = dict(vector.get("metadata", {}))
+            self._matrix = None
+        return {"upserted_count": len(vectors)}
+    
+    def query(self, vector, top_k=10, include_metadata=True, **kwargs):
+        self._round_trip("query")
+        with self._lock:
+            if not self._ids:
+                return {"matches": []}
+            if self._matrix is None:
+                matrix = np.stack(self._vectors)
+                self._matrix = matrix / (np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-12)
+            matrix = self._matrix
+            ids = list(self._ids)
+            metadata = list(self._metadata)
+        query = np.asarray(vector, dtype=np.float32)
+        scores = matrix @ query / (np.linalg.norm(query) + 1e-12)
+        top = np.argpartition(-scores, top_k - 1)[:top_k] if top_k < len(scores) else np.arange(len(scores))
+        top = top[np.argsort(-scores[top])]
+        return {"matches": [
+            {
+                "id": ids[i],
+                "score": float(scores[i]),
+                "metadata": dict(metadata[i]) if include_metadata else None
+            }
+            for i in top
+        ]}
+    
+    def fetch(self, ids, **kwargs):
+        self._round_trip("fetch")
+        with self._lock:
+            vectors = {
+                vector_id: SimpleNamespace(id=vector_id, metadata=dict(self._metadata[self._rows[vector_id]]))
+                for vector_id in ids if vector_id in self._rows
+            }
+        return SimpleNamespace(vectors=vectors)
+    
+    def update(self, id, set_metadata=None, **kwargs):
+        self._round_trip("update")
+        with self._lock:
+            row = self._rows.get(id)
+            if row is not None and set_metadata:
+                self._metadata[row].update(set_metadata)
+        return {}
+    
+    def describe_index_stats(self, **kwargs):
+        self._round_trip("describe_index_stats")
+        with self._lock:
+            count = len(self._ids) + self._discarded
+            dimension = len(self._vectors[0]) if self._vectors else 0
+        return {"dimension": dimension, "total_vector_count": count}
+
+class _FakeStream:
+    """Async iterator over streamed completion chunks"""
+    
+    def __init__(self, words, token_latency):
+        self._words = iter(words)
+        self._token_latency = token_latency
+        self.closed = False
+    
+    def __aiter__(self):
+        return self
+    
+    async def __anext__(self):
+        word = next(self._words, None)
+        if word is None or self.closed:
+            raise StopAsyncIteration
+        await asyncio.sleep(self._token_latency)
+        return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=word))])
+    
+    async def close(self):
+        self.closed = True
+
+class FakeOpenAIClient:
+    """Stand-in for ``openai.AsyncOpenAI`` answering chat completions offline
+    
+    A completion takes ``latency`` seconds. Streamed completions spread the
+    same latency over their tokens.
+    
+    Args:
+        latency (float): Seconds per completion
+        answer (str): Text returned for every question
+    """
+    
+    def __init__(self, latency=0.5, answer="Legumes fix nitrogen through symbiosis with rhizobia [1]."):
+        self.latency = latency
+        self.answer = answer
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+    
+    async def _create(self, model=None, messages=None, stream=False, **kwargs):
+        self.calls += 1
+        if stream:
+            words = [word + " " for word in self.answer.split()]
+            return _FakeStream(words, self.latency / max(len(words), 1))
+        await asyncio.sleep(self.latency)
+        # Rough counts of 4 characters per prompt token and one token per word
+        usage = SimpleNamespace(
+            prompt_tokens=sum(len(message["content"]) for message in messages or []) // 4,
+            completion_tokens=len(self.answer.split())
+        )
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=self.answer))],
+            usage=usage
+        )
+
+class FakeEmbeddingModel:
+    """Stand-in for the SentenceTransformer returning deterministic unit vectors
+    
+    The same text always maps to the same vector, so repeated queries and
+    reingested chunks behave like they do with the real model.
+    
+    Args:
+        dimension (int): Embedding dimension
+        latency_per_text (float): Seconds of blocking work per encoded text
+        latency_per_call (float): Seconds of fixed blocking work per encode call
+    """
+    
+    def __init__(self, dimension=384, latency_per_text=0.0, latency_per_call=0.0):
+        self.dimension = dimension
+        self.latency_per_text = latency_per_text
+        self.latency_per_call = latency_per_call
+    
+    def get_sentence_embedding_dimension(self):
+        return self.dimension
+    
+    def encode(self, sentences, batch_size=32, convert_to_numpy=True, **kwargs):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if self.latency_per_text or self.latency_per_call:
+            time.sleep(self.latency_per_call + self.latency_per_text * len(texts))
+        vectors = np.empty((len(texts), self.dimension), dtype=np.float32)
+        for i, text in enumerate(texts):
+            vectors[i] = np.random.default_rng(zlib.crc32(text.encode("utf-8"))).standard_normal(self.dimension)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors[0] if single else vectors
@@ -0,0 +1,367 @@
+"""Offline end-to-end benchmark suite for upload, similarity search and QA.
+
+Pinecone and OpenAI are replaced with in-process stand-ins that sleep for an
+injected latency (see benchmarks/fakes.py), so the suite needs no API keys or
+network. Every scenario runs in its own subprocess so that its peak RSS is
+measured in isolation, and the results are written as JSON that can be
+compared across commits:
+
+    python benchmarks/suite.py --output results.json
+    python benchmarks/suite.py --upload-sizes 1000 100000 1000000 --concurrency 1 8 32 64
+    python benchmarks/suite.py --output new.json --compare results.json
+
+Embeddings come from the real model unless --fake-embeddings is given, which
+swaps in deterministic vectors to measure the service overhead alone.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+
+# Add parent directory to path to import backend modules
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BACKEND_DIR)
+
+SCENARIOS = ("upload", "search", "qa")
+
+def percentiles(latencies):
+    """Summarize request latencies in milliseconds
+    
+    Args:
+        latencies (list): Latencies in seconds
+    
+    Returns:
+        dict: p50, p95, p99, mean and max in milliseconds
+    """
+    if not latencies:
+        return {"p50": None, "p95": None, "p99": None, "mean": None, "max": None}
+    values = np.asarray(latencies) * 1000
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        "p50": round(float(p50), 3),
+        "p95": round(float(p95), 3),
+        "p99": round(float(p99), 3),
+        "mean": round(float(values.mean()), 3),
+        "max": round(float(values.max()), 3)
+    }
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MiB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS reports bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def make_chunk(i):
+    """Build a valid journal chunk record"""
+    return {
+        "id": f"bench_{i:08d}",
+        "source_doc_id": f"doc_{i // 20:06d}",
+        "chunk_index": i % 20,
+        "section_heading": ("Introduction", "Methods", "Results", "Discussion")[i % 4],
+        "doi": f"10.1000/bench.{i // 20}",
+        "journal": ("Plant Physiology", "Soil Biology", "Agronomy Journal")[i % 3],
+        "publish_year": 2000 + i % 25,
+        "usage_count": 0,
+        "attributes": {"crop": ("soybean", "maize", "wheat")[i % 3]},
+        "link": f"https://example.org/doc_{i // 20:06d}#{i % 20}",
+        "text": (
+            f"Chunk {i} reports nitrogen fixation rates for legume crop {i % 97} "
+            f"under treatment {i % 13}, measured across {i % 7 + 2} field seasons "
+            "with soil moisture, temperature and rhizobia inoculation recorded."
+        )
+    }
+
+def write_ndjson(path, count):
+    with open(path, "w") as f:
+        for i in range(count):
+            f.write(json.dumps(make_chunk(i)))
+            f.write("\n")
+
+def install_stand_ins(args, workdir, keep_vectors=True):
+    """Point the services at the offline stand-ins and a scratch directory
+    
+    Returns:
+        FakePineconeIndex: The index standing in for Pinecone
+    """
+    from benchmarks.fakes import FakeEmbeddingModel, FakeOpenAIClient, FakePineconeIndex
+    from core.config import settings
+    import core.embeddings
+    import services.openai_service
+    import services.pinecone_service
+    
+    settings.vector_store_backend = "pinecone"
+    settings.answer_cache_enabled = False
+    settings.semantic_cache_enabled = False
+    settings.query_cache_path = None
+    settings.lexical_index_path = os.path.join(workdir, "lexical_index.sqlite3")
+    settings.embedding_store_path = os.path.join(workdir, "embedding_store.sqlite3")
+    settings.ingest_jobs_db_path = os.path.join(workdir, "ingestion_jobs.sqlite3")
+    settings.ingest_spool_dir = os.path.join(workdir, "spool")
+    settings.ingest_job_poll_seconds = 0.05
+    settings.usage_journal_path = os.path.join(workdir, "usage_counts.sqlite3")
+    
+    index = FakePineconeIndex(latency=args.pinecone_latency, keep_vectors=keep_vectors)
+    services.pinecone_service.index = index
+    services.openai_service.client = FakeOpenAIClient(latency=args.llm_latency)
+    if args.fake_embeddings:
+        core.embeddings.model = FakeEmbeddingModel(latency_per_text=args.embedding_latency)
+    return index
+
+def populate(index, size):
+    """Fill the index with random chunk vectors without paying its latency"""
+    from core.embeddings import get_model_dimension
+    
+    latency, index.latency = index.latency, 0
+    rng = np.random.default_rng(0)
+    batch = 1000
+    for start in range(0, size, batch):
+        count = min(batch, size - start)
+        vectors = rng.standard_normal((count, get_model_dimension())).astype(np.float32)
+        index.upsert([
+            {"id": chunk["id"], "values": vector, "metadata": chunk}
+            for chunk, vector in zip((make_chunk(start + i) for i in range(count)), vectors)
+        ])
+    index.latency = latency
+
+async def run_requests(client, make_request, total, concurrency):
+    """Issue ``total`` requests from ``concurrency`` concurrent clients
+    
+    Returns:
+        tuple: (list of latencies in seconds, wall time in seconds, error count)
+    """
+    latencies = []
+    errors = 0
+    next_request = iter(range(total))
+    
+    async def worker():
+        nonlocal errors
+        for i in next_request:
+            start = time.perf_counter()
+            response = await make_request(client, i)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors += 1
+    
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, time.perf_counter() - start, errors
+
+async def bench_upload(args, workdir, size):
+    import httpx
+    from main import app
+    from services.jobs import start_job_workers, stop_job_workers
+    
+    install_stand_ins(args, workdir, keep_vectors=False)
+    path = os.path.join(workdir, "chunks.ndjson")
+    write_ndjson(path, size)
+    
+    start_job_workers()
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            start = time.perf_counter()
+            with open(path, "rb") as f:
+                response = await client.put(
+                    "/api/upload",
+                    data={"schema_version": "1"},
+                    files={"file": ("chunks.ndjson", f, "application/x-ndjson")}
+                )
+            response.raise_for_status()
+            accepted = time.perf_counter() - start
+            status_url = response.json()["status_url"]
+            
+            while True:
+                status = (await client.get(status_url)).json()
+                if status["status"] in ("completed", "failed"):
+                    break
+                await asyncio.sleep(0.05)
+            duration = time.perf_counter() - start
+    finally:
+        await stop_job_workers()
+    
+    return {
+        "chunks": size,
+        "status": status["status"],
+        "chunks_stored": status.get("chunks_stored"),
+        "chunks_failed": status.get("chunks_failed"),
+        "duration_s": round(duration, 3),
+        "accept_latency_ms": round(accepted * 1000, 3),
+        "throughput_per_s": round(size / duration, 1)
+    }
+
+async def bench_requests(args, workdir, scenario, concurrency):
+    import httpx
+    from core.embeddings import get_model
+    from main import app
+    
+    index = install_stand_ins(args, workdir)
+    populate(index, args.corpus_size)
+    get_model()
+    
+    if scenario == "search":
+        async def make_request(client, i):
+            return await client.post("/api/similarity_search", json={
+                "query": f"nitrogen fixation in legume crop {i}", "k": 10, "min_score": -1
+            })
+    else:
+        async def make_request(client, i):
+            return await client.post("/api/question_answer", json={
+                "question": f"How do legumes fix nitrogen under treatment {i}?", "k": 10, "min_score": -1
+            })
+    
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        # One untimed request so lazy initialization stays out of the numbers
+        await make_request(client, -1)
+        latencies, wall, errors = await run_requests(client, make_request, args.requests, concurrency)
+    
+    return {
+        "concurrency": concurrency,
+        "requests": args.requests,
+        "errors": errors,
+        "corpus_size": args.corpus_size,
+        "duration_s": round(wall, 3),
+        "throughput_per_s": round(args.requests / wall, 1),
+        "latency_ms": percentiles(latencies)
+    }
+
+def run_scenario(args):
+    """Run one scenario in this process and print its result as JSON"""
+    logging.disable(logging.WARNING)
+    with tempfile.TemporaryDirectory(prefix="bench_suite_") as workdir:
+        if args.scenario == "upload":
+            result = asyncio.run(bench_upload(args, workdir, args.size))
+        else:
+            result = asyncio.run(bench_requests(args, workdir, args.scenario, args.size))
+    result["scenario"] = args.scenario
+    result["peak_rss_mb"] = peak_rss_mb()
+    print(json.dumps(result))
+
+def scenario_command(args, scenario, size):
+    command = [
+        sys.executable, os.path.abspath(__file__),
+        "--scenario", scenario,
+        "--size", str(size),
+        "--requests", str(args.requests),
+        "--corpus-size", str(args.corpus_size),
+        "--pinecone-latency", str(args.pinecone_latency),
+        "--llm-latency", str(args.llm_latency),
+        "--embedding-latency", str(args.embedding_latency)
+    ]
+    if args.fake_embeddings:
+        command.append("--fake-embeddings")
+    return command
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def result_key(result):
+    return (result["scenario"], result.get("chunks", result.get("concurrency")))
+
+def compare(results, baseline_path):
+    """Print throughput and p95 changes against a previous results file"""
+    with open(baseline_path) as f:
+        baseline = {result_key(result): result for result in json.load(f)["results"]}
+    
+    print(f"\nCompared with {baseline_path}:")
+    for result in results:
+        previous = baseline.get(result_key(result))
+        if previous is None:
+            continue
+        line = f"  {result['scenario']:<7} {result_key(result)[1]:>8}  throughput {_change(previous['throughput_per_s'], result['throughput_per_s'])}"
+        if "latency_ms" in result and "latency_ms" in previous:
+            line += f"  p95 {_change(previous['latency_ms']['p95'], result['latency_ms']['p95'])}"
+        print(line)
+
+def _change(before, after):
+    if not before or after is None:
+        return "n/a"
+    return f"{after:.1f} ({(after - before) / before:+.1%})"
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--upload-sizes", type=int, nargs="+", default=[1000, 10000], help="Chunks per upload run")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32], help="Concurrent clients for search and QA")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per search/QA run")
+    parser.add_argument("--corpus-size", type=int, default=10000, help="Vectors in the index for search/QA")
+    parser.add_argument("--pinecone-latency", type=float, default=0.02, help="Seconds per Pinecone round trip")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Seconds per chat completion")
+    parser.add_argument("--fake-embeddings", action="store_true", help="Replace the embedding model with deterministic vectors")
+    parser.add_argument("--embedding-latency", type=float, default=0.0, help="Seconds per text for --fake-embeddings")
+    parser.add_argument("--output", help="Write the results JSON to this file")
+    parser.add_argument("--compare", help="Previous results JSON to compare against")
+    # Internal: run a single scenario in this process
+    parser.add_argument("--scenario", choices=SCENARIOS, help=argparse.SUPPRESS)
+    parser.add_argument("--size", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.scenario:
+        run_scenario(args)
+        return
+    
+    runs = []
+    for scenario in args.scenarios:
+        sizes = args.upload_sizes if scenario == "upload" else args.concurrency
+        runs.extend((scenario, size) for size in sizes)
+    
+    results = []
+    for scenario, size in runs:
+        completed = subprocess.run(scenario_command(args, scenario, size), capture_output=True, text=True)
+        if completed.returncode != 0:
+            print(f"{scenario} {size}: failed\n{completed.stderr}", file=sys.stderr)
+            continue
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        results.append(result)
+        
+        if scenario == "upload":
+            print(f"upload  {size:>8} chunks  {result['throughput_per_s']:>10.1f} chunks/s  {result['duration_s']:>8.2f}s  rss {result['peak_rss_mb']:.0f} MiB  {result['status']}")
+        else:
+            latency = result["latency_ms"]
+            print(
+                f"{scenario:<7} c={size:<5} {result['throughput_per_s']:>10.1f} req/s  "
+                f"p50 {latency['p50']:.1f}ms  p95 {latency['p95']:.1f}ms  p99 {latency['p99']:.1f}ms  "
+                f"rss {result['peak_rss_mb']:.0f} MiB  errors {result['errors']}"
+            )
+    
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "config": {
+            "pinecone_latency": args.pinecone_latency,
+            "llm_latency": args.llm_latency,
+            "fake_embeddings": args.fake_embeddings,
+            "embedding_latency": args.embedding_latency,
+            "requests": args.requests,
+            "corpus_size": args.corpus_size
+        },
+        "results": results
+    }
+    
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nWrote {args.output}")
+    else:
+        print(json.dumps(report, indent=2))
+    
+    if args.compare:
+        compare(results, args.compare)
+
+if __name__ == "__main__":
+    main()
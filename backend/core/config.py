@@ -1,14 +1,117 @@
-from typing import List
+from typing import List, Optional
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
     # OpenAI Configuration
     openai_api_key: str
     
+    # Vector Store Configuration
+    vector_store_backend: str = "pinecone"  # "pinecone" or "local"
+    local_vector_store_path: str = "vector_store"
+    local_vector_index: str = "flat"  # "flat" (exact) or "ivf" (approximate)
+    local_ivf_nlist: int = 1024
+    local_ivf_nprobe: int = 16
+    vector_store_generation: str = "1"  # Change after editing the store outside the app to re-upsert every chunk
+    
     # Pinecone Configuration
-    pinecone_api_key: str
+    pinecone_api_key: str = ""
     pinecone_environment: str = "us-east-1"
     pinecone_index: str = "journal-chunks"
+    index_stats_ttl_seconds: float = 30.0
+    upsert_concurrency: int = 4  # upsert requests in flight
+    upsert_max_batch_vectors: int = 1000  # Pinecone's per-request record limit
+    upsert_max_batch_bytes: int = 2_000_000  # Pinecone's per-request payload limit is 2MB
+    upsert_max_retries: int = 5
+    upsert_retry_base_delay: float = 0.5
+    upsert_retry_max_delay: float = 30.0
+    
+    # Embedding Configuration
+    embedding_batch_size: int = 64
+    embedding_num_workers: int = 0  # >1 encodes large batches across worker processes
+    embedding_executor_workers: int = 2  # concurrent encode calls allowed from request handlers
+    embedding_backend: str = "torch"  # "torch" or "onnx" (ONNX Runtime on CPU)
+    embedding_onnx_threads: int = 0  # intra-op threads; 0 lets ONNX Runtime decide
+    embedding_onnx_quantize: bool = False  # dynamic int8 quantization
+    embedding_onnx_quantization: str = "avx2"  # "arm64", "avx2", "avx512" or "avx512_vnni"
+    embedding_onnx_dir: str = "onnx_models"  # where quantized models are exported
+    embedding_server_socket: Optional[str] = None  # Use the shared embedding server on this Unix socket
+    embedding_server_timeout: float = 30.0
+    embedding_server_max_batch: int = 256  # Texts the server encodes in one call
+    query_batching_enabled: bool = True  # Encode concurrent search queries in micro-batches
+    query_batch_window_ms: float = 2.0  # How long a batch waits for more queries
+    query_batch_max_size: int = 64  # Queries that close a batch early
+    
+    # Ingestion Pipeline and Background Jobs
+    ingest_batch_size: int = 256  # chunks per validate/embed/upsert batch
+    ingest_queue_size: int = 4  # batches buffered between pipeline stages
+    ingest_max_reported_failures: int = 100  # failed chunks listed per job
+    ingest_jobs_db_path: str = "ingestion_jobs.sqlite3"
+    ingest_spool_dir: str = "ingestion_spool"
+    ingest_job_workers: int = 1  # jobs processed concurrently per API process
+    ingest_job_lease_seconds: float = 300.0  # a running job silent this long is resumed elsewhere
+    ingest_job_max_attempts: int = 3
+    ingest_job_poll_seconds: float = 2.0
+    embedding_store_enabled: bool = True  # Skip unchanged chunks and reuse embeddings on re-upload
+    embedding_store_path: str = "embedding_store.sqlite3"
+    ingest_delete_vanished_chunks: bool = False  # Delete chunks missing from uploads marked replace_documents
+    
+    # Watch-Directory Ingestion Daemon (python -m services.watcher)
+    watch_directory: Optional[str] = None
+    watch_processed_log_path: str = "watch_processed.sqlite3"
+    watch_recursive: bool = True
+    watch_settle_seconds: float = 2.0  # Quiet time before a changed file is read
+    watch_chunk_workers: Optional[int] = None  # Chunking processes; None uses every CPU, 0 chunks in-process
+    watch_max_files_in_flight: int = 4
+    watch_chunk_max_chars: int = 2000
+    watch_poll_seconds: Optional[float] = None  # Rescan this often instead of using file-system events
+    watch_retry_seconds: float = 600.0  # Time before a failed or partially stored file is ingested again
+    
+    # Query Embedding Cache
+    query_cache_size: int = 1024  # 0 disables the cache
+    query_cache_ttl_seconds: Optional[float] = None
+    query_cache_path: Optional[str] = None  # SQLite file shared by all workers
+    
+    # Lexical (BM25) Index
+    lexical_index_enabled: bool = True
+    lexical_index_path: str = "lexical_index.sqlite3"
+    bm25_k1: float = 1.2
+    bm25_b: float = 0.75
+    hybrid_rrf_k: int = 60  # Reciprocal rank fusion constant
+    
+    # Batch Search
+    batch_search_max_queries: int = 1000
+    batch_search_concurrency: int = 32  # Vector store queries in flight per batch
+    
+    # Question Answering
+    context_token_budget: int = 3000  # Maximum prompt tokens spent on retrieved chunks
+    
+    # Answer Cache
+    answer_cache_enabled: bool = True
+    answer_cache_path: str = "answer_cache.sqlite3"
+    answer_cache_max_entries: int = 10000
+    answer_cache_ttl_seconds: Optional[float] = 7 * 24 * 3600
+    semantic_cache_enabled: bool = False  # Reuses answers of similar questions, which may differ in meaning
+    semantic_cache_threshold: float = 0.92  # Cosine similarity between questions
+    semantic_cache_min_overlap: float = 0.6  # Jaccard overlap between retrieved chunk ids
+    semantic_cache_max_entries: int = 2000
+    
+    # Chunk Usage Counts
+    usage_tracking_enabled: bool = True  # Count search hits and citations into usage_count
+    usage_journal_path: str = "usage_counts.sqlite3"
+    usage_journal_interval_seconds: float = 1.0  # Hits recorded in memory are journaled this often
+    usage_flush_interval_seconds: float = 30.0  # Journaled hits are applied to the vector store this often
+    usage_flush_batch_size: int = 100  # Chunks per metadata update batch
+    usage_flush_lease_seconds: float = 300.0  # An unfinished flush's hits are requeued after this long
+    usage_most_used_max: int = 1000  # Largest limit accepted by the most used chunks endpoint
+    
+    # Metrics and Profiling
+    metrics_enabled: bool = True
+    server_timing_enabled: bool = True  # Per-stage timings in a Server-Timing response header
+    profiler_enabled: bool = False  # Requires pyinstrument
+    profiler_sample_rate: float = 1.0  # Fraction of requests profiled
+    profiler_interval_ms: float = 1.0
+    profiler_slow_request_ms: float = 1000.0  # Profiles are kept only for requests this slow
+    profiler_output_dir: str = "profiles"
     
     # API Configuration
     allowed_origins: List[str] = ["http://localhost:5173", "*"]
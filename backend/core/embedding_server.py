@@ -0,0 +1,279 @@
+"""Embedding server shared by every API worker on a host.
+
+Loads the embedding model once and serves encode requests over a Unix socket,
+so N API workers hold one copy of the model instead of N. Requests arriving
+together from different workers are encoded in one batch.
+
+    python -m core.embedding_server --socket /run/citeme/embeddings.sock
+
+API workers use it when EMBEDDING_SERVER_SOCKET points at the socket.
+"""
+import argparse
+import json
+import os
+import queue
+import socket
+import socketserver
+import struct
+import threading
+import numpy as np
+from core.config import settings
+from core.embeddings import embedding_model_id, load_model
+from utils.helpers import get_logger
+
+logger = get_logger("embedding_server")
+
+# Every message is a 4-byte big-endian length followed by the payload
+_LENGTH = struct.Struct("!I")
+
+def _recv_exact(sock, size):
+    buffer = bytearray()
+    while len(buffer) < size:
+        data = sock.recv(size - len(buffer))
+        if not data:
+            raise ConnectionError("connection closed")
+        buffer.extend(data)
+    return bytes(buffer)
+
+def _recv_frame(sock):
+    (size,) = _LENGTH.unpack(_recv_exact(sock, _LENGTH.size))
+    return _recv_exact(sock, size)
+
+def _send_frames(sock, *payloads):
+    sock.sendall(b"".join(_LENGTH.pack(len(payload)) + payload for payload in payloads))
+
+class _PendingEncode:
+    """Texts from one request, waiting for the encoder thread"""
+    
+    def __init__(self, texts):
+        self.texts = texts
+        self.done = threading.Event()
+        self.embeddings = None
+        self.error = None
+
+class _Handler(socketserver.BaseRequestHandler):
+    """Serve requests from one client connection until it closes
+    
+    Requests are JSON: {"texts": [...]} is answered with a JSON header
+    {"rows": n, "dimension": d} and a frame of n*d float32 values, and
+    {"op": "info"} with the model id and dimension. Failures are answered
+    with {"error": message} and the connection stays usable.
+    """
+    
+    def handle(self):
+        while True:
+            try:
+                request = json.loads(_recv_frame(self.request))
+            except ConnectionError:
+                return
+            
+            if request.get("op") == "info":
+                _send_frames(self.request, json.dumps(self.server.info()).encode("utf-8"))
+                continue
+            
+            try:
+                embeddings = self.server.encode(request["texts"])
+            except Exception as e:
+                _send_frames(self.request, json.dumps({"error": str(e)}).encode("utf-8"))
+                continue
+            header = {"rows": embeddings.shape[0], "dimension": embeddings.shape[1]}
+            _send_frames(self.request, json.dumps(header).encode("utf-8"), embeddings.tobytes())
+
+class EmbeddingServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Unix-socket server encoding texts with one shared model
+    
+    Each connection is served by its own thread, but all encoding happens on
+    a single encoder thread: whatever requests are waiting when it becomes
+    free are encoded together, up to max_batch texts, so concurrent requests
+    from different workers share encode calls instead of contending for the
+    CPU.
+    
+    Args:
+        path (str): Socket path; a stale socket file is replaced
+        model (SentenceTransformer): The loaded embedding model
+        max_batch (int): Maximum texts encoded in one call (a larger request
+            is still encoded whole)
+        batch_size (int): Texts per forward pass within a call
+    """
+    
+    daemon_threads = True
+    
+    def __init__(self, path, model, max_batch=256, batch_size=64):
+        self.model = model
+        self.max_batch = max_batch
+        self.batch_size = batch_size
+        self.dimension = model.get_sentence_embedding_dimension()
+        self._requests = queue.Queue()
+        if os.path.exists(path):
+            os.unlink(path)
+        super().__init__(path, _Handler)
+        self._encoder = threading.Thread(target=self._encode_loop, name="embedding-encoder", daemon=True)
+        self._encoder.start()
+    
+    def info(self):
+        """Describe the served model
+        
+        Returns:
+            dict: Model id and embedding dimension
+        """
+        return {"model": embedding_model_id(), "dimension": self.dimension}
+    
+    def encode(self, texts):
+        """Encode texts on the encoder thread, batched with other waiting requests
+        
+        Args:
+            texts (list): Texts to encode
+        
+        Returns:
+            numpy.ndarray: float32 array of shape (len(texts), dimension)
+        """
+        pending = _PendingEncode(list(texts))
+        self._requests.put(pending)
+        pending.done.wait()
+        if pending.error is not None:
+            raise pending.error
+        return pending.embeddings
+    
+    def _encode_loop(self):
+        while True:
+            batch = [self._requests.get()]
+            if batch[0] is None:
+                return
+            total = len(batch[0].texts)
+            while total < self.max_batch:
+                try:
+                    pending = self._requests.get_nowait()
+                except queue.Empty:
+                    break
+                if pending is None:
+                    self._requests.put(None)
+                    break
+                batch.append(pending)
+                total += len(pending.texts)
+            
+            texts = [text for pending in batch for text in pending.texts]
+            try:
+                embeddings = np.empty((0, self.dimension), dtype=np.float32)
+                if texts:
+                    embeddings = np.asarray(
+                        self.model.encode(texts, batch_size=self.batch_size, convert_to_numpy=True),
+                        dtype=np.float32
+                    )
+            except Exception as e:
+                for pending in batch:
+                    pending.error = e
+                    pending.done.set()
+                continue
+            
+            offset = 0
+            for pending in batch:
+                pending.embeddings = embeddings[offset:offset + len(pending.texts)]
+                offset += len(pending.texts)
+                pending.done.set()
+    
+    def server_close(self):
+        """Stop the encoder thread, close the socket and remove the socket file"""
+        self._requests.put(None)
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+
+class RemoteEmbeddingModel:
+    """Client for the embedding server, standing in for the SentenceTransformer
+    
+    Implements the encode and get_sentence_embedding_dimension methods used
+    by core.embeddings. Each thread keeps its own connection, so concurrent
+    encode calls from the embedding executor reach the server together and
+    can be batched there.
+    
+    Args:
+        path (str): Socket path of the embedding server
+        timeout (float): Seconds to wait for a response
+    """
+    
+    def __init__(self, path, timeout=30.0):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        self._dimension = None
+    
+    def _connection(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.path)
+            except OSError:
+                sock.close()
+                raise
+            self._local.sock = sock
+        return sock
+    
+    def _disconnect(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            sock.close()
+            self._local.sock = None
+    
+    def _request(self, request):
+        """Send a request and read the response header and optional data frame
+        
+        A dropped connection (e.g. after a server restart) is retried once on a
+        new connection.
+        
+        Raises:
+            RuntimeError: If the server is unreachable or reports an error
+        """
+        payload = json.dumps(request).encode("utf-8")
+        for attempt in range(2):
+            try:
+                sock = self._connection()
+                _send_frames(sock, payload)
+                header = json.loads(_recv_frame(sock))
+                data = _recv_frame(sock) if "rows" in header else None
+                break
+            except OSError as e:
+                # Includes timeouts: the stream may be mid-response, so it is not reused
+                self._disconnect()
+                if attempt:
+                    raise RuntimeError(f"Embedding server at {self.path} is unavailable: {str(e)}") from e
+        
+        if "error" in header:
+            raise RuntimeError(f"Embedding server error: {header['error']}")
+        return header, data
+    
+    def get_sentence_embedding_dimension(self):
+        if self._dimension is None:
+            self._dimension = self._request({"op": "info"})[0]["dimension"]
+        return self._dimension
+    
+    def encode(self, sentences, batch_size=32, convert_to_numpy=True, **kwargs):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        header, data = self._request({"texts": texts})
+        embeddings = np.frombuffer(data, dtype=np.float32).reshape(header["rows"], header["dimension"])
+        return embeddings[0] if single else embeddings
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--socket", default=settings.embedding_server_socket, help="Socket path to listen on")
+    parser.add_argument("--max-batch", type=int, default=settings.embedding_server_max_batch)
+    args = parser.parse_args()
+    if not args.socket:
+        parser.error("set --socket or EMBEDDING_SERVER_SOCKET")
+    
+    # load_model rather than get_model: the server itself must not connect to the socket
+    model = load_model()
+    model.encode([f"warmup query {i}" for i in range(settings.embedding_batch_size)], batch_size=settings.embedding_batch_size)
+    server = EmbeddingServer(args.socket, model, max_batch=args.max_batch, batch_size=settings.embedding_batch_size)
+    logger.info(f"Serving {embedding_model_id()} on {args.socket}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
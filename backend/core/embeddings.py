@@ -1,7 +1,141 @@
-from sentence_transformers import SentenceTransformer
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from core.config import settings
+from core.metrics import timed, BATCH_SIZE, CACHE_REQUESTS
 
-# Initialize the embedding model
-model = SentenceTransformer('all-MiniLM-L6-v2')  # Can be replaced with a more domain-specific model
+MODEL_NAME = 'all-MiniLM-L6-v2'  # Can be replaced with a more domain-specific model
+
+# Embedding model, loaded on first use so importing this module stays cheap
+model = None
+_model_lock = threading.Lock()
+_model_ready = False
+
+# Multi-process encoding pool, started on first use
+_pool = None
+
+# Bounded executor that keeps CPU-bound encoding off the event loop
+_executor = ThreadPoolExecutor(
+    max_workers=settings.embedding_executor_workers,
+    thread_name_prefix="embedding"
+)
+
+def _load_onnx_model():
+    """Load the model on ONNX Runtime, exporting an int8 copy first if requested"""
+    import onnxruntime
+    from sentence_transformers import SentenceTransformer
+    
+    session_options = onnxruntime.SessionOptions()
+    if settings.embedding_onnx_threads > 0:
+        session_options.intra_op_num_threads = settings.embedding_onnx_threads
+    model_kwargs = {"provider": "CPUExecutionProvider", "session_options": session_options}
+    
+    if not settings.embedding_onnx_quantize:
+        return SentenceTransformer(MODEL_NAME, backend="onnx", model_kwargs=model_kwargs)
+    
+    # Dynamic quantization needs no calibration data, so the int8 graph is
+    # exported once next to a saved copy of the model and reused afterwards
+    config = settings.embedding_onnx_quantization
+    save_dir = os.path.join(settings.embedding_onnx_dir, MODEL_NAME)
+    file_name = f"onnx/model_qint8_{config}.onnx"
+    if not os.path.exists(os.path.join(save_dir, file_name)):
+        from sentence_transformers import export_dynamic_quantized_onnx_model
+        exported = SentenceTransformer(MODEL_NAME, backend="onnx", model_kwargs=model_kwargs)
+        exported.save(save_dir)
+        export_dynamic_quantized_onnx_model(exported, config, save_dir)
+    
+    return SentenceTransformer(save_dir, backend="onnx", model_kwargs={**model_kwargs, "file_name": file_name})
+
+def load_model(backend=None):
+    """Load the embedding model on an inference backend
+    
+    Both backends run the same weights, so embeddings keep the dimension
+    reported by get_model_dimension and existing indexes stay valid.
+    
+    Args:
+        backend (str, optional): "torch" or "onnx", defaults to settings.embedding_backend
+        
+    Returns:
+        SentenceTransformer: The loaded model
+        
+    Raises:
+        ValueError: If the backend is unknown
+    """
+    backend = (backend or settings.embedding_backend).lower()
+    if backend == "torch":
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(MODEL_NAME)
+    if backend == "onnx":
+        return _load_onnx_model()
+    raise ValueError(f"Unknown embedding backend: {backend}")
+
+def embedding_model_id():
+    """Identify the model and backend that produce the stored embeddings
+    
+    The int8 ONNX model's embeddings differ slightly from the full-precision
+    ones, so it gets its own id.
+    
+    Returns:
+        str: The model id, e.g. "all-MiniLM-L6-v2" or "all-MiniLM-L6-v2:onnx-qint8-avx2"
+    """
+    if settings.embedding_backend.lower() == "onnx" and settings.embedding_onnx_quantize:
+        return f"{MODEL_NAME}:onnx-qint8-{settings.embedding_onnx_quantization}"
+    return MODEL_NAME
+
+def get_model():
+    """Get the embedding model, loading it on first use
+    
+    sentence-transformers (and torch or ONNX Runtime) are imported here rather
+    than at module import, so processes that never embed anything do not pay
+    for them. With settings.embedding_server_socket set, the model is a client
+    of the shared embedding server (core.embedding_server) instead, and no
+    model is loaded in this process.
+    
+    Returns:
+        SentenceTransformer: The embedding model, or a RemoteEmbeddingModel
+    """
+    global model
+    
+    if model is None:
+        with _model_lock:
+            if model is None:
+                if settings.embedding_server_socket:
+                    from core.embedding_server import RemoteEmbeddingModel
+                    model = RemoteEmbeddingModel(settings.embedding_server_socket, settings.embedding_server_timeout)
+                else:
+                    model = load_model()
+    return model
+
+def warmup_model():
+    """Load the model and encode a dummy batch so the first request runs warm
+    
+    Marks the model ready for is_model_ready() once the batch has been encoded.
+    """
+    global _model_ready
+    
+    batch_size = settings.embedding_batch_size
+    generate_embeddings([f"warmup query {i}" for i in range(batch_size)], batch_size=batch_size, num_workers=0)
+    _model_ready = True
+
+async def warmup_model_async():
+    """Warm up the model on the embedding executor without blocking the event loop"""
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(_executor, warmup_model)
+
+def is_model_ready():
+    """Whether warmup_model has finished
+    
+    Returns:
+        bool: True once the model is loaded and warm
+    """
+    return _model_ready
 
 def generate_embedding(text):
     """Generate embedding for a text using the sentence transformer model
@@ -12,7 +146,471 @@ def generate_embedding(text):
     Returns:
         list: The embedding vector as a list
     """
-    return model.encode(text).tolist()
+    with timed("encode"):
+        return get_model().encode(text).tolist()
+
+def _get_pool(num_workers):
+    """Start (once) and return the multi-process encoding pool
+    
+    Args:
+        num_workers (int): Number of CPU worker processes
+        
+    Returns:
+        dict: The sentence-transformers process pool
+    """
+    global _pool
+    
+    if _pool is None:
+        _pool = get_model().start_multi_process_pool(target_devices=["cpu"] * num_workers)
+    
+    return _pool
+
+def close_embedding_pool():
+    """Stop the multi-process encoding pool if it was started"""
+    global _pool
+    
+    if _pool is not None:
+        get_model().stop_multi_process_pool(_pool)
+        _pool = None
+
+def generate_embeddings(texts, batch_size=None, num_workers=None):
+    """Generate embeddings for many texts in batches
+    
+    Texts are encoded in order of length so that each batch pads to a similar
+    sequence length; the results are returned in the original input order.
+    
+    Args:
+        texts (list): The texts to generate embeddings for
+        batch_size (int, optional): Texts per encode batch, defaults to settings.embedding_batch_size
+        num_workers (int, optional): Worker processes to encode with, defaults to
+            settings.embedding_num_workers (0 or 1 encodes in-process)
+        
+    Returns:
+        numpy.ndarray: Array of shape (len(texts), dimension) with one embedding per text
+    """
+    batch_size = batch_size or settings.embedding_batch_size
+    num_workers = settings.embedding_num_workers if num_workers is None else num_workers
+    
+    embeddings = np.empty((len(texts), get_model_dimension()), dtype=np.float32)
+    if not texts:
+        return embeddings
+    
+    BATCH_SIZE.observe(len(texts), kind="embedding")
+    order = np.argsort([len(text) for text in texts], kind="stable")
+    sorted_texts = [texts[i] for i in order]
+    
+    # Only worth shipping work to other processes when every worker gets a full
+    # batch, and never when the embedding server does the encoding
+    if num_workers > 1 and len(texts) >= batch_size * num_workers and not settings.embedding_server_socket:
+        encoded = get_model().encode_multi_process(
+            sorted_texts,
+            _get_pool(num_workers),
+            batch_size=batch_size,
+            chunk_size=batch_size * 4
+        )
+        embeddings[order] = encoded
+        return embeddings
+    
+    for start in range(0, len(sorted_texts), batch_size):
+        batch_order = order[start:start + batch_size]
+        with timed("encode"):
+            embeddings[batch_order] = get_model().encode(
+                sorted_texts[start:start + batch_size],
+                batch_size=batch_size,
+                convert_to_numpy=True
+            )
+    
+    return embeddings
+
+async def generate_embedding_async(text):
+    """Generate embedding for a text without blocking the event loop
+    
+    Args:
+        text (str): The text to generate embedding for
+        
+    Returns:
+        list: The embedding vector as a list
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, generate_embedding, text)
+
+async def generate_embeddings_async(texts, batch_size=None, num_workers=None):
+    """Generate embeddings for many texts without blocking the event loop
+    
+    Args:
+        texts (list): The texts to generate embeddings for
+        batch_size (int, optional): Texts per encode batch
+        num_workers (int, optional): Worker processes to encode with
+        
+    Returns:
+        numpy.ndarray: Array of shape (len(texts), dimension) with one embedding per text
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, generate_embeddings, texts, batch_size, num_workers)
+
+class QueryEmbeddingCache:
+    """Bounded LRU cache of query embeddings with optional TTL
+    
+    Entries are keyed on the normalized query text plus the model id (see
+    embedding_model_id), so backends with differing embeddings never share
+    entries. An
+    optional SQLite file acts as a second tier shared by every worker process
+    pointing at the same path.
+    """
+    
+    def __init__(self, max_size=1024, ttl_seconds=None, disk_path=None, model_name=MODEL_NAME, clock=time.time):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.disk_path = disk_path
+        self.model_name = model_name
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        
+        if disk_path:
+            with self._connect() as conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS query_embeddings "
+                    "(key TEXT PRIMARY KEY, embedding BLOB NOT NULL, created REAL NOT NULL)"
+                )
+    
+    @staticmethod
+    def normalize(text):
+        """Normalize a query so trivially different spellings share an entry
+        
+        Args:
+            text (str): The raw query text
+            
+        Returns:
+            str: NFKC-normalized, case-folded text with collapsed whitespace
+        """
+        return " ".join(unicodedata.normalize("NFKC", text).casefold().split())
+    
+    def _key(self, text):
+        digest = hashlib.sha256(self.normalize(text).encode("utf-8")).hexdigest()
+        return f"{self.model_name}:{digest}"
+    
+    def _connect(self):
+        return sqlite3.connect(self.disk_path, timeout=5)
+    
+    def _expired(self, created):
+        return self.ttl_seconds is not None and self._clock() - created > self.ttl_seconds
+    
+    def get_from_memory(self, text):
+        """Look up a query in the in-process tier only
+        
+        Misses are not counted, so a caller can fall back to get() without
+        recording the same lookup twice.
+        
+        Args:
+            text (str): The query text
+            
+        Returns:
+            list or None: The cached embedding, or None if not cached in memory
+        """
+        key = self._key(text)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            embedding, created = entry
+            if self._expired(created):
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return embedding
+    
+    def get(self, text):
+        """Look up a query embedding in memory, then in the shared disk tier
+        
+        Args:
+            text (str): The query text
+            
+        Returns:
+            list or None: The cached embedding, or None on a miss
+        """
+        embedding = self.get_from_memory(text)
+        if embedding is not None:
+            return embedding
+        
+        if self.disk_path:
+            key = self._key(text)
+            with self._connect() as conn:
+                row = conn.execute(
+                    "SELECT embedding, created FROM query_embeddings WHERE key = ?", (key,)
+                ).fetchone()
+            if row and not self._expired(row[1]):
+                embedding = np.frombuffer(row[0], dtype=np.float32).tolist()
+                with self._lock:
+                    self.disk_hits += 1
+                    self._store(key, embedding, row[1])
+                return embedding
+        
+        with self._lock:
+            self.misses += 1
+        return None
+    
+    def _store(self, key, embedding, created):
+        self._entries[key] = (embedding, created)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+    
+    def set(self, text, embedding):
+        """Cache the embedding for a query
+        
+        Args:
+            text (str): The query text
+            embedding (list): The embedding vector
+        """
+        key = self._key(text)
+        created = self._clock()
+        with self._lock:
+            self._store(key, embedding, created)
+        
+        if self.disk_path:
+            blob = np.asarray(embedding, dtype=np.float32).tobytes()
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO query_embeddings (key, embedding, created) VALUES (?, ?, ?)",
+                    (key, blob, created)
+                )
+                if self.ttl_seconds is not None:
+                    conn.execute(
+                        "DELETE FROM query_embeddings WHERE created < ?", (created - self.ttl_seconds,)
+                    )
+    
+    def clear(self):
+        """Drop every in-memory entry and reset the counters"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.disk_hits = self.misses = 0
+    
+    def stats(self):
+        """Get cache counters
+        
+        Returns:
+            dict: Hit/miss counters, hit rate and current size
+        """
+        with self._lock:
+            hits = self.hits + self.disk_hits
+            lookups = hits + self.misses
+            return {
+                "model": self.model_name,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "shared_disk": bool(self.disk_path),
+            }
+
+# Process-wide query embedding cache
+query_cache = QueryEmbeddingCache(
+    max_size=settings.query_cache_size,
+    ttl_seconds=settings.query_cache_ttl_seconds,
+    disk_path=settings.query_cache_path,
+    model_name=embedding_model_id()
+)
+
+def get_query_embedding(text):
+    """Get the embedding for a search query, serving repeats from the cache
+    
+    Args:
+        text (str): The query text
+        
+    Returns:
+        list: The embedding vector as a list
+    """
+    if settings.query_cache_size <= 0:
+        return generate_embedding(text)
+    
+    embedding = query_cache.get(text)
+    CACHE_REQUESTS.inc(cache="query_embedding", result="miss" if embedding is None else "hit")
+    if embedding is None:
+        embedding = generate_embedding(text)
+        query_cache.set(text, embedding)
+    return embedding
+
+async def get_query_embedding_async(text):
+    """Get the embedding for a search query without blocking the event loop
+    
+    In-memory cache hits are answered directly so they never queue behind
+    encode work on the embedding executor. Misses are encoded in micro-batches
+    with other concurrent queries when settings.query_batching_enabled is set.
+    
+    Args:
+        text (str): The query text
+        
+    Returns:
+        list: The embedding vector as a list
+    """
+    if settings.query_cache_size > 0:
+        embedding = query_cache.get_from_memory(text)
+        if embedding is not None:
+            CACHE_REQUESTS.inc(cache="query_embedding", result="hit")
+            return embedding
+    
+    if settings.query_batching_enabled:
+        return await query_batcher.embed(text)
+    
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, get_query_embedding, text)
+
+def get_query_embeddings(texts):
+    """Get embeddings for many search queries, encoding cache misses in one batch
+    
+    Args:
+        texts (list): The query texts
+        
+    Returns:
+        list: One embedding vector (as a list) per text, in input order
+    """
+    use_cache = settings.query_cache_size > 0
+    embeddings = [query_cache.get(text) if use_cache else None for text in texts]
+    if use_cache:
+        hits = sum(embedding is not None for embedding in embeddings)
+        CACHE_REQUESTS.inc(hits, cache="query_embedding", result="hit")
+        CACHE_REQUESTS.inc(len(texts) - hits, cache="query_embedding", result="miss")
+    
+    missing = list(dict.fromkeys(text for text, embedding in zip(texts, embeddings) if embedding is None))
+    if missing:
+        encoded = dict(zip(missing, generate_embeddings(missing).tolist()))
+        if use_cache:
+            for text, embedding in encoded.items():
+                query_cache.set(text, embedding)
+        embeddings = [encoded[text] if embedding is None else embedding for text, embedding in zip(texts, embeddings)]
+    
+    return embeddings
+
+async def get_query_embeddings_async(texts):
+    """Get embeddings for many search queries without blocking the event loop
+    
+    Args:
+        texts (list): The query texts
+        
+    Returns:
+        list: One embedding vector (as a list) per text, in input order
+    """
+    if settings.query_cache_size > 0:
+        embeddings = [query_cache.get_from_memory(text) for text in texts]
+        if all(embedding is not None for embedding in embeddings):
+            CACHE_REQUESTS.inc(len(texts), cache="query_embedding", result="hit")
+            return embeddings
+    
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, get_query_embeddings, texts)
+
+class QueryEmbeddingBatcher:
+    """Coalesce concurrent single-query embeddings into batched encode calls
+    
+    While a batch is being encoded, the next query to arrive opens a window;
+    every query arriving within window_ms, up to max_batch_size, joins it, and
+    the whole batch is encoded in one call on the embedding executor. Each
+    caller gets its own embedding back. A query arriving while nothing is
+    being encoded is sent on at once, so only a loaded service trades up to
+    window_ms of latency for far fewer encode calls.
+    
+    Args:
+        encode (callable): Function embedding a list of texts, returning one
+            embedding per text in order; defaults to get_query_embeddings
+        window_ms (float, optional): How long a batch stays open, defaults to
+            settings.query_batch_window_ms
+        max_batch_size (int, optional): Queries that close a batch early, defaults
+            to settings.query_batch_max_size
+    """
+    
+    def __init__(self, encode=None, window_ms=None, max_batch_size=None):
+        self._encode = encode
+        self.window_ms = window_ms
+        self.max_batch_size = max_batch_size
+        self._pending = []  # (text, future) waiting for the open batch to close
+        self._timer = None
+        self._tasks = set()
+        self._encoding = 0  # batches being encoded
+        self.batches = 0
+        self.queries = 0
+    
+    async def embed(self, text):
+        """Get the embedding of a query, encoded together with its neighbours
+        
+        Args:
+            text (str): The query text
+            
+        Returns:
+            list: The embedding vector as a list
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+        
+        max_batch_size = self.max_batch_size or settings.query_batch_max_size
+        window_ms = settings.query_batch_window_ms if self.window_ms is None else self.window_ms
+        # With no batch encoding there is nothing to wait for, so an idle
+        # service answers a lone query without paying the window
+        if len(self._pending) >= max_batch_size or not self._encoding:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(window_ms / 1000, self._flush)
+        return await future
+    
+    def _flush(self):
+        """Close the open batch and start encoding it"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            self._encoding += 1
+            task = asyncio.ensure_future(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+    
+    async def _run(self, batch):
+        self.batches += 1
+        self.queries += len(batch)
+        BATCH_SIZE.observe(len(batch), kind="query_embedding")
+        loop = asyncio.get_running_loop()
+        encode = self._encode or get_query_embeddings
+        try:
+            embeddings = await loop.run_in_executor(_executor, encode, [text for text, _ in batch])
+        except Exception as e:
+            embeddings, error = None, e
+        finally:
+            # Counted down before callers wake up, so their next query sees the batcher idle
+            self._encoding -= 1
+        
+        # Callers that gave up (e.g. disconnected clients) have cancelled futures
+        for i, (_, future) in enumerate(batch):
+            if future.done():
+                continue
+            if embeddings is None:
+                future.set_exception(error)
+            else:
+                future.set_result(embeddings[i])
+    
+    def stats(self):
+        """Get batching counters
+        
+        Returns:
+            dict: Batches encoded, queries served and the mean batch size
+        """
+        return {
+            "enabled": settings.query_batching_enabled,
+            "batches": self.batches,
+            "queries": self.queries,
+            "mean_batch_size": self.queries / self.batches if self.batches else 0.0,
+        }
+
+# Process-wide batcher for single-query embeddings
+query_batcher = QueryEmbeddingBatcher()
 
 def get_model_dimension():
     """Get the embedding dimension of the current model
@@ -20,4 +618,4 @@ def get_model_dimension():
     Returns:
         int: The dimension of the embedding vectors
     """
-    return model.get_sentence_embedding_dimension()
+    return get_model().get_sentence_embedding_dimension()
@@ -0,0 +1,278 @@
+import bisect
+import contextvars
+import os
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from core.config import settings
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 2048, 4096)
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+
+# Every metric, in the order it is exported
+_registry = []
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    """Monotonic counter with optional labels, exported in Prometheus text format
+    
+    Args:
+        name (str): Metric name
+        documentation (str): Help text
+        labelnames (tuple): Label names every sample must set
+        registry (list, optional): Registry to export from, defaults to the global one
+    """
+    
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+        (_registry if registry is None else registry).append(self)
+    
+    def inc(self, amount=1, **labels):
+        """Add to the counter for a label combination"""
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+    
+    def value(self, **labels):
+        """Current value for a label combination"""
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            return self._values.get(key, 0)
+    
+    def collect(self):
+        """Render the counter as exposition lines"""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels
+    
+    Args:
+        name (str): Metric name
+        documentation (str): Help text
+        labelnames (tuple): Label names every observation must set
+        buckets (tuple): Increasing bucket upper bounds; +Inf is added automatically
+        registry (list, optional): Registry to export from, defaults to the global one
+    """
+    
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS, registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._series = {}  # label values -> [bucket counts..., count, sum]
+        (_registry if registry is None else registry).append(self)
+    
+    def observe(self, value, **labels):
+        """Record one observation for a label combination"""
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        position = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2) + [0.0]
+            series[position] += 1
+            series[-2] += 1
+            series[-1] += value
+    
+    def count(self, **labels):
+        """Number of observations for a label combination"""
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            return series[-2] if series else 0
+    
+    def collect(self):
+        """Render the histogram as exposition lines"""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((key, list(values)) for key, values in self._series.items())
+        for key, values in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), values):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, [("le", _format_value(float(bound)))])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_count{labels} {values[-2]}")
+            lines.append(f"{self.name}_sum{labels} {_format_value(values[-1])}")
+        return lines
+
+def render_metrics():
+    """Render every metric in the Prometheus text exposition format
+    
+    Returns:
+        str: The exposition text
+    """
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.collect())
+    return "\n".join(lines) + "\n"
+
+STAGE_SECONDS = Histogram(
+    "citeme_stage_duration_seconds",
+    "Time spent in each stage of request handling and ingestion",
+    ["stage"]
+)
+REQUEST_SECONDS = Histogram(
+    "citeme_http_request_duration_seconds",
+    "HTTP request latency",
+    ["method", "route", "status"]
+)
+BATCH_SIZE = Histogram(
+    "citeme_batch_size",
+    "Items per batch sent to the embedding model, vector store or index",
+    ["kind"],
+    SIZE_BUCKETS
+)
+CACHE_REQUESTS = Counter(
+    "citeme_cache_requests_total",
+    "Cache lookups by cache and result",
+    ["cache", "result"]
+)
+LLM_TOKENS = Histogram(
+    "citeme_llm_tokens",
+    "Tokens per LLM call, for the prompt and the completion",
+    ["kind"],
+    TOKEN_BUCKETS
+)
+
+# Stage timings of the request being handled, reported in its Server-Timing header
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+
+def record_stage(stage, seconds):
+    """Record the duration of a stage
+    
+    Args:
+        stage (str): Stage name
+        seconds (float): Time spent in the stage
+    """
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.append((stage, seconds))
+
+@contextmanager
+def timed(stage):
+    """Time the enclosed block as a stage
+    
+    Args:
+        stage (str): Stage name
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start)
+
+def server_timing(timings, total=None):
+    """Format stage timings as a Server-Timing header value
+    
+    Repeated stages are summed, so a batch reports the total time per stage.
+    
+    Args:
+        timings (list): (stage, seconds) pairs in the order they finished
+        total (float, optional): Whole request duration in seconds
+    
+    Returns:
+        str: The header value
+    """
+    durations = {}
+    for stage, seconds in timings:
+        durations[stage] = durations.get(stage, 0.0) + seconds
+    if total is not None:
+        durations["total"] = total
+    return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in durations.items())
+
+def _start_profiler():
+    """Start a sampling profiler for this request if profiling is enabled and sampled"""
+    if not settings.profiler_enabled or random.random() >= settings.profiler_sample_rate:
+        return None
+    try:
+        from pyinstrument import Profiler
+    except ImportError:
+        print("Warning: PROFILER_ENABLED is set but pyinstrument is not installed")
+        settings.profiler_enabled = False
+        return None
+    profiler = Profiler(interval=settings.profiler_interval_ms / 1000, async_mode="enabled")
+    profiler.start()
+    return profiler
+
+def _save_profile(profiler, request, seconds):
+    """Write the profile of a slow request to the profile directory"""
+    os.makedirs(settings.profiler_output_dir, exist_ok=True)
+    name = re.sub(r"[^A-Za-z0-9]+", "_", request.url.path).strip("_") or "root"
+    path = os.path.join(settings.profiler_output_dir, f"{time.strftime('%Y%m%dT%H%M%S')}_{request.method}_{name}_{seconds * 1000:.0f}ms.html")
+    with open(path, "w") as f:
+        f.write(profiler.output_html())
+    print(f"Slow request {request.method} {request.url.path} took {seconds * 1000:.0f}ms, profile saved to {path}")
+
+async def metrics_middleware(request, call_next):
+    """HTTP middleware recording request latency and stage timings
+    
+    Adds a Server-Timing header with the stages of the request, and, when the
+    profiler is enabled, keeps a sampling profile of requests slower than
+    settings.profiler_slow_request_ms.
+    
+    Args:
+        request (Request): The incoming request
+        call_next (callable): The rest of the application
+    
+    Returns:
+        Response: The response, with a Server-Timing header
+    """
+    if not settings.metrics_enabled:
+        return await call_next(request)
+    
+    timings = []
+    token = _request_timings.set(timings)
+    profiler = _start_profiler()
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        elapsed = time.perf_counter() - start
+        _request_timings.reset(token)
+        route = request.scope.get("route")
+        REQUEST_SECONDS.observe(
+            elapsed,
+            method=request.method,
+            route=route.path if route is not None else "unmatched",
+            status=status
+        )
+        if profiler is not None:
+            profiler.stop()
+            if elapsed * 1000 >= settings.profiler_slow_request_ms:
+                try:
+                    _save_profile(profiler, request, elapsed)
+                except Exception as e:
+                    print(f"Warning: failed to save request profile: {e}")
+    
+    if settings.server_timing_enabled:
+        response.headers["Server-Timing"] = server_timing(timings, elapsed)
+    return response
@@ -0,0 +1,27 @@
+"""Gunicorn configuration sharing one copy of the embedding model across workers.
+
+    pip install gunicorn
+    gunicorn -c gunicorn.conf.py main:app
+
+The app is imported and the model loaded once in the master before the
+workers are forked, so every worker shares the model weights copy-on-write
+instead of loading its own copy. Inference only starts after the fork, in
+each worker's startup warmup, so no torch thread pools cross the fork.
+"""
+import gc
+import multiprocessing
+import os
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+
+def on_starting(server):
+    """Load the model in the master, after the app is preloaded and before workers fork"""
+    from core.embeddings import get_model
+    
+    get_model()
+    # Move everything allocated so far out of the collector's reach, so
+    # collections in the workers do not write to (and copy) the shared pages
+    gc.freeze()
@@ -1,10 +1,18 @@
+import asyncio
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 
 from core.config import settings
+from core.metrics import metrics_middleware
 from api.routes import router
-from services.pinecone_service import initialize_pinecone
+from services.vector_store import initialize_vector_store, close_vector_store
+from services.lexical_index import close_lexical_index
+from services.embedding_store import close_embedding_store
+from core.embeddings import close_embedding_pool, warmup_model_async
+from services.jobs import start_job_workers, stop_job_workers
+from services.usage_counter import start_usage_flusher, stop_usage_flusher
 from utils.helpers import get_logger
 
 # Configure logger
@@ -24,18 +32,53 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
 
+# Record request latency and per-stage timings
+app.middleware("http")(metrics_middleware)
+
 # Include all routes
 app.include_router(router)
 
+# Background warmup started on startup
+_warmup_task = None
+
+async def warm_up_services():
+    """Initialize the vector store, then load the embedding model and run a dummy batch"""
+    try:
+        await run_in_threadpool(initialize_vector_store)
+        await warmup_model_async()
+        logger.info("Services ready")
+    except Exception as e:
+        logger.error(f"Service warmup failed: {str(e)}")
+
 # Initialize services on startup
 @app.on_event("startup")
 async def startup_event():
-    """Initialize services on application startup"""
+    """Initialize services on application startup
+    
+    Slow initialization runs in the background so health checks are answered
+    immediately; /api/ready reports when it has finished.
+    """
+    global _warmup_task
+    
     logger.info("Initializing services...")
-    initialize_pinecone()
-    logger.info("Services initialized")
+    _warmup_task = asyncio.ensure_future(warm_up_services())
+    start_job_workers()
+    start_usage_flusher()
+    logger.info("Services initialized, warming up")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Release service resources on application shutdown"""
+    await stop_job_workers()
+    # Applies the remaining usage counts, so it runs before the vector store closes
+    await run_in_threadpool(stop_usage_flusher)
+    close_vector_store()
+    close_lexical_index()
+    close_embedding_store()
+    close_embedding_pool()
 
 if __name__ == "__main__":
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
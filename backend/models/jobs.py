@@ -0,0 +1,32 @@
+from pydantic import BaseModel
+from typing import List, Optional
+
+class FailedChunk(BaseModel):
+    """A chunk that could not be ingested"""
+    id: str
+    error: str
+
+class IngestionJobStatus(BaseModel):
+    """Progress report for a background ingestion job"""
+    job_id: str
+    status: str  # queued, running, completed or failed
+    schema_version: Optional[str] = None
+    replace_documents: bool = False  # chunks the upload left out of its documents may be deleted
+    bytes_total: int
+    bytes_processed: int
+    progress: float
+    records_done: int
+    chunks_stored: int
+    chunks_failed: int
+    chunks_embedded: int = 0  # encoded by the model
+    chunks_reused: int = 0  # changed, but with text whose embedding was already stored
+    chunks_skipped: int = 0  # stored before with the same text and metadata
+    chunks_deleted: int = 0  # gone from their replaced document
+    failed_chunks: List[FailedChunk]
+    throughput_chunks_per_sec: Optional[float] = None
+    eta_seconds: Optional[float] = None
+    attempts: int
+    error: Optional[str] = None
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
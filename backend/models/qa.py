@@ -1,11 +1,14 @@
 from pydantic import BaseModel
-from typing import List
+from typing import List, Literal, Optional
+from .search import SearchFilters
 
 class QuestionAnswerRequest(BaseModel):
     """Request model for question answering"""
     question: str
     k: int = 10
     min_score: float = 0.25
+    filters: Optional[SearchFilters] = None
+    mode: Literal["vector", "lexical", "hybrid"] = "vector"
 
 class Citation(BaseModel):
     """Model for a citation in an answer"""
@@ -1,12 +1,23 @@
-from pydantic import BaseModel
-from typing import List
+from pydantic import BaseModel, Field
+from typing import List, Literal, Optional
 from .chunks import ChunkMetadata
 
+class SearchFilters(BaseModel):
+    """Metadata restrictions applied inside the vector query"""
+    journal: Optional[List[str]] = None  # Any of these journals
+    publish_year_min: Optional[int] = None
+    publish_year_max: Optional[int] = None
+    doi: Optional[str] = None
+    attribute_keys: Optional[List[str]] = None  # Chunks must have all of these attributes
+
 class SimilaritySearchRequest(BaseModel):
     """Request model for similarity search"""
     query: str
     k: int = 10
     min_score: float = 0.25
+    nprobe: Optional[int] = Field(default=None, ge=1)  # IVF lists to scan; more is slower but higher recall
+    filters: Optional[SearchFilters] = None
+    mode: Literal["vector", "lexical", "hybrid"] = "vector"  # lexical and hybrid use the BM25 index
 
 class SimilaritySearchResult(BaseModel):
     """Result model for a single search result"""
@@ -18,3 +29,16 @@ class SimilaritySearchResult(BaseModel):
 class SimilaritySearchResponse(BaseModel):
     """Response model for similarity search"""
     results: List[SimilaritySearchResult]
+
+class BatchSimilaritySearchRequest(BaseModel):
+    """Request model for a batch of similarity searches"""
+    queries: List[SimilaritySearchRequest] = Field(min_length=1)
+
+class BatchSimilaritySearchItem(BaseModel):
+    """Outcome of one search in a batch: its results, or the error it raised"""
+    results: Optional[List[SimilaritySearchResult]] = None
+    error: Optional[str] = None
+
+class BatchSimilaritySearchResponse(BaseModel):
+    """Response model for a batch of similarity searches, in request order"""
+    results: List[BatchSimilaritySearchItem]
@@ -0,0 +1,366 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import numpy as np
+from core.config import settings
+from core.embeddings import QueryEmbeddingCache
+
+class AnswerCache:
+    """Persistent cache of generated answers
+    
+    Entries are keyed on the normalized question, the ordered ids and text of
+    the retrieved chunks, and the model and prompt version, so re-ingested or
+    re-ranked chunks and prompt changes all miss naturally. The least recently
+    used entries are evicted past max_entries, and entries expire after
+    ttl_seconds.
+    
+    Args:
+        path (str): SQLite file holding the cache
+        max_entries (int): Entries kept before evicting the least recently used
+        ttl_seconds (float, optional): Age after which an entry is ignored and pruned
+    """
+    
+    def __init__(self, path, max_entries=10000, ttl_seconds=None, clock=time.time):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._initialized = False
+        self.hits = 0
+        self.misses = 0
+    
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=5)
+        if not self._initialized:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS answers (key TEXT PRIMARY KEY, answer TEXT NOT NULL, "
+                "created REAL NOT NULL, last_access REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS answers_last_access ON answers (last_access)")
+            self._initialized = True
+        return conn
+    
+    @staticmethod
+    def make_key(question, chunks, model, prompt_version):
+        """Build the cache key for a question and its retrieved chunks
+        
+        Args:
+            question (str): The question
+            chunks (list): (chunk id, chunk text) pairs in retrieval order
+            model (str): The answering model
+            prompt_version (str): Version of the answer prompt
+            
+        Returns:
+            str: Hex digest identifying the answer
+        """
+        payload = json.dumps(
+            [model, prompt_version, QueryEmbeddingCache.normalize(question), chunks],
+            separators=(",", ":")
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    
+    def _expired(self, created, now):
+        return self.ttl_seconds is not None and now - created > self.ttl_seconds
+    
+    def get(self, key):
+        """Look up a cached answer
+        
+        Args:
+            key (str): Key from make_key
+            
+        Returns:
+            str or None: The cached answer, or None on a miss
+        """
+        now = self._clock()
+        with self._connect() as conn:
+            row = conn.execute("SELECT answer, created FROM answers WHERE key = ?", (key,)).fetchone()
+            if row and not self._expired(row[1], now):
+                conn.execute("UPDATE answers SET last_access = ? WHERE key = ?", (now, key))
+                with self._lock:
+                    self.hits += 1
+                return row[0]
+        
+        with self._lock:
+            self.misses += 1
+        return None
+    
+    def set(self, key, answer):
+        """Cache an answer, evicting expired and least recently used entries
+        
+        Args:
+            key (str): Key from make_key
+            answer (str): The generated answer
+        """
+        now = self._clock()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO answers (key, answer, created, last_access) VALUES (?, ?, ?, ?)",
+                (key, answer, now, now)
+            )
+            if self.ttl_seconds is not None:
+                conn.execute("DELETE FROM answers WHERE created < ?", (now - self.ttl_seconds,))
+            excess = conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0] - self.max_entries
+            if excess > 0:
+                conn.execute(
+                    "DELETE FROM answers WHERE key IN (SELECT key FROM answers ORDER BY last_access LIMIT ?)",
+                    (excess,)
+                )
+    
+    def stats(self):
+        """Get cache counters
+        
+        Returns:
+            dict: Hit/miss counters, hit rate and current size
+        """
+        with self._connect() as conn:
+            size = conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": size,
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+class SemanticAnswerCache:
+    """Answer cache that also matches differently worded questions
+    
+    Previously answered questions are kept in a small in-memory vector index
+    (mirrored to SQLite so it survives restarts). A new question reuses a
+    stored answer when its embedding is at least `threshold` cosine-similar to
+    a stored question and the chunks retrieved for it overlap the stored
+    chunk set by at least `min_overlap` (Jaccard), so a similar question whose
+    evidence has changed still reaches the LLM. Every hit is written to an
+    audit table so false hits can be reviewed.
+    
+    Entries added by other worker processes are picked up on the next restart.
+    
+    Args:
+        path (str): SQLite file holding the cache
+        threshold (float): Minimum cosine similarity between questions
+        min_overlap (float): Minimum Jaccard overlap between retrieved chunk ids
+        max_entries (int): Questions kept before evicting the oldest
+        ttl_seconds (float, optional): Age after which an entry is no longer reused
+    """
+    
+    AUDIT_LOG_SIZE = 1000
+    
+    def __init__(self, path, threshold=0.92, min_overlap=0.6, max_entries=2000, ttl_seconds=None, clock=time.time):
+        self.path = path
+        self.threshold = threshold
+        self.min_overlap = min_overlap
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._initialized = False
+        self._entries = None
+        self._matrix = None
+        self.lookups = 0
+        self.hits = 0
+        self.latency_saved = 0.0
+    
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=5)
+        if not self._initialized:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS semantic_answers (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "question TEXT NOT NULL, embedding BLOB NOT NULL, chunk_ids TEXT NOT NULL, "
+                "answer TEXT NOT NULL, latency REAL NOT NULL, created REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS semantic_audit (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "created REAL NOT NULL, question TEXT NOT NULL, matched_question TEXT NOT NULL, "
+                "similarity REAL NOT NULL, overlap REAL NOT NULL, answer_id INTEGER NOT NULL)"
+            )
+            self._initialized = True
+        return conn
+    
+    @staticmethod
+    def _unit(embedding):
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+    
+    @staticmethod
+    def _overlap(a, b):
+        union = len(a | b)
+        return len(a & b) / union if union else 1.0
+    
+    def _load(self):
+        # Called with the lock held
+        if self._entries is not None:
+            return
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id, question, embedding, chunk_ids, answer, latency, created "
+                "FROM semantic_answers ORDER BY id"
+            ).fetchall()
+        self._entries = [{
+            "id": row[0],
+            "question": row[1],
+            "chunk_ids": frozenset(json.loads(row[3])),
+            "answer": row[4],
+            "latency": row[5],
+            "created": row[6],
+        } for row in rows]
+        vectors = [np.frombuffer(row[2], dtype=np.float32) for row in rows]
+        self._matrix = np.vstack(vectors) if vectors else None
+    
+    def lookup(self, question, embedding, chunk_ids):
+        """Find a stored answer for a similar question over similar chunks
+        
+        Args:
+            question (str): The incoming question
+            embedding (list): Embedding of the question
+            chunk_ids (list): Ids of the chunks retrieved for the question
+            
+        Returns:
+            str or None: The stored answer, or None on a miss
+        """
+        query = self._unit(embedding)
+        chunk_set = frozenset(chunk_ids)
+        now = self._clock()
+        match = None
+        
+        with self._lock:
+            self._load()
+            self.lookups += 1
+            if self._matrix is not None:
+                similarities = self._matrix @ query
+                for i in np.argsort(-similarities):
+                    similarity = float(similarities[i])
+                    if similarity < self.threshold:
+                        break
+                    entry = self._entries[i]
+                    if self.ttl_seconds is not None and now - entry["created"] > self.ttl_seconds:
+                        continue
+                    overlap = self._overlap(chunk_set, entry["chunk_ids"])
+                    if overlap >= self.min_overlap:
+                        match = (entry, similarity, overlap)
+                        self.hits += 1
+                        self.latency_saved += entry["latency"]
+                        break
+        
+        if match is None:
+            return None
+        
+        entry, similarity, overlap = match
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT INTO semantic_audit (created, question, matched_question, similarity, overlap, answer_id) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (now, question, entry["question"], similarity, overlap, entry["id"])
+                )
+                conn.execute(
+                    "DELETE FROM semantic_audit WHERE id <= (SELECT MAX(id) FROM semantic_audit) - ?",
+                    (self.AUDIT_LOG_SIZE,)
+                )
+        except sqlite3.Error as e:
+            print(f"Warning: failed to write semantic cache audit entry: {e}")
+        return entry["answer"]
+    
+    def add(self, question, embedding, chunk_ids, answer, latency):
+        """Store an answered question, evicting the oldest past max_entries
+        
+        Args:
+            question (str): The question
+            embedding (list): Embedding of the question
+            chunk_ids (list): Ids of the chunks the answer was generated from
+            answer (str): The generated answer
+            latency (float): Seconds spent generating the answer
+        """
+        vector = self._unit(embedding)
+        now = self._clock()
+        
+        with self._lock:
+            self._load()
+            with self._connect() as conn:
+                cursor = conn.execute(
+                    "INSERT INTO semantic_answers (question, embedding, chunk_ids, answer, latency, created) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (question, vector.tobytes(), json.dumps(list(chunk_ids)), answer, latency, now)
+                )
+                self._entries.append({
+                    "id": cursor.lastrowid,
+                    "question": question,
+                    "chunk_ids": frozenset(chunk_ids),
+                    "answer": answer,
+                    "latency": latency,
+                    "created": now,
+                })
+                vector = vector[np.newaxis, :]
+                self._matrix = vector if self._matrix is None else np.vstack([self._matrix, vector])
+                
+                excess = len(self._entries) - self.max_entries
+                if excess > 0:
+                    evicted = [(entry["id"],) for entry in self._entries[:excess]]
+                    conn.executemany("DELETE FROM semantic_answers WHERE id = ?", evicted)
+                    self._entries = self._entries[excess:]
+                    self._matrix = self._matrix[excess:]
+    
+    def audit_log(self, limit=100):
+        """Get the most recent semantic hits, newest first
+        
+        Args:
+            limit (int): Maximum number of entries to return
+            
+        Returns:
+            list: Audit entries pairing each question with the question it matched
+        """
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT created, question, matched_question, similarity, overlap, answer_id "
+                "FROM semantic_audit ORDER BY id DESC LIMIT ?",
+                (limit,)
+            ).fetchall()
+        return [{
+            "created": row[0],
+            "question": row[1],
+            "matched_question": row[2],
+            "similarity": row[3],
+            "overlap": row[4],
+            "answer_id": row[5],
+        } for row in rows]
+    
+    def stats(self):
+        """Get cache counters
+        
+        Returns:
+            dict: Hit rate, latency saved and current size
+        """
+        with self._lock:
+            self._load()
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "threshold": self.threshold,
+                "min_overlap": self.min_overlap,
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "hit_rate": self.hits / self.lookups if self.lookups else 0.0,
+                "latency_saved_seconds": self.latency_saved,
+            }
+
+# Process-wide answer caches
+answer_cache = AnswerCache(
+    settings.answer_cache_path,
+    max_entries=settings.answer_cache_max_entries,
+    ttl_seconds=settings.answer_cache_ttl_seconds
+)
+semantic_answer_cache = SemanticAnswerCache(
+    settings.answer_cache_path,
+    threshold=settings.semantic_cache_threshold,
+    min_overlap=settings.semantic_cache_min_overlap,
+    max_entries=settings.semantic_cache_max_entries,
+    ttl_seconds=settings.answer_cache_ttl_seconds
+)
@@ -0,0 +1,160 @@
+import re
+from core.config import settings
+from models.qa import Citation
+from services.openai_service import ANSWER_MODEL
+
+# Jaccard similarity of word shingles above which a chunk is treated as a
+# near-duplicate of one already in the context
+DUPLICATE_THRESHOLD = 0.85
+SHINGLE_SIZE = 3
+
+_encoding = None
+_encoding_loaded = False
+
+def _get_encoding():
+    """Load the tokenizer for the answer model, if tiktoken is available"""
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        _encoding_loaded = True
+        try:
+            import tiktoken
+            _encoding = tiktoken.encoding_for_model(ANSWER_MODEL)
+        except Exception as e:
+            print(f"Warning: tiktoken unavailable ({e}), estimating token counts from text length")
+    return _encoding
+
+def count_tokens(text):
+    """Count the tokens the answer model will see for a piece of text
+    
+    Args:
+        text (str): Text to count
+    
+    Returns:
+        int: Exact count with tiktoken, otherwise an estimate of 4 characters per token
+    """
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return (len(text) + 3) // 4
+
+def _shingles(text):
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < SHINGLE_SIZE:
+        return {tuple(words)}
+    return {tuple(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+def _is_near_duplicate(shingles, selected):
+    for other in selected:
+        union = len(shingles | other)
+        if union and len(shingles & other) / union >= DUPLICATE_THRESHOLD:
+            return True
+    return False
+
+def format_chunk(number, text, source_doc_id, section_heading):
+    """Format one context block for the prompt
+    
+    Args:
+        number (int): 1-based position of the block in the context
+        text (str): Chunk text
+        source_doc_id (str): Source document of the chunk
+        section_heading (str): Section the chunk came from
+    
+    Returns:
+        str: The formatted block
+    """
+    return f"\n\nCHUNK {number}:\n{text}\nSOURCE: {source_doc_id}, SECTION: {section_heading}\n"
+
+def build_context(results, token_budget=None):
+    """Pack search results into a token-budgeted LLM context
+    
+    Results are taken in score order. Near-duplicates of an already selected
+    chunk are dropped, and chunks that no longer fit the budget are skipped.
+    Selected chunks that are adjacent in the same source document are merged
+    into a single block, and citations are deduplicated per document.
+    
+    Args:
+        results (list): SimilaritySearchResult objects
+        token_budget (int, optional): Maximum context tokens, defaults to settings
+    
+    Returns:
+        tuple: (context string, list of Citation, list of (chunk id, chunk text)
+            used, dict of token metrics)
+    """
+    if token_budget is None:
+        token_budget = settings.context_token_budget
+    
+    ranked = sorted(results, key=lambda result: result.score, reverse=True)
+    
+    selected = []
+    selected_shingles = []
+    used_tokens = 0
+    unpacked_tokens = 0
+    dropped_duplicates = 0
+    dropped_budget = 0
+    
+    for result in ranked:
+        metadata = result.metadata
+        tokens = count_tokens(format_chunk(len(selected) + 1, result.text, metadata.source_doc_id, metadata.section_heading))
+        unpacked_tokens += tokens
+        
+        shingles = _shingles(result.text)
+        if _is_near_duplicate(shingles, selected_shingles):
+            dropped_duplicates += 1
+            continue
+        if used_tokens + tokens > token_budget:
+            dropped_budget += 1
+            continue
+        
+        selected.append(result)
+        selected_shingles.append(shingles)
+        used_tokens += tokens
+    
+    # Merge runs of consecutive chunks from the same document, keeping the
+    # blocks in order of their best-scoring chunk
+    blocks = []
+    by_position = {}
+    for result in selected:
+        metadata = result.metadata
+        block = by_position.get((metadata.source_doc_id, metadata.chunk_index - 1))
+        if block is None:
+            block = by_position.get((metadata.source_doc_id, metadata.chunk_index + 1))
+        if block is None:
+            block = {"source_doc_id": metadata.source_doc_id, "results": []}
+            blocks.append(block)
+        block["results"].append(result)
+        by_position[(metadata.source_doc_id, metadata.chunk_index)] = block
+    
+    parts = []
+    chunks = []
+    for number, block in enumerate(blocks, start=1):
+        block_results = sorted(block["results"], key=lambda result: result.metadata.chunk_index)
+        headings = list(dict.fromkeys(result.metadata.section_heading for result in block_results))
+        parts.append(format_chunk(
+            number,
+            "\n".join(result.text for result in block_results),
+            block["source_doc_id"],
+            " / ".join(headings)
+        ))
+        chunks.extend((result.id, result.text) for result in block_results)
+    
+    citations = {}
+    for result in selected:
+        metadata = result.metadata
+        if metadata.source_doc_id not in citations:
+            citations[metadata.source_doc_id] = Citation(
+                source_doc_id=metadata.source_doc_id,
+                section_heading=metadata.section_heading,
+                link=metadata.link
+            )
+    
+    context = "".join(parts)
+    context_tokens = count_tokens(context) if context else 0
+    metrics = {
+        "context_tokens": context_tokens,
+        "tokens_saved": max(unpacked_tokens - context_tokens, 0),
+        "chunks_used": len(selected),
+        "chunks_dropped_duplicate": dropped_duplicates,
+        "chunks_dropped_budget": dropped_budget,
+    }
+    
+    return context, list(citations.values()), chunks, metrics
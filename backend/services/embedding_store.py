@@ -0,0 +1,246 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import numpy as np
+from core.config import settings
+from core.embeddings import embedding_model_id
+from services.vector_store import vector_store_id
+
+# Stay below SQLite's default limit on bound parameters per statement
+_SQL_BATCH = 900
+
+def text_hash(text):
+    """Hash chunk text for the embedding lookup
+    
+    Args:
+        text (str): Chunk text
+    
+    Returns:
+        str: Hex SHA-256 of the text
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+class EmbeddingStore:
+    """Content-addressed chunk embeddings and per-chunk fingerprints, in SQLite
+    
+    Embeddings are keyed on (text hash, model id), so unchanged text is never
+    encoded twice, whatever chunk it belongs to. Each stored chunk also keeps a
+    fingerprint of its text and metadata and of the vector store it was
+    written to, so a re-upload can skip chunks that are already stored exactly
+    as sent, but not chunks stored in another index or backend.
+    
+    Every chunk seen by an upload is stamped with the upload's id, and the
+    documents it touched are recorded. If the upload replaces whole documents,
+    chunks of those documents without the stamp once it finishes have
+    vanished from their document.
+    
+    Args:
+        path (str): SQLite file holding the store
+        model_id (str): Id of the model producing the embeddings
+        store_id (str): Id of the vector store chunks are written to
+    """
+    
+    def __init__(self, path, model_id, store_id=""):
+        self.path = path
+        self.model_id = model_id
+        self.store_id = store_id
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings "
+            "(model TEXT NOT NULL, text_hash TEXT NOT NULL, embedding BLOB NOT NULL, "
+            "PRIMARY KEY (model, text_hash))"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS chunks "
+            "(id TEXT PRIMARY KEY, source_doc_id TEXT NOT NULL, fingerprint TEXT NOT NULL, upload TEXT)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS chunks_document ON chunks (source_doc_id)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS upload_documents "
+            "(upload TEXT NOT NULL, source_doc_id TEXT NOT NULL, PRIMARY KEY (upload, source_doc_id))"
+        )
+        self._db.commit()
+    
+    def fingerprint(self, chunk):
+        """Fingerprint a chunk's content as it would be stored
+        
+        Args:
+            chunk (Chunk): The chunk
+        
+        Returns:
+            str: Hex SHA-256 over the model id, vector store id, text and metadata
+        """
+        content = json.dumps(chunk.model_dump(), sort_keys=True, default=str)
+        return hashlib.sha256(f"{self.model_id}\n{self.store_id}\n{content}".encode("utf-8")).hexdigest()
+    
+    def _select(self, query, values, params=()):
+        """Run a query with an IN ({}) list of values, in batches"""
+        rows = []
+        with self._lock:
+            for i in range(0, len(values), _SQL_BATCH):
+                batch = values[i:i + _SQL_BATCH]
+                rows.extend(self._db.execute(query.format(",".join("?" * len(batch))), [*params, *batch]))
+        return rows
+    
+    def fingerprints(self, ids):
+        """Look up the stored fingerprints of chunks
+        
+        Args:
+            ids (list): Chunk ids
+        
+        Returns:
+            dict: Fingerprint by chunk id, for the chunks that are stored
+        """
+        return dict(self._select("SELECT id, fingerprint FROM chunks WHERE id IN ({})", list(ids)))
+    
+    def embeddings(self, hashes):
+        """Look up stored embeddings by text hash
+        
+        Args:
+            hashes (list): Text hashes
+        
+        Returns:
+            dict: Embedding (numpy.ndarray) by text hash, for the hashes that are stored
+        """
+        rows = self._select(
+            "SELECT text_hash, embedding FROM embeddings WHERE model = ? AND text_hash IN ({})",
+            list(dict.fromkeys(hashes)),
+            (self.model_id,)
+        )
+        return {digest: np.frombuffer(blob, dtype=np.float32) for digest, blob in rows}
+    
+    def add_embeddings(self, embeddings):
+        """Store embeddings by text hash
+        
+        Args:
+            embeddings (dict): Embedding (array-like) by text hash
+        """
+        with self._lock, self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, embedding) VALUES (?, ?, ?)",
+                [
+                    (self.model_id, digest, np.asarray(embedding, dtype=np.float32).tobytes())
+                    for digest, embedding in embeddings.items()
+                ]
+            )
+    
+    def mark_seen(self, upload, ids, source_doc_ids):
+        """Record that an upload contains chunks and documents
+        
+        Args:
+            upload (str): Upload id
+            ids (list): Ids of the chunks in the upload, including invalid ones
+            source_doc_ids (list): Documents the upload's valid chunks belong to
+        """
+        ids = list(ids)
+        with self._lock, self._db:
+            for i in range(0, len(ids), _SQL_BATCH):
+                batch = ids[i:i + _SQL_BATCH]
+                self._db.execute(
+                    f"UPDATE chunks SET upload = ? WHERE id IN ({','.join('?' * len(batch))})",
+                    [upload, *batch]
+                )
+            self._db.executemany(
+                "INSERT OR IGNORE INTO upload_documents (upload, source_doc_id) VALUES (?, ?)",
+                [(upload, source_doc_id) for source_doc_id in set(source_doc_ids)]
+            )
+    
+    def commit_chunks(self, upload, chunks):
+        """Record chunks as stored with their current fingerprints
+        
+        Args:
+            upload (str): Upload id
+            chunks (list): (chunk id, source document id, fingerprint) tuples
+        """
+        with self._lock, self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO chunks (id, source_doc_id, fingerprint, upload) VALUES (?, ?, ?, ?)",
+                [(chunk_id, source_doc_id, fingerprint, upload) for chunk_id, source_doc_id, fingerprint in chunks]
+            )
+    
+    def vanished_chunks(self, upload):
+        """Find chunks of the upload's documents that the upload did not contain
+        
+        Only meaningful for an upload that replaces its documents: chunks of a
+        document split across uploads are all "vanished" from each of them.
+        
+        Args:
+            upload (str): Upload id
+        
+        Returns:
+            list: Ids of the vanished chunks
+        """
+        with self._lock:
+            return [row[0] for row in self._db.execute(
+                "SELECT chunks.id FROM upload_documents JOIN chunks "
+                "ON chunks.source_doc_id = upload_documents.source_doc_id "
+                "WHERE upload_documents.upload = ? AND chunks.upload IS NOT ?",
+                (upload, upload)
+            )]
+    
+    def forget(self, ids):
+        """Drop the fingerprints of deleted chunks
+        
+        Args:
+            ids (list): Chunk ids
+        """
+        ids = list(ids)
+        with self._lock, self._db:
+            for i in range(0, len(ids), _SQL_BATCH):
+                batch = ids[i:i + _SQL_BATCH]
+                self._db.execute(f"DELETE FROM chunks WHERE id IN ({','.join('?' * len(batch))})", batch)
+    
+    def finish_upload(self, upload):
+        """Drop the bookkeeping of a finished upload
+        
+        Args:
+            upload (str): Upload id
+        """
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM upload_documents WHERE upload = ?", (upload,))
+    
+    def stats(self):
+        """Get store counters
+        
+        Returns:
+            dict: Model and vector store ids and the number of stored embeddings and chunks
+        """
+        with self._lock:
+            embeddings = self._db.execute(
+                "SELECT COUNT(*) FROM embeddings WHERE model = ?", (self.model_id,)
+            ).fetchone()[0]
+            chunks = self._db.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+        return {"model": self.model_id, "vector_store": self.store_id, "embeddings": embeddings, "chunks": chunks}
+    
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+# Embedding store, opened on first use
+_store = None
+_store_lock = threading.Lock()
+
+def get_embedding_store():
+    """Get the embedding store, opening it if needed
+    
+    Returns:
+        EmbeddingStore: The process-wide embedding store
+    """
+    global _store
+    
+    with _store_lock:
+        if _store is None:
+            _store = EmbeddingStore(settings.embedding_store_path, embedding_model_id(), vector_store_id())
+        return _store
+
+def close_embedding_store():
+    """Close the embedding store"""
+    global _store
+    
+    with _store_lock:
+        if _store is not None:
+            _store.close()
+            _store = None
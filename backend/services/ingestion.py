@@ -0,0 +1,367 @@
+import asyncio
+import uuid
+import numpy as np
+from fastapi.concurrency import run_in_threadpool
+from core.config import settings
+from core.embeddings import generate_embeddings, generate_embeddings_async
+from core.metrics import timed, BATCH_SIZE
+from models.chunks import Chunk
+from services.vector_store import store_vectors, delete_vectors, get_usage_counts
+from services.lexical_index import index_chunks
+from services.embedding_store import get_embedding_store, text_hash
+
+class InvalidChunkError(ValueError):
+    """Raised when an ingested record is not valid JSON or not a valid chunk"""
+
+def process_document_chunks(chunks_data):
+    """Process document chunks and prepare them for storage
+    
+    Args:
+        chunks_data (list): Raw chunks data
+        
+    Returns:
+        list: List of processed Chunk objects
+    """
+    chunks = []
+    for chunk_data in chunks_data:
+        # Ensure attributes is a dictionary
+        if isinstance(chunk_data.get('attributes', []), list):
+            # Convert list of attributes to a dictionary
+            attributes = {attr: True for attr in chunk_data.get('attributes', [])}
+            chunk_data['attributes'] = attributes
+            
+        # Set default values for optional fields
+        if 'doi' not in chunk_data:
+            chunk_data['doi'] = 'Unknown'
+            
+        # Create Chunk object with validation
+        try:
+            chunk = Chunk(**chunk_data)
+            chunks.append(chunk)
+        except Exception as e:
+            print(f"Error processing chunk {chunk_data.get('id', 'unknown')}: {str(e)}")
+            raise
+    
+    return chunks
+
+def prepare_vectors_for_storage(chunks):
+    """Prepare vectors for storage in the vector database
+    
+    Args:
+        chunks (list): List of Chunk objects
+        
+    Returns:
+        list: List of vector objects ready for storage
+    """
+    embeddings = generate_embeddings([chunk.text for chunk in chunks])
+    return build_vector_records(chunks, embeddings)
+
+def build_vector_records(chunks, embeddings):
+    """Combine chunks with their embeddings into vector database records
+    
+    Args:
+        chunks (list): List of Chunk objects
+        embeddings (numpy.ndarray): One embedding per chunk, in the same order
+        
+    Returns:
+        list: List of vector objects ready for storage
+    """
+    vectors = []
+    for chunk, embedding in zip(chunks, embeddings):
+        chunk_dict = chunk.model_dump() if hasattr(chunk, 'model_dump') else chunk.dict()
+        
+        # Prepare metadata - Pinecone only accepts simple types
+        metadata = {}
+        for key, value in chunk_dict.items():
+            if key == 'attributes':
+                # Convert attributes dict to a list of strings for Pinecone
+                if isinstance(value, dict):
+                    metadata['attribute_keys'] = list(value.keys())
+                else:
+                    metadata['attribute_keys'] = []
+            elif isinstance(value, (str, int, float, bool)) or (
+                isinstance(value, list) and all(isinstance(item, str) for item in value)
+            ):
+                metadata[key] = value
+        
+        # Always include text in metadata for retrieval
+        metadata['text'] = chunk.text
+        
+        # Prepare record for insertion
+        vector = {
+            'id': chunk.id,
+            'values': embedding.tolist(),
+            'metadata': metadata
+        }
+        
+        vectors.append(vector)
+    
+    return vectors
+
+async def _run_stages(*stages):
+    """Run pipeline stages concurrently, cancelling the rest if one fails"""
+    tasks = [asyncio.ensure_future(stage) for stage in stages]
+    try:
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        for task in done:
+            task.result()
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+def _record_id(record):
+    return record.get('id', 'unknown') if isinstance(record, dict) else 'unknown'
+
+def _find_changed_chunks(store, upload_id, chunks, failures):
+    """Mark a batch as seen by the upload and pick out the chunks that changed
+    
+    Args:
+        store (EmbeddingStore): The embedding store
+        upload_id (str): Id of the running upload
+        chunks (list): Valid Chunk objects in the batch
+        failures (list): Failed chunk entries of the batch
+        
+    Returns:
+        tuple: (changed chunks, their fingerprints, stored embeddings by text hash,
+            ids of the changed chunks that were stored before)
+    """
+    store.mark_seen(
+        upload_id,
+        [chunk.id for chunk in chunks] + [failure["id"] for failure in failures],
+        [chunk.source_doc_id for chunk in chunks]
+    )
+    stored = store.fingerprints([chunk.id for chunk in chunks])
+    changed, fingerprints = [], []
+    for chunk in chunks:
+        fingerprint = store.fingerprint(chunk)
+        if stored.get(chunk.id) != fingerprint:
+            changed.append(chunk)
+            fingerprints.append(fingerprint)
+    known = store.embeddings([text_hash(chunk.text) for chunk in changed])
+    return changed, fingerprints, known, [chunk.id for chunk in changed if chunk.id in stored]
+
+async def _embed_incrementally(store, upload_id, chunks, failures, summary):
+    """Embed the changed chunks of a batch, reusing stored embeddings
+    
+    Returns:
+        tuple: (changed chunks, their fingerprints, their embeddings,
+            ids of the changed chunks that were stored before)
+    """
+    changed, fingerprints, known, restored = await run_in_threadpool(_find_changed_chunks, store, upload_id, chunks, failures)
+    hashes = [text_hash(chunk.text) for chunk in changed]
+    missing = {digest: chunk.text for digest, chunk in zip(hashes, changed) if digest not in known}
+    
+    if missing:
+        encoded = await generate_embeddings_async(list(missing.values()))
+        new = dict(zip(missing, encoded))
+        await run_in_threadpool(store.add_embeddings, new)
+        known = {**known, **new}
+    
+    summary["chunks_skipped"] += len(chunks) - len(changed)
+    summary["chunks_embedded"] += sum(digest in missing for digest in hashes)
+    summary["chunks_reused"] += sum(digest not in missing for digest in hashes)
+    
+    embeddings = np.stack([known[digest] for digest in hashes]) if hashes else np.empty((0, 0), dtype=np.float32)
+    return changed, fingerprints, embeddings, restored
+
+def _stored_document_chunks(chunks, documents):
+    """Pick the chunks of documents stored before, without fingerprints to go by
+    
+    The first chunk seen of each document is looked up in the vector store,
+    and the answer is remembered for the rest of the upload, so new documents
+    cost one lookup each rather than one per chunk.
+    
+    Args:
+        chunks (list): Chunk objects in the batch
+        documents (dict): Whether each document seen so far was stored before
+        
+    Returns:
+        list: Ids of the chunks whose documents were stored before
+    """
+    probes = {}
+    for chunk in chunks:
+        if chunk.source_doc_id not in documents:
+            probes.setdefault(chunk.source_doc_id, chunk.id)
+    if probes:
+        found = get_usage_counts(list(probes.values()))
+        documents.update((doc_id, probe in found) for doc_id, probe in probes.items())
+    return [chunk.id for chunk in chunks if documents[chunk.source_doc_id]]
+
+def _keep_usage_counts(vectors, ids):
+    """Carry the stored usage_count of chunks over to their re-upserted records
+    
+    The count is accumulated in the vector store by the usage counter, so the
+    value in an upload only seeds chunks that are new.
+    
+    Args:
+        vectors (list): Vector records about to be upserted
+        ids (list): Ids of the records that may already be stored
+    """
+    counts = get_usage_counts(ids)
+    for vector in vectors:
+        if vector["id"] in counts:
+            vector["metadata"]["usage_count"] = counts[vector["id"]]
+
+async def run_ingestion_pipeline(records, batch_size=None, queue_size=None, skip_invalid=False, on_progress=None, upload_id=None,
+                                 replace_documents=False):
+    """Stream raw chunk records through validate -> embed -> upsert
+    
+    Each stage runs concurrently and hands batches to the next through a
+    bounded queue, so embedding overlaps with upserts while at most
+    queue_size batches wait between stages. Batches are stored in input
+    order, so summary["records_done"] is always a safe point to resume from.
+    
+    With the embedding store enabled, chunks stored earlier with the same text
+    and metadata are skipped, changed chunks reuse the stored embedding of
+    their text when there is one. If the upload replaces its documents and
+    settings.ingest_delete_vanished_chunks is set, chunks of the uploaded
+    documents that the upload no longer contains are deleted once every
+    record is processed.
+    
+    Args:
+        records: Async iterable of raw chunk dicts
+        batch_size (int, optional): Chunks per batch, defaults to settings.ingest_batch_size
+        queue_size (int, optional): Batches buffered between stages, defaults to settings.ingest_queue_size
+        skip_invalid (bool): Record invalid chunks in summary["failed_chunks"] and carry on
+            instead of raising
+        on_progress (callable, optional): Coroutine function called with the summary
+            after each batch is stored
+        upload_id (str, optional): Id identifying the upload in the embedding store;
+            pass the same id when resuming an interrupted upload
+        replace_documents (bool): The upload contains every chunk of each of its
+            documents, rather than adding to them
+        
+    Returns:
+        dict: Counts of records received, records done, chunks stored and failed,
+            chunks embedded, reused (stored embedding) and skipped (unchanged),
+            and vanished chunks deleted, plus up to settings.ingest_max_reported_failures
+            failed chunk entries (invalid chunks and chunks whose upsert batch failed)
+        
+    Raises:
+        InvalidChunkError: If the input is malformed, or a chunk fails validation
+            and skip_invalid is False
+    """
+    batch_size = batch_size or settings.ingest_batch_size
+    queue_size = queue_size or settings.ingest_queue_size
+    chunk_batches = asyncio.Queue(maxsize=queue_size)
+    vector_batches = asyncio.Queue(maxsize=queue_size)
+    store = get_embedding_store() if settings.embedding_store_enabled else None
+    upload_id = upload_id or uuid.uuid4().hex
+    summary = {
+        "records_received": 0,
+        "records_done": 0,
+        "chunks_stored": 0,
+        "chunks_failed": 0,
+        "chunks_embedded": 0,
+        "chunks_reused": 0,
+        "chunks_skipped": 0,
+        "chunks_deleted": 0,
+        "failed_chunks": []
+    }
+    
+    def validate_batch(batch):
+        """Validate a batch, returning (chunks, failures)"""
+        try:
+            with timed("ingest_validate"):
+                return process_document_chunks(batch), []
+        except Exception as e:
+            if not skip_invalid:
+                first = summary["records_received"] - len(batch) + 1
+                raise InvalidChunkError(f"records {first}-{summary['records_received']}: {str(e)}") from e
+        
+        # Fall back to one record at a time to isolate the bad ones
+        chunks, failures = [], []
+        for record in batch:
+            try:
+                chunks.extend(process_document_chunks([record]))
+            except Exception as e:
+                failures.append({"id": _record_id(record), "error": str(e)})
+        return chunks, failures
+    
+    async def validate():
+        batch = []
+        try:
+            async for record in records:
+                batch.append(record)
+                summary["records_received"] += 1
+                if len(batch) >= batch_size:
+                    await chunk_batches.put((len(batch), *validate_batch(batch)))
+                    batch = []
+        except ValueError as e:
+            if isinstance(e, InvalidChunkError):
+                raise
+            raise InvalidChunkError(str(e)) from e
+        if batch:
+            await chunk_batches.put((len(batch), *validate_batch(batch)))
+        await chunk_batches.put(None)
+    
+    # Without the embedding store: whether each document was stored before
+    documents = {}
+    
+    async def embed():
+        while (item := await chunk_batches.get()) is not None:
+            num_records, chunks, failures = item
+            BATCH_SIZE.observe(len(chunks), kind="ingest")
+            with timed("ingest_embed"):
+                if store is None:
+                    fingerprints = None
+                    embeddings = await generate_embeddings_async([chunk.text for chunk in chunks])
+                    summary["chunks_embedded"] += len(chunks)
+                else:
+                    chunks, fingerprints, embeddings, restored = await _embed_incrementally(
+                        store, upload_id, chunks, failures, summary
+                    )
+            vectors = build_vector_records(chunks, embeddings)
+            if store is None:
+                with timed("ingest_fetch_usage"):
+                    restored = await run_in_threadpool(_stored_document_chunks, chunks, documents)
+            if restored:
+                with timed("ingest_fetch_usage"):
+                    await run_in_threadpool(_keep_usage_counts, vectors, restored)
+            await vector_batches.put((num_records, vectors, fingerprints, failures))
+        await vector_batches.put(None)
+    
+    async def upsert():
+        while (item := await vector_batches.get()) is not None:
+            num_records, vectors, fingerprints, failures = item
+            if vectors:
+                with timed("ingest_upsert"):
+                    result = await run_in_threadpool(store_vectors, vectors)
+                summary["chunks_stored"] += result["upserted_count"]
+                failed_ids = {vector_id for batch in result["failed_batches"] for vector_id in batch["ids"]}
+                with timed("ingest_lexical_index"):
+                    await run_in_threadpool(index_chunks, [vector for vector in vectors if vector["id"] not in failed_ids])
+                if store is not None:
+                    # Only chunks that reached the vector store count as stored next time
+                    await run_in_threadpool(store.commit_chunks, upload_id, [
+                        (vector["id"], vector["metadata"]["source_doc_id"], fingerprint)
+                        for vector, fingerprint in zip(vectors, fingerprints)
+                        if vector["id"] not in failed_ids
+                    ])
+                failures = failures + [
+                    {"id": vector_id, "error": f"Upsert failed: {batch['error']}"}
+                    for batch in result["failed_batches"]
+                    for vector_id in batch["ids"]
+                ]
+            summary["records_done"] += num_records
+            summary["chunks_failed"] += len(failures)
+            room = settings.ingest_max_reported_failures - len(summary["failed_chunks"])
+            summary["failed_chunks"].extend(failures[:max(room, 0)])
+            if on_progress:
+                await on_progress(summary)
+    
+    await _run_stages(validate(), embed(), upsert())
+    
+    if store is not None:
+        # Documents may arrive in several uploads, so only a full replacement
+        # says anything about the chunks it left out
+        if replace_documents and settings.ingest_delete_vanished_chunks:
+            vanished = await run_in_threadpool(store.vanished_chunks, upload_id)
+            if vanished:
+                with timed("ingest_delete"):
+                    await run_in_threadpool(delete_vectors, vanished)
+                await run_in_threadpool(store.forget, vanished)
+            summary["chunks_deleted"] = len(vanished)
+        await run_in_threadpool(store.finish_upload, upload_id)
+    return summary
@@ -0,0 +1,443 @@
+import asyncio
+import json
+import os
+import shutil
+import sqlite3
+import time
+import uuid
+from fastapi.concurrency import run_in_threadpool
+from core.config import settings
+from services.ingestion import run_ingestion_pipeline
+from utils.json_stream import iter_json_records
+from utils.helpers import get_logger
+
+logger = get_logger("ingestion_jobs")
+
+# Background workers and the jobs they are currently running
+_initialized = False
+_workers = []
+_active_jobs = {}  # job id -> run_started_at of the claim it runs under
+# Event waking idle workers, and the event loop they run on
+_wakeup = None
+_loop = None
+
+_JOB_COLUMNS = (
+    "id, status, file_path, schema_version, bytes_total, bytes_processed, records_done, "
+    "chunks_stored, chunks_failed, failed_chunks, error, attempts, created_at, started_at, "
+    "updated_at, finished_at, run_started_at, run_progress_start, "
+    "chunks_embedded, chunks_reused, chunks_skipped, chunks_deleted, replace_documents"
+)
+
+# Incremental ingestion counters
+_COUNT_COLUMNS = ("chunks_embedded", "chunks_reused", "chunks_skipped", "chunks_deleted")
+# Columns added with ALTER TABLE so older job databases get them too
+_ADDED_COLUMNS = _COUNT_COLUMNS + ("replace_documents",)
+
+def _open():
+    # Autocommit mode, so claims can take an explicit write lock with BEGIN IMMEDIATE
+    return sqlite3.connect(settings.ingest_jobs_db_path, timeout=30, isolation_level=None)
+
+def _connect():
+    if not _initialized:
+        initialize_job_queue()
+    return _open()
+
+def initialize_job_queue():
+    """Create the job database and spool directory if they don't exist"""
+    global _initialized
+    
+    os.makedirs(settings.ingest_spool_dir, exist_ok=True)
+    conn = _open()
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, status TEXT NOT NULL, file_path TEXT NOT NULL, schema_version TEXT, "
+            "bytes_total INTEGER NOT NULL, bytes_processed INTEGER NOT NULL DEFAULT 0, "
+            "records_done INTEGER NOT NULL DEFAULT 0, chunks_stored INTEGER NOT NULL DEFAULT 0, "
+            "chunks_failed INTEGER NOT NULL DEFAULT 0, failed_chunks TEXT NOT NULL DEFAULT '[]', "
+            "error TEXT, attempts INTEGER NOT NULL DEFAULT 0, created_at REAL NOT NULL, "
+            "started_at REAL, updated_at REAL, finished_at REAL, "
+            "run_started_at REAL, run_progress_start REAL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+        # Workers starting together would race to add the same column, so
+        # check and migrate under the write lock
+        conn.execute("BEGIN IMMEDIATE")
+        existing = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+        for column in _ADDED_COLUMNS:
+            if column not in existing:
+                conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0")
+        conn.execute("COMMIT")
+    except Exception:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+    _initialized = True
+
+def _row_to_job(row):
+    job = dict(zip([column.strip() for column in _JOB_COLUMNS.split(",")], row))
+    job["failed_chunks"] = json.loads(job["failed_chunks"])
+    job["replace_documents"] = bool(job["replace_documents"])
+    return job
+
+def spool_upload(file_obj, schema_version=None, replace_documents=False):
+    """Copy an uploaded file into the spool directory and queue a job for it
+    
+    Args:
+        file_obj: Binary file object with the upload content
+        schema_version (str, optional): Schema version reported by the client
+        replace_documents (bool): The file replaces every chunk of its documents
+        
+    Returns:
+        dict: The queued job
+    """
+    if not _initialized:
+        initialize_job_queue()
+    
+    job_id = uuid.uuid4().hex
+    file_path = os.path.join(settings.ingest_spool_dir, f"{job_id}.json")
+    with open(file_path, "wb") as out:
+        shutil.copyfileobj(file_obj, out, 1 << 20)
+    return enqueue_job(file_path, schema_version=schema_version, job_id=job_id, replace_documents=replace_documents)
+
+def enqueue_job(file_path, schema_version=None, job_id=None, replace_documents=False):
+    """Queue a spooled file for ingestion
+    
+    Args:
+        file_path (str): Path of the JSON array or NDJSON file to ingest
+        schema_version (str, optional): Schema version reported by the client
+        job_id (str, optional): Id to use for the job
+        replace_documents (bool): The file replaces every chunk of its documents,
+            so chunks it leaves out may be deleted (see run_ingestion_pipeline)
+        
+    Returns:
+        dict: The queued job
+    """
+    job_id = job_id or uuid.uuid4().hex
+    conn = _connect()
+    try:
+        conn.execute(
+            "INSERT INTO jobs (id, status, file_path, schema_version, bytes_total, created_at, replace_documents) "
+            "VALUES (?, 'queued', ?, ?, ?, ?, ?)",
+            (job_id, file_path, schema_version, os.path.getsize(file_path), time.time(), int(replace_documents))
+        )
+    finally:
+        conn.close()
+    
+    if _wakeup is not None:
+        # Uploads are spooled from threadpool threads, and asyncio events are not thread-safe
+        _loop.call_soon_threadsafe(_wakeup.set)
+    return get_job(job_id)
+
+def get_job(job_id):
+    """Get a job by id
+    
+    Args:
+        job_id (str): The job id
+        
+    Returns:
+        dict or None: The job, or None if it doesn't exist
+    """
+    conn = _connect()
+    try:
+        row = conn.execute(f"SELECT {_JOB_COLUMNS} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    finally:
+        conn.close()
+    return _row_to_job(row) if row else None
+
+class _LeaseLostError(RuntimeError):
+    """Raised when a job was reclaimed by another worker while this one ran it"""
+
+def _update_job(job_id, claim=None, **fields):
+    """Update fields of a job, refreshing its lease
+    
+    Args:
+        job_id (str): The job id
+        claim (float, optional): run_started_at of the claim the caller runs
+            the job under; the update only applies while that claim holds
+        **fields: Column values to set
+        
+    Raises:
+        _LeaseLostError: If another worker has claimed the job since
+    """
+    if "failed_chunks" in fields:
+        fields["failed_chunks"] = json.dumps(fields["failed_chunks"])
+    fields.setdefault("updated_at", time.time())
+    assignments = ", ".join(f"{name} = ?" for name in fields)
+    conn = _connect()
+    try:
+        if claim is None:
+            conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+            return
+        cursor = conn.execute(
+            f"UPDATE jobs SET {assignments} WHERE id = ? AND run_started_at = ?", (*fields.values(), job_id, claim)
+        )
+    finally:
+        conn.close()
+    if cursor.rowcount == 0:
+        raise _LeaseLostError(f"Ingestion job {job_id} was claimed by another worker")
+
+def _claim_next_job():
+    """Atomically take the oldest queued job, or a running one whose lease expired
+    
+    Running jobs are heartbeated every third of settings.ingest_job_lease_seconds,
+    so jobs left "running" by a crashed process are picked up again once
+    their lease passes.
+    
+    Returns:
+        dict or None: The claimed job, or None if there is nothing to do
+    """
+    conn = _connect()
+    try:
+        while True:
+            now = time.time()
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                f"SELECT {_JOB_COLUMNS} FROM jobs WHERE status = 'queued' "
+                "OR (status = 'running' AND updated_at < ?) ORDER BY created_at LIMIT 1",
+                (now - settings.ingest_job_lease_seconds,)
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            
+            job = _row_to_job(row)
+            if job["attempts"] >= settings.ingest_job_max_attempts:
+                conn.execute(
+                    "UPDATE jobs SET status = 'failed', error = ?, finished_at = ?, updated_at = ? WHERE id = ?",
+                    (f"Gave up after {job['attempts']} attempts", now, now, job["id"])
+                )
+                conn.execute("COMMIT")
+                _remove_spool_file(job["file_path"])
+                continue
+            
+            progress = job["bytes_processed"] / job["bytes_total"] if job["bytes_total"] else 0.0
+            conn.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1, started_at = COALESCE(started_at, ?), "
+                "updated_at = ?, run_started_at = ?, run_progress_start = ? WHERE id = ?",
+                (now, now, now, progress, job["id"])
+            )
+            conn.execute("COMMIT")
+            job.update(status="running", attempts=job["attempts"] + 1, run_started_at=now, run_progress_start=progress)
+            job["started_at"] = job["started_at"] or now
+            return job
+    except Exception:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+def _remove_spool_file(file_path):
+    """Delete the spooled file of a job that will not run again"""
+    try:
+        os.remove(file_path)
+    except FileNotFoundError:
+        pass
+
+class _SpoolReader:
+    """Async reader over a spooled file that counts the bytes consumed"""
+    
+    def __init__(self, path):
+        self._file = open(path, "rb")
+        self.bytes_read = 0
+    
+    async def read(self, size):
+        data = await run_in_threadpool(self._file.read, size)
+        self.bytes_read += len(data)
+        return data
+    
+    def close(self):
+        self._file.close()
+
+async def _process_job(job):
+    """Ingest a claimed job, resuming after the records it already finished"""
+    job_id = job["id"]
+    base = {key: job[key] for key in ("records_done", "chunks_stored", "chunks_failed") + _COUNT_COLUMNS}
+    base_failures = job["failed_chunks"]
+    reader = None
+    
+    def totals(summary):
+        room = settings.ingest_max_reported_failures - len(base_failures)
+        return {
+            "records_done": base["records_done"] + summary["records_done"],
+            "chunks_stored": base["chunks_stored"] + summary["chunks_stored"],
+            "chunks_failed": base["chunks_failed"] + summary["chunks_failed"],
+            **{column: base[column] + summary[column] for column in _COUNT_COLUMNS},
+            "failed_chunks": base_failures + summary["failed_chunks"][:max(room, 0)],
+            "bytes_processed": reader.bytes_read
+        }
+    
+    async def records():
+        skipped = 0
+        async for record in iter_json_records(reader):
+            if skipped < base["records_done"]:
+                skipped += 1
+                continue
+            yield record
+    
+    async def on_progress(summary):
+        await run_in_threadpool(_update_job, job_id, claim, **totals(summary))
+    
+    claim = job["run_started_at"]
+    heartbeat = asyncio.create_task(_heartbeat(job_id, claim))
+    try:
+        reader = _SpoolReader(job["file_path"])
+        summary = await run_ingestion_pipeline(
+            records(), skip_invalid=True, on_progress=on_progress, upload_id=job_id,
+            replace_documents=job["replace_documents"]
+        )
+        await run_in_threadpool(
+            _update_job, job_id, claim, status="completed", finished_at=time.time(), **totals(summary)
+        )
+        logger.info(
+            f"Ingestion job {job_id} completed: {summary['chunks_stored']} chunks stored, "
+            f"{summary['chunks_skipped']} unchanged, {summary['chunks_deleted']} deleted"
+        )
+    except asyncio.CancelledError:
+        raise
+    except _LeaseLostError as e:
+        # The worker now holding the job reports its outcome
+        logger.warning(str(e))
+        return
+    except Exception as e:
+        logger.error(f"Ingestion job {job_id} failed: {str(e)}")
+        try:
+            await run_in_threadpool(_update_job, job_id, claim, status="failed", error=str(e), finished_at=time.time())
+        except _LeaseLostError as e:
+            logger.warning(str(e))
+            return
+    finally:
+        heartbeat.cancel()
+        if reader is not None:
+            reader.close()
+    
+    # Completed and failed jobs are never resumed, so their spooled files can go
+    job = await run_in_threadpool(get_job, job_id)
+    if job and job["status"] in ("completed", "failed"):
+        await run_in_threadpool(_remove_spool_file, job["file_path"])
+
+async def _heartbeat(job_id, claim):
+    """Keep refreshing the lease of a running job, so long batches are not reclaimed"""
+    while True:
+        await asyncio.sleep(settings.ingest_job_lease_seconds / 3)
+        try:
+            await run_in_threadpool(_update_job, job_id, claim)
+        except _LeaseLostError as e:
+            logger.warning(str(e))
+            return
+        except Exception as e:
+            logger.error(f"Heartbeat of ingestion job {job_id} failed: {str(e)}")
+
+async def _worker_loop():
+    while True:
+        _wakeup.clear()
+        job = await run_in_threadpool(_claim_next_job)
+        if job is None:
+            try:
+                await asyncio.wait_for(_wakeup.wait(), timeout=settings.ingest_job_poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+            continue
+        
+        # A cancelled job stays listed, for stop_job_workers to requeue
+        _active_jobs[job["id"]] = job["run_started_at"]
+        await _process_job(job)
+        del _active_jobs[job["id"]]
+
+def start_job_workers():
+    """Start settings.ingest_job_workers background ingestion workers"""
+    global _wakeup, _loop
+    
+    initialize_job_queue()
+    _loop = asyncio.get_running_loop()
+    _wakeup = asyncio.Event()
+    for _ in range(settings.ingest_job_workers):
+        _workers.append(asyncio.create_task(_worker_loop()))
+
+async def stop_job_workers():
+    """Stop the workers and requeue the jobs they were running so they resume on restart"""
+    global _wakeup, _loop
+    
+    for worker in _workers:
+        worker.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
+    _wakeup = None
+    _loop = None
+    
+    for job_id, claim in list(_active_jobs.items()):
+        await run_in_threadpool(_requeue_job, job_id, claim)
+    _active_jobs.clear()
+
+def _requeue_job(job_id, claim):
+    """Put a job interrupted by a shutdown back on the queue
+    
+    The shutdown is not the job's fault, so its claim does not count as an attempt.
+    
+    Args:
+        job_id (str): The job id
+        claim (float): run_started_at of the claim the job ran under
+    """
+    conn = _connect()
+    try:
+        conn.execute(
+            "UPDATE jobs SET status = 'queued', attempts = MAX(attempts - 1, 0), updated_at = ? "
+            "WHERE id = ? AND run_started_at = ?",
+            (time.time(), job_id, claim)
+        )
+    finally:
+        conn.close()
+
+def job_status(job):
+    """Build a progress report for a job, including throughput and ETA
+    
+    Args:
+        job (dict): The job
+        
+    Returns:
+        dict: Fields of models.jobs.IngestionJobStatus
+    """
+    progress = 1.0 if job["status"] == "completed" else (
+        min(job["bytes_processed"] / job["bytes_total"], 1.0) if job["bytes_total"] else 0.0
+    )
+    throughput = eta = None
+    if job["started_at"]:
+        end = job["finished_at"] or time.time()
+        elapsed = end - job["started_at"]
+        if elapsed > 0:
+            throughput = job["chunks_stored"] / elapsed
+        
+        # Estimate the remaining time from the progress made in the current run
+        run_elapsed = end - (job["run_started_at"] or job["started_at"])
+        run_progress = progress - (job["run_progress_start"] or 0.0)
+        if job["status"] == "running" and run_progress > 0:
+            eta = run_elapsed * (1.0 - progress) / run_progress
+    
+    return {
+        "job_id": job["id"],
+        "status": job["status"],
+        "schema_version": job["schema_version"],
+        "replace_documents": job["replace_documents"],
+        "bytes_total": job["bytes_total"],
+        "bytes_processed": job["bytes_processed"],
+        "progress": progress,
+        "records_done": job["records_done"],
+        "chunks_stored": job["chunks_stored"],
+        "chunks_failed": job["chunks_failed"],
+        "chunks_embedded": job["chunks_embedded"],
+        "chunks_reused": job["chunks_reused"],
+        "chunks_skipped": job["chunks_skipped"],
+        "chunks_deleted": job["chunks_deleted"],
+        "failed_chunks": job["failed_chunks"],
+        "throughput_chunks_per_sec": throughput,
+        "eta_seconds": eta,
+        "attempts": job["attempts"],
+        "error": job["error"],
+        "created_at": job["created_at"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"],
+    }
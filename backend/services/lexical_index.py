@@ -0,0 +1,434 @@
+from array import array
+from collections import Counter
+from contextlib import contextmanager
+import json
+import math
+import re
+import sqlite3
+import threading
+import numpy as np
+from core.config import settings
+from services.vector_store import metadata_filter_sql
+
+# Keeps compound terms such as DOIs (10.1234/abc), gene names (BRCA1) and
+# chemical formulas (CaCO3) intact; their alphanumeric parts are indexed too
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[./_-][a-z0-9]+)*")
+_PART_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Stay below SQLite's default limit on bound parameters per statement
+_SQL_BATCH = 900
+
+# Postings segments per term, on average, before they are merged on load
+_MAX_SEGMENTS_PER_TERM = 4
+
+def tokenize(text):
+    """Split text into lexical index terms
+    
+    Args:
+        text (str): Text to tokenize
+    
+    Returns:
+        list: Lower-cased terms, followed by the parts of any compound terms
+    """
+    terms = _TOKEN_PATTERN.findall(text.lower())
+    compound = [token for token in terms if not token.isalnum()]
+    for token in compound:
+        terms.extend(_PART_PATTERN.findall(token))
+    return terms
+
+class LexicalIndex:
+    """BM25 inverted index over chunk text, persisted in SQLite
+    
+    Each term's posting list is a pair of typed arrays, document numbers
+    (uint32, ascending) and term frequencies (uint16), which queries read as
+    NumPy views without copying. SQLite numbers documents in insertion order
+    and never reuses a number, so new postings are always appended. Each add
+    writes one postings segment per term it touches; segments are merged, and
+    postings of deleted or replaced documents dropped, when the index is
+    opened. Chunk metadata is stored with each document so lexical results
+    need no vector store round trip.
+    
+    Several processes may share one index file. Writes run in SQLite write
+    transactions, and an index whose file was changed by another process
+    reads the new documents, removals and segments before its next query or
+    write; a compaction by another process makes it reload everything.
+    
+    Args:
+        path (str): SQLite file holding the index
+        k1 (float): BM25 term frequency saturation
+        b (float): BM25 document length normalization
+    """
+    
+    def __init__(self, path, k1=1.2, b=0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS documents "
+            "(doc INTEGER PRIMARY KEY AUTOINCREMENT, id TEXT NOT NULL UNIQUE, length INTEGER NOT NULL, metadata TEXT NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS postings "
+            "(term TEXT NOT NULL, segment INTEGER NOT NULL, docs BLOB NOT NULL, tfs BLOB NOT NULL, "
+            "PRIMARY KEY (segment, term))"
+        )
+        # Documents deleted or replaced since the last compaction, for other processes to catch up on
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS removed (seq INTEGER PRIMARY KEY AUTOINCREMENT, doc INTEGER NOT NULL, id TEXT NOT NULL)"
+        )
+        self._db.execute("CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        self._db.execute("INSERT OR IGNORE INTO state (key, value) VALUES ('epoch', 0)")
+        self._db.commit()
+        self._load()
+        
+        if self._segments > _MAX_SEGMENTS_PER_TERM * max(len(self._postings), 1):
+            self._compact()
+    
+    def _load(self):
+        """Read documents and postings into memory"""
+        self._postings = {}
+        self._ids = {}
+        self._lengths = array("I")
+        self._live = bytearray()
+        self._total_length = 0
+        self._max_doc = 0
+        self._segment = 0
+        self._segments = 0
+        self._removed_seq = self._db.execute("SELECT COALESCE(MAX(seq), 0) FROM removed").fetchone()[0]
+        self._epoch = self._read_epoch()
+        self._read_changes()
+    
+    def _read_epoch(self):
+        return self._db.execute("SELECT value FROM state WHERE key = 'epoch'").fetchone()[0]
+    
+    def _data_version(self):
+        return self._db.execute("PRAGMA data_version").fetchone()[0]
+    
+    def _read_changes(self):
+        """Read documents, removals and postings segments written since the last read"""
+        # Anything committed while reading changes the version, so it is read again
+        self._version = self._data_version()
+        for doc, chunk_id, length in self._db.execute(
+            "SELECT doc, id, length FROM documents WHERE doc > ? ORDER BY doc", (self._max_doc,)
+        ):
+            self._ensure_doc(doc)
+            self._ids[chunk_id] = doc
+            self._lengths[doc] = length
+            self._live[doc] = 1
+            self._total_length += length
+            self._max_doc = doc
+        
+        for seq, doc, chunk_id in self._db.execute(
+            "SELECT seq, doc, id FROM removed WHERE seq > ? ORDER BY seq", (self._removed_seq,)
+        ):
+            # Documents added and removed before they were read are not live here
+            if doc < len(self._live) and self._live[doc]:
+                self._remove([doc])
+            if self._ids.get(chunk_id) == doc:
+                del self._ids[chunk_id]
+            self._removed_seq = seq
+        
+        for segment, term, docs, tfs in self._db.execute(
+            "SELECT segment, term, docs, tfs FROM postings WHERE segment > ? ORDER BY segment", (self._segment,)
+        ):
+            posting = self._postings.get(term)
+            if posting is None:
+                posting = self._postings[term] = (array("I"), array("H"))
+            posting[0].frombytes(docs)
+            posting[1].frombytes(tfs)
+            # Postings may reference deleted documents past the last stored one
+            self._ensure_doc(posting[0][-1])
+            self._segment = segment
+            self._segments += 1
+    
+    def _refresh(self):
+        """Catch up with changes other processes made to the index file"""
+        if self._read_epoch() != self._epoch:
+            self._load()
+        else:
+            self._read_changes()
+    
+    @contextmanager
+    def _write(self):
+        """Run a write transaction on the index, brought up to date first"""
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            self._refresh()
+            yield
+        except BaseException:
+            self._db.rollback()
+            # The in-memory index may be ahead of the file; reload it on next use
+            self._epoch = self._version = None
+            raise
+        self._db.commit()
+    
+    def _compact(self):
+        """Rewrite every term as a single segment without dead postings"""
+        with self._lock, self._write():
+            live = np.frombuffer(bytes(self._live), dtype=np.uint8)
+            postings = {}
+            for term, (docs, tfs) in self._postings.items():
+                doc_view = np.frombuffer(docs, dtype=np.uint32)
+                keep = live[doc_view] == 1
+                if keep.any():
+                    postings[term] = (
+                        array("I", doc_view[keep].tobytes()),
+                        array("H", np.frombuffer(tfs, dtype=np.uint16)[keep].tobytes())
+                    )
+            self._db.execute("DELETE FROM postings")
+            self._db.execute("DELETE FROM removed")
+            self._db.executemany(
+                "INSERT INTO postings (term, segment, docs, tfs) VALUES (?, 1, ?, ?)",
+                ((term, docs.tobytes(), tfs.tobytes()) for term, (docs, tfs) in postings.items())
+            )
+            self._db.execute("UPDATE state SET value = value + 1 WHERE key = 'epoch'")
+            self._epoch = self._read_epoch()
+        self._postings = postings
+        self._segment = 1
+        self._segments = len(postings)
+    
+    def _ensure_doc(self, doc):
+        if doc >= len(self._lengths):
+            grow = doc + 1 - len(self._lengths)
+            self._lengths.extend([0] * grow)
+            self._live.extend(bytes(grow))
+    
+    def _remove(self, docs):
+        """Mark documents dead; their postings are skipped until the next compaction"""
+        for doc in docs:
+            self._live[doc] = 0
+            self._total_length -= self._lengths[doc]
+    
+    def _delete_rows(self, docs):
+        """Delete document rows and log them for other processes"""
+        for i in range(0, len(docs), _SQL_BATCH):
+            batch = docs[i:i + _SQL_BATCH]
+            placeholders = ",".join("?" * len(batch))
+            self._db.execute(f"INSERT INTO removed (doc, id) SELECT doc, id FROM documents WHERE doc IN ({placeholders})", batch)
+            self._db.execute(f"DELETE FROM documents WHERE doc IN ({placeholders})", batch)
+        self._removed_seq = self._db.execute("SELECT COALESCE(MAX(seq), 0) FROM removed").fetchone()[0]
+    
+    def __len__(self):
+        return len(self._ids)
+    
+    def add(self, records):
+        """Index chunk records, replacing any already indexed under the same id
+        
+        Args:
+            records (list): Vector records with 'id' and 'metadata' (including 'text')
+        """
+        if not records:
+            return
+        
+        # Repeated id within this batch: the last copy wins
+        records = list({record["id"]: record for record in records}.values())
+        with self._lock:
+            documents = []
+            segment_docs = {}
+            segment_tfs = {}
+            with self._write():
+                replaced = sorted(self._ids[record["id"]] for record in records if record["id"] in self._ids)
+                self._delete_rows(replaced)
+                
+                for record in records:
+                    metadata = record.get("metadata", {})
+                    counts = Counter(tokenize(metadata.get("text", "")))
+                    length = sum(counts.values())
+                    doc = self._db.execute(
+                        "INSERT INTO documents (id, length, metadata) VALUES (?, ?, ?)",
+                        (record["id"], length, json.dumps(metadata, separators=(",", ":")))
+                    ).lastrowid
+                    documents.append((doc, record["id"], length))
+                    
+                    for term, count in counts.items():
+                        if term in segment_docs:
+                            segment_docs[term].append(doc)
+                            segment_tfs[term].append(count if count < 0xFFFF else 0xFFFF)
+                        else:
+                            segment_docs[term] = [doc]
+                            segment_tfs[term] = [count if count < 0xFFFF else 0xFFFF]
+                
+                segment = {term: (array("I", docs), array("H", segment_tfs[term])) for term, docs in segment_docs.items()}
+                self._segment = self._db.execute("SELECT COALESCE(MAX(segment), 0) + 1 FROM postings").fetchone()[0]
+                self._db.executemany(
+                    "INSERT INTO postings (term, segment, docs, tfs) VALUES (?, ?, ?, ?)",
+                    ((term, self._segment, docs.tobytes(), tfs.tobytes()) for term, (docs, tfs) in segment.items())
+                )
+            
+            self._remove(replaced)
+            for doc, chunk_id, length in documents:
+                self._ensure_doc(doc)
+                self._ids[chunk_id] = doc
+                self._lengths[doc] = length
+                self._live[doc] = 1
+                self._total_length += length
+                self._max_doc = doc
+            for term, (docs, tfs) in segment.items():
+                posting = self._postings.get(term)
+                if posting is None:
+                    posting = self._postings[term] = (array("I"), array("H"))
+                posting[0].extend(docs)
+                posting[1].extend(tfs)
+            self._segments += len(segment)
+    
+    def delete(self, ids):
+        """Remove chunks from the index
+        
+        Args:
+            ids (list): Ids of the chunks to remove
+        """
+        with self._lock, self._write():
+            docs = [self._ids.pop(chunk_id) for chunk_id in set(ids) if chunk_id in self._ids]
+            if not docs:
+                return
+            self._remove(docs)
+            self._delete_rows(docs)
+    
+    def _filtered_docs(self, filter):
+        sql, params = metadata_filter_sql(filter, "documents.metadata")
+        rows = self._db.execute(f"SELECT doc FROM documents WHERE {sql}", params).fetchall()
+        return np.fromiter((doc for doc, in rows), dtype=np.int64, count=len(rows))
+    
+    def query(self, text, top_k=10, include_metadata=True, filter=None):
+        """Rank chunks against a text query with BM25
+        
+        Args:
+            text (str): The query text
+            top_k (int): Number of results to return
+            include_metadata (bool): Whether to include metadata in results
+            filter (dict, optional): Metadata filter the matches must satisfy
+        
+        Returns:
+            dict: Query results in the vector store shape, {"matches": [...]}
+        """
+        terms = set(tokenize(text))
+        
+        with self._lock:
+            if self._data_version() != self._version:
+                self._refresh()
+            count = len(self._ids)
+            if count == 0 or top_k <= 0 or not terms:
+                return {"matches": []}
+            
+            live = np.frombuffer(self._live, dtype=np.uint8)
+            lengths = np.frombuffer(self._lengths, dtype=np.uint32)
+            average_length = self._total_length / count if self._total_length else 1.0
+            
+            all_docs = []
+            all_scores = []
+            for term in terms:
+                posting = self._postings.get(term)
+                if posting is None:
+                    continue
+                docs = np.frombuffer(posting[0], dtype=np.uint32)
+                tfs = np.frombuffer(posting[1], dtype=np.uint16).astype(np.float32)
+                keep = live[docs] == 1
+                docs, tfs = docs[keep], tfs[keep]
+                if len(docs) == 0:
+                    continue
+                idf = math.log(1 + (count - len(docs) + 0.5) / (len(docs) + 0.5))
+                norm = self.k1 * (1 - self.b + self.b * lengths[docs] / average_length)
+                all_docs.append(docs)
+                all_scores.append(idf * tfs * (self.k1 + 1) / (tfs + norm))
+            
+            if not all_docs:
+                return {"matches": []}
+            
+            docs, inverse = np.unique(np.concatenate(all_docs), return_inverse=True)
+            scores = np.bincount(inverse, weights=np.concatenate(all_scores))
+            
+            if filter:
+                keep = np.isin(docs, self._filtered_docs(filter))
+                docs, scores = docs[keep], scores[keep]
+                if len(docs) == 0:
+                    return {"matches": []}
+            
+            k = min(top_k, len(scores))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return {"matches": self._matches(docs[top], scores[top], include_metadata)}
+    
+    def _matches(self, docs, scores, include_metadata):
+        columns = "doc, id, metadata" if include_metadata else "doc, id, NULL"
+        placeholders = ",".join("?" * len(docs))
+        records = {
+            doc: (chunk_id, json.loads(metadata) if metadata else None)
+            for doc, chunk_id, metadata in self._db.execute(
+                f"SELECT {columns} FROM documents WHERE doc IN ({placeholders})", [int(doc) for doc in docs]
+            )
+        }
+        matches = []
+        for doc, score in zip(docs, scores):
+            record = records.get(int(doc))
+            if record is None:
+                continue
+            match = {"id": record[0], "score": float(score)}
+            if include_metadata:
+                match["metadata"] = record[1]
+            matches.append(match)
+        return matches
+    
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+# Active lexical index, opened on first use
+_index = None
+_index_lock = threading.Lock()
+
+def get_lexical_index():
+    """Get the lexical index, opening it if needed
+    
+    Returns:
+        LexicalIndex: The process-wide lexical index
+    """
+    global _index
+    
+    with _index_lock:
+        if _index is None:
+            _index = LexicalIndex(settings.lexical_index_path, k1=settings.bm25_k1, b=settings.bm25_b)
+        return _index
+
+def close_lexical_index():
+    """Close the lexical index"""
+    global _index
+    
+    with _index_lock:
+        if _index is not None:
+            _index.close()
+            _index = None
+
+def index_chunks(records):
+    """Add stored chunk records to the lexical index, if it is enabled
+    
+    Args:
+        records (list): Vector records with 'id' and 'metadata' (including 'text')
+    """
+    if settings.lexical_index_enabled and records:
+        get_lexical_index().add(records)
+
+def unindex_chunks(ids):
+    """Remove chunks from the lexical index, if it is enabled
+    
+    Args:
+        ids (list): Ids of the chunks to remove
+    """
+    if settings.lexical_index_enabled and ids:
+        get_lexical_index().delete(ids)
+
+def lexical_query(text, top_k=10, include_metadata=True, filter=None):
+    """Query the lexical index
+    
+    Args:
+        text (str): The query text
+        top_k (int): Number of results to return
+        include_metadata (bool): Whether to include metadata in results
+        filter (dict, optional): Metadata filter the matches must satisfy
+    
+    Returns:
+        dict: Query results in the vector store shape
+    """
+    return get_lexical_index().query(text, top_k=top_k, include_metadata=include_metadata, filter=filter)
@@ -0,0 +1,527 @@
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+import numpy as np
+from services.vector_store import VectorStore, metadata_filter_sql
+
+# Stay below SQLite's default limit on bound parameters per statement
+_SQL_BATCH = 900
+
+# Training points per IVF list before the index is trained (as recommended by FAISS)
+_IVF_POINTS_PER_LIST = 39
+
+class IVFIndex:
+    """Inverted-file (IVF) approximate nearest-neighbor index over store rows
+    
+    Spherical k-means centroids partition the normalized vectors into nlist
+    inverted lists. A query scores only the rows in its nprobe closest lists,
+    trading recall for latency. Centroids (ivf_centroids.npy) and the list
+    assignment of every row (ivf_assign.i32, memory-mapped) persist next to the
+    store; the in-memory lists are rebuilt from the assignments on first query.
+    
+    Args:
+        path (str): Directory holding the index files
+        dimension (int): Dimension of the indexed vectors
+        nlist (int): Number of inverted lists to train
+    """
+    
+    def __init__(self, path, dimension, nlist):
+        self.dimension = dimension
+        self.nlist = nlist
+        self._centroids_path = os.path.join(path, "ivf_centroids.npy")
+        self._assign_path = os.path.join(path, "ivf_assign.i32")
+        self.centroids = np.load(self._centroids_path) if os.path.exists(self._centroids_path) else None
+        self._assign = None
+        self._lists = None
+        # Lists that still hold rows since reassigned to another list
+        self._stale = set()
+    
+    @property
+    def trained(self):
+        return self.centroids is not None
+    
+    def map(self, capacity):
+        """(Re)map the assignment file with room for capacity rows"""
+        self._assign = None
+        with open(self._assign_path, "ab") as f:
+            size = f.tell()
+            if size < capacity * 4:
+                f.truncate(capacity * 4)
+        self._assign = np.memmap(self._assign_path, dtype=np.int32, mode="r+", shape=(capacity,))
+        if size < capacity * 4:
+            self._assign[size // 4:] = -1
+    
+    def flush(self):
+        if self._assign is not None:
+            self._assign.flush()
+    
+    def close(self):
+        self.flush()
+        self._assign = None
+        self._lists = None
+    
+    def train(self, sample, iterations=10, seed=0):
+        """Train centroids with spherical k-means and persist them
+        
+        Args:
+            sample (numpy.ndarray): Normalized training vectors
+            iterations (int): Lloyd iterations to run
+            seed (int): Seed for centroid initialization
+        """
+        rng = np.random.default_rng(seed)
+        nlist = min(self.nlist, len(sample))
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+        for _ in range(iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            # Re-seed empty lists from random points rather than leaving them dead
+            empty = norms[:, 0] == 0
+            sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+            centroids = sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-12)
+        
+        self.centroids = centroids.astype(np.float32)
+        tmp_path = self._centroids_path + ".tmp.npy"
+        np.save(tmp_path, self.centroids)
+        os.replace(tmp_path, self._centroids_path)
+        self._lists = None
+    
+    def reload(self):
+        """Read centroids another process trained and rebuild the lists on next query"""
+        self.centroids = np.load(self._centroids_path) if os.path.exists(self._centroids_path) else None
+        self._lists = None
+        self._stale = set()
+    
+    def add(self, rows, vectors):
+        """Assign rows to their closest lists
+        
+        Args:
+            rows (numpy.ndarray): Store rows being written
+            vectors (numpy.ndarray): Their normalized vectors
+        
+        Returns:
+            bool: True if a row moved out of the list it was assigned to
+        """
+        labels = np.argmax(vectors @ self.centroids.T, axis=1).astype(np.int32)
+        previous = np.asarray(self._assign[rows])
+        moved = previous[(previous >= 0) & (previous != labels)]
+        if self._lists is not None:
+            self._stale.update(moved.tolist())
+        self._assign[rows] = labels
+        if self._lists is not None:
+            for label in np.unique(labels):
+                self._lists[label].append(rows[labels == label])
+        return len(moved) > 0
+    
+    def extend(self, start, stop):
+        """Add rows another process appended, already assigned, to the lists
+        
+        Args:
+            start (int): First new row
+            stop (int): Rows allocated in the store
+        """
+        if self._lists is None or not self.trained:
+            return
+        rows = np.arange(start, stop)
+        labels = np.asarray(self._assign[start:stop])
+        for label in np.unique(labels[labels >= 0]):
+            self._lists[label].append(rows[labels == label])
+    
+    def _build_lists(self, rows_used):
+        assign = np.asarray(self._assign[:rows_used])
+        order = np.argsort(assign, kind="stable")
+        bounds = np.searchsorted(assign[order], np.arange(len(self.centroids) + 1))
+        self._lists = [[order[bounds[i]:bounds[i + 1]]] for i in range(len(self.centroids))]
+        self._stale = set()
+    
+    def candidates(self, query, nprobe, rows_used):
+        """Get the rows stored in the nprobe lists closest to a query
+        
+        Args:
+            query (numpy.ndarray): Normalized query vector
+            nprobe (int): Number of lists to scan
+            rows_used (int): Rows allocated in the store
+        
+        Returns:
+            numpy.ndarray: Candidate rows
+        """
+        if self._lists is None:
+            self._build_lists(rows_used)
+        
+        nprobe = max(1, min(nprobe, len(self.centroids)))
+        probe = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        candidates = []
+        for label in probe:
+            parts = self._lists[label]
+            if len(parts) > 1 or label in self._stale:
+                # Compact appended inserts, dropping rows that moved to another list
+                rows = np.unique(np.concatenate(parts))
+                parts[:] = [rows[self._assign[rows] == label]]
+                self._stale.discard(label)
+            candidates.append(parts[0])
+        return np.concatenate(candidates) if candidates else np.empty(0, dtype=np.int64)
+
+class LocalVectorStore(VectorStore):
+    """VectorStore kept in local files, for offline, CI and small on-prem deployments
+    
+    L2-normalized float32 vectors live in a memory-mapped matrix (vectors.f32)
+    with one liveness byte per row (live.u8), so cosine similarity is a single
+    matrix-vector product. Ids and metadata live in an SQLite side store keyed
+    by row. Opening a store only maps the files, so a fresh process can serve
+    millions of vectors without loading them first.
+    
+    With index_type "ivf" queries go through an IVFIndex once enough vectors
+    have been stored to train it; until then, and with "flat", search is exact.
+    
+    Several processes, such as the API workers, may open the same directory.
+    Writes run inside an SQLite write transaction, which allocates rows and
+    keeps one process at a time writing the files. The row allocator, vector
+    count and a layout generation live in the settings table; a process that
+    sees the database changed by another one reads them before its next
+    operation, maps any new rows and updates or rebuilds its IVF lists.
+    
+    Args:
+        path (str): Directory holding the store files
+        dimension (int): Dimension of the stored vectors
+        initial_capacity (int): Rows to allocate when creating a new store
+        index_type (str): "flat" for exact search or "ivf" for approximate search
+        nlist (int): Number of IVF lists
+        nprobe (int): Default number of IVF lists scanned per query
+    """
+    
+    def __init__(self, path, dimension, initial_capacity=1024, index_type="flat", nlist=1024, nprobe=16):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.dimension = dimension
+        self.nprobe = nprobe
+        if index_type not in ("flat", "ivf"):
+            raise ValueError(f"Unknown local vector index type: {index_type}")
+        self._ivf = IVFIndex(path, dimension, nlist) if index_type == "ivf" else None
+        self._lock = threading.RLock()
+        self._vectors_path = os.path.join(path, "vectors.f32")
+        self._live_path = os.path.join(path, "live.u8")
+        
+        self._db = sqlite3.connect(os.path.join(path, "metadata.sqlite3"), timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        with self._write(sync=False):
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS records "
+                "(row INTEGER PRIMARY KEY, id TEXT NOT NULL UNIQUE, metadata TEXT NOT NULL)"
+            )
+            self._db.execute("CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            stored = self._db.execute("SELECT value FROM settings WHERE key = 'dimension'").fetchone()
+            if stored is None:
+                self._db.execute("INSERT INTO settings (key, value) VALUES ('dimension', ?)", (str(dimension),))
+            elif int(stored[0]) != dimension:
+                raise ValueError(f"Local vector store at {path} has dimension {stored[0]}, expected {dimension}")
+            
+            if self._db.execute("SELECT 1 FROM settings WHERE key = 'next_row'").fetchone() is None:
+                # Stores written before the allocator was kept in SQLite
+                count, max_row = self._db.execute("SELECT COUNT(*), MAX(row) FROM records").fetchone()
+                self._save_state(0 if max_row is None else max_row + 1, count, 0)
+            
+            # Rows are allocated append-only; SQLite is the source of truth for which are in use
+            self._rows_used, self._count, self._generation = self._read_state()
+            existing_rows = 0
+            if os.path.exists(self._vectors_path):
+                existing_rows = os.path.getsize(self._vectors_path) // (4 * dimension)
+            self._capacity = 0
+            self._map(max(existing_rows, initial_capacity, self._rows_used))
+            # Rows past the last committed record may hold an interrupted write
+            self._live[self._rows_used:] = 0
+            self._flush()
+            self._version = self._data_version()
+    
+    def _data_version(self):
+        return self._db.execute("PRAGMA data_version").fetchone()[0]
+    
+    def _read_state(self):
+        """Read the row allocator, vector count and layout generation"""
+        state = dict(self._db.execute("SELECT key, value FROM settings WHERE key IN ('next_row', 'count', 'generation')"))
+        return int(state["next_row"]), int(state["count"]), int(state["generation"])
+    
+    def _save_state(self, rows_used, count, generation):
+        self._db.executemany(
+            "INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)",
+            [("next_row", str(rows_used)), ("count", str(count)), ("generation", str(generation))]
+        )
+    
+    def _sync(self):
+        """Catch up with rows, deletions and IVF changes written by other processes"""
+        self._version = self._data_version()
+        rows_used, count, generation = self._read_state()
+        if rows_used > self._capacity:
+            # The writer grew the files before committing; only map them
+            self._flush()
+            self._map(rows_used)
+        if self._ivf is not None:
+            if generation != self._generation:
+                self._ivf.reload()
+            elif rows_used > self._rows_used:
+                self._ivf.extend(self._rows_used, rows_used)
+        self._rows_used, self._count, self._generation = rows_used, count, generation
+    
+    def _sync_if_changed(self):
+        if self._data_version() != self._version:
+            self._sync()
+    
+    @contextmanager
+    def _write(self, sync=True):
+        """Run a write transaction, holding the write lock of the store files
+        
+        Args:
+            sync (bool): Catch up with other processes first
+        """
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            if sync:
+                self._sync()
+            yield
+        except BaseException:
+            self._db.rollback()
+            raise
+        self._db.commit()
+    
+    def _map(self, capacity):
+        """(Re)map the vector and liveness files with room for capacity rows"""
+        self._vectors = None
+        self._live = None
+        for file_path, row_bytes in ((self._vectors_path, 4 * self.dimension), (self._live_path, 1)):
+            with open(file_path, "ab") as f:
+                if f.tell() < capacity * row_bytes:
+                    f.truncate(capacity * row_bytes)
+        self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.dimension))
+        self._live = np.memmap(self._live_path, dtype=np.uint8, mode="r+", shape=(capacity,))
+        if self._ivf is not None:
+            self._ivf.map(capacity)
+        self._capacity = capacity
+    
+    def _ensure_capacity(self, rows):
+        if rows > self._capacity:
+            self._flush()
+            self._map(max(rows, self._capacity * 2))
+    
+    def _flush(self):
+        if self._vectors is not None:
+            self._vectors.flush()
+            self._live.flush()
+        if self._ivf is not None:
+            self._ivf.flush()
+    
+    def _rows_for_ids(self, ids):
+        rows = {}
+        for i in range(0, len(ids), _SQL_BATCH):
+            batch = ids[i:i + _SQL_BATCH]
+            placeholders = ",".join("?" * len(batch))
+            rows.update(self._db.execute(
+                f"SELECT id, row FROM records WHERE id IN ({placeholders})", batch
+            ).fetchall())
+        return rows
+    
+    def _records_for_rows(self, rows, include_metadata):
+        columns = "row, id, metadata" if include_metadata else "row, id, NULL"
+        records = {}
+        for i in range(0, len(rows), _SQL_BATCH):
+            batch = rows[i:i + _SQL_BATCH]
+            placeholders = ",".join("?" * len(batch))
+            for row, vector_id, metadata in self._db.execute(
+                f"SELECT {columns} FROM records WHERE row IN ({placeholders})", batch
+            ):
+                records[row] = (vector_id, json.loads(metadata) if metadata else None)
+        return records
+    
+    def _normalize(self, values):
+        matrix = np.asarray(values, dtype=np.float32)
+        if matrix.ndim != 2 or matrix.shape[1] != self.dimension:
+            raise ValueError(f"Expected vectors of dimension {self.dimension}, got shape {matrix.shape}")
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.maximum(norms, 1e-12)
+    
+    def upsert(self, vectors):
+        if not vectors:
+            return {"upserted_count": 0, "failed_batches": []}
+        
+        ids = [vector['id'] for vector in vectors]
+        matrix = self._normalize([vector['values'] for vector in vectors])
+        
+        with self._lock:
+            try:
+                with self._write():
+                    existing = self._rows_for_ids(list(set(ids)))
+                    rows_used, count = self._rows_used, self._count
+                    rows = []
+                    for vector_id in ids:
+                        row = existing.get(vector_id)
+                        if row is None:
+                            row = rows_used
+                            rows_used += 1
+                            existing[vector_id] = row
+                            count += 1
+                        rows.append(row)
+                    
+                    self._ensure_capacity(rows_used)
+                    rows = np.asarray(rows)
+                    self._vectors[rows] = matrix
+                    self._live[rows] = 1
+                    generation = self._generation
+                    if self._ivf is not None and self._update_ivf(rows, matrix, rows_used, count):
+                        # Other processes rebuild their lists
+                        generation += 1
+                    self._flush()
+                    
+                    self._db.executemany(
+                        "INSERT OR REPLACE INTO records (row, id, metadata) VALUES (?, ?, ?)",
+                        [
+                            (int(row), vector['id'], json.dumps(vector.get('metadata', {}), separators=(",", ":")))
+                            for row, vector in zip(rows, vectors)
+                        ]
+                    )
+                    self._save_state(rows_used, count, generation)
+            except BaseException:
+                # Lists may hold rows that were never committed
+                if self._ivf is not None:
+                    self._ivf.reload()
+                raise
+            self._rows_used, self._count, self._generation = rows_used, count, generation
+        
+        return {"upserted_count": len(vectors), "failed_batches": []}
+    
+    def _update_ivf(self, rows, matrix, rows_used, count):
+        """Add written rows to the IVF index, training it once there is enough data
+        
+        Returns:
+            bool: True if lists built by other processes are out of date, because
+                the index was trained or rows moved between lists
+        """
+        if self._ivf.trained:
+            return self._ivf.add(rows, matrix)
+        
+        if count < self._ivf.nlist * _IVF_POINTS_PER_LIST:
+            return False
+        
+        live_rows = np.flatnonzero(self._live[:rows_used])
+        sample_size = min(len(live_rows), self._ivf.nlist * 64)
+        sample_rows = np.sort(np.random.default_rng(0).choice(live_rows, sample_size, replace=False))
+        self._ivf.train(np.asarray(self._vectors[sample_rows]))
+        
+        block = 65536
+        for start in range(0, rows_used, block):
+            block_rows = np.arange(start, min(start + block, rows_used))
+            self._ivf.add(block_rows, np.asarray(self._vectors[block_rows]))
+        return True
+    
+    def _matches(self, rows, scores, include_metadata):
+        """Build Pinecone-shaped matches for rows already ordered by score"""
+        records = self._records_for_rows([int(row) for row in rows], include_metadata)
+        matches = []
+        for row, score in zip(rows, scores):
+            record = records.get(int(row))
+            if record is None:
+                continue
+            match = {"id": record[0], "score": float(score)}
+            if include_metadata:
+                match["metadata"] = record[1]
+            matches.append(match)
+        return matches
+    
+    def _filtered_rows(self, filter):
+        """Rows whose metadata satisfies a filter, in ascending order"""
+        sql, params = metadata_filter_sql(filter, "records.metadata")
+        rows = self._db.execute(f"SELECT row FROM records WHERE {sql} ORDER BY row", params).fetchall()
+        return np.fromiter((row for row, in rows), dtype=np.int64, count=len(rows))
+    
+    def query(self, vector, top_k=10, include_metadata=True, nprobe=None, filter=None, min_score=None):
+        query = self._normalize([vector])[0]
+        
+        # Only picking the rows to score holds the lock; scoring reads the
+        # mapped files, which writers only append to or overwrite in place
+        with self._lock:
+            self._sync_if_changed()
+            n = self._rows_used
+            if self._count == 0 or top_k <= 0:
+                return {"matches": []}
+            vectors, live = self._vectors, self._live
+            
+            if filter:
+                # Score exactly over the matching rows, so a selective filter
+                # still returns a full top-k rather than the few IVF candidates
+                # that happen to match
+                rows = self._filtered_rows(filter)
+            elif self._ivf is not None and self._ivf.trained:
+                rows = self._ivf.candidates(query, nprobe or self.nprobe, n)
+            else:
+                rows = None
+        
+        if rows is None:
+            scores = vectors[:n] @ query
+            scores[live[:n] == 0] = -np.inf
+        else:
+            rows = rows[live[rows] == 1]
+            if len(rows) == 0:
+                return {"matches": []}
+            scores = vectors[rows] @ query
+        
+        k = min(top_k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        top = top[np.isfinite(scores[top])]
+        if min_score is not None:
+            # Drop weak matches before their metadata is loaded
+            top = top[scores[top] >= min_score]
+        top_rows = top if rows is None else rows[top]
+        
+        with self._lock:
+            return {"matches": self._matches(top_rows, scores[top], include_metadata)}
+    
+    def stats(self):
+        with self._lock:
+            self._sync_if_changed()
+            return {"dimension": self.dimension, "total_vector_count": self._count}
+    
+    def delete(self, ids):
+        with self._lock, self._write():
+            rows = list(self._rows_for_ids(list(set(ids))).values())
+            if not rows:
+                return
+            self._live[np.asarray(rows)] = 0
+            self._flush()
+            for i in range(0, len(rows), _SQL_BATCH):
+                batch = rows[i:i + _SQL_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                self._db.execute(f"DELETE FROM records WHERE row IN ({placeholders})", batch)
+            self._count -= len(rows)
+            self._save_state(self._rows_used, self._count, self._generation)
+    
+    def fetch_metadata(self, ids):
+        ids = list(set(ids))
+        metadata = {}
+        with self._lock:
+            for i in range(0, len(ids), _SQL_BATCH):
+                batch = ids[i:i + _SQL_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                for vector_id, value in self._db.execute(
+                    f"SELECT id, metadata FROM records WHERE id IN ({placeholders})", batch
+                ):
+                    metadata[vector_id] = json.loads(value)
+        return metadata
+    
+    def increment_metadata(self, field, increments):
+        path = f'$."{field}"'
+        with self._lock:
+            self._db.executemany(
+                "UPDATE records SET metadata = json_set(metadata, ?, COALESCE(json_extract(metadata, ?), 0) + ?) WHERE id = ?",
+                [(path, path, amount, vector_id) for vector_id, amount in increments.items()]
+            )
+            self._db.commit()
+    
+    def close(self):
+        with self._lock:
+            self._flush()
+            self._vectors = None
+            self._live = None
+            if self._ivf is not None:
+                self._ivf.close()
+            self._db.close()
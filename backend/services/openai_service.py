@@ -1,30 +1,40 @@
-import openai
 from fastapi import HTTPException
 from core.config import settings
+from core.metrics import LLM_TOKENS
 
-# Initialize OpenAI client
-if settings.openai_api_key:
-    openai.api_key = settings.openai_api_key
-else:
+# Model and prompt version used for answers; bump PROMPT_VERSION whenever
+# build_messages changes so cached answers from the old prompt are not reused
+ANSWER_MODEL = "gpt-4"
+PROMPT_VERSION = "1"
+
+# OpenAI client, created on first use; the openai package is slow to import
+client = None
+if not settings.openai_api_key:
     print("Warning: OpenAI API key not found in settings")
 
-def generate_answer(question, context):
-    """Generate an answer to a question using OpenAI and the provided context
+def get_client():
+    """Get the OpenAI client, creating it on first use
+    
+    Returns:
+        openai.AsyncOpenAI: The OpenAI client
+    """
+    global client
+    
+    if client is None:
+        import openai
+        client = openai.AsyncOpenAI(api_key=settings.openai_api_key)
+    return client
+
+def build_messages(question, context):
+    """Build the chat messages asking the model to answer from the context
     
     Args:
         question (str): The question to answer
         context (str): The context to use for answering
         
     Returns:
-        str: The generated answer
-        
-    Raises:
-        HTTPException: If OpenAI API key is not configured
+        list: Chat completion messages
     """
-    if not settings.openai_api_key:
-        raise HTTPException(status_code=500, detail="OpenAI API key not configured")
-    
-    # Generate prompt
     prompt = f"""Answer the following question based on the provided context. 
     Include information only from the context. If you cannot answer the question based on the context, 
     say that you don't have enough information.
@@ -37,18 +47,88 @@ def generate_answer(question, context):
     Instead, integrate the information smoothly and cite sources at the end of relevant sentences or paragraphs.
     """
     
+    return [
+        {"role": "system", "content": "You are a helpful research assistant that provides accurate information with proper citations."},
+        {"role": "user", "content": prompt}
+    ]
+
+def record_usage(usage):
+    """Record the prompt and completion tokens reported for a completion
+    
+    Args:
+        usage: The completion's usage object, or None if it was not reported
+    """
+    if usage is None:
+        return
+    LLM_TOKENS.observe(usage.prompt_tokens, kind="prompt")
+    LLM_TOKENS.observe(usage.completion_tokens, kind="completion")
+
+async def generate_answer(question, context):
+    """Generate an answer to a question using OpenAI and the provided context
+    
+    Args:
+        question (str): The question to answer
+        context (str): The context to use for answering
+        
+    Returns:
+        str: The generated answer
+        
+    Raises:
+        HTTPException: If OpenAI API key is not configured
+    """
+    if not settings.openai_api_key:
+        raise HTTPException(status_code=500, detail="OpenAI API key not configured")
+    
     try:
-        response = openai.chat.completions.create(
-            model="gpt-4",  # or another appropriate model
-            messages=[
-                {"role": "system", "content": "You are a helpful research assistant that provides accurate information with proper citations."},
-                {"role": "user", "content": prompt}
-            ],
+        response = await get_client().chat.completions.create(
+            model=ANSWER_MODEL,
+            messages=build_messages(question, context),
             temperature=0.3,
             max_tokens=1000
         )
         
+        record_usage(getattr(response, "usage", None))
         answer = response.choices[0].message.content
         return answer
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating answer: {str(e)}")
+
+async def stream_answer(question, context):
+    """Stream an answer to a question from OpenAI as it is generated
+    
+    Closing the generator (for example when the client disconnects) closes
+    the upstream response, which stops the generation.
+    
+    Args:
+        question (str): The question to answer
+        context (str): The context to use for answering
+        
+    Yields:
+        str: Pieces of the answer text, in order
+        
+    Raises:
+        HTTPException: If OpenAI API key is not configured or the request fails
+    """
+    if not settings.openai_api_key:
+        raise HTTPException(status_code=500, detail="OpenAI API key not configured")
+    
+    try:
+        stream = await get_client().chat.completions.create(
+            model=ANSWER_MODEL,
+            messages=build_messages(question, context),
+            temperature=0.3,
+            max_tokens=1000,
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error generating answer: {str(e)}")
+    
+    try:
+        async for chunk in stream:
+            # With include_usage the last chunk carries the token counts and no choices
+            record_usage(getattr(chunk, "usage", None))
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    finally:
+        await stream.close()
@@ -1,12 +1,31 @@
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 import pinecone
 from fastapi import HTTPException
 from core.config import settings
 from core.embeddings import get_model_dimension
+from core.metrics import timed, BATCH_SIZE
+from services.vector_store import VectorStore
 
 # Initialize Pinecone client
 pc = None
 index = None
 
+# Index statistics cache, fetched on first read after it expires
+_stats_lock = threading.Lock()
+_stats = None
+_stats_fetched_at = 0.0
+
+# Executor bounding the number of upsert requests in flight, created on first use
+_upsert_executor = None
+_upsert_executor_lock = threading.Lock()
+
+# HTTP statuses worth retrying: rate limiting and server-side failures
+_TRANSIENT_STATUSES = {408, 429, 500, 502, 503, 504}
+
 def initialize_pinecone():
     """Initialize the Pinecone client and connect to the index
     
@@ -36,19 +55,107 @@ def initialize_pinecone():
             )
             index = pc.Index(settings.pinecone_index)
         
+        invalidate_index_stats()
         return index
     except Exception as e:
         print(f"Error initializing Pinecone: {str(e)}")
         return None
 
+def _estimate_vector_bytes(vector):
+    """Estimate the request payload size of a vector record
+    
+    Values serialize to roughly 10 bytes each; metadata (which carries the
+    chunk text) is measured directly.
+    """
+    return 10 * len(vector['values']) + len(json.dumps(vector.get('metadata', {}))) + len(vector['id']) + 64
+
+def _make_batches(vectors):
+    """Split vectors into batches bounded by both vector count and payload bytes
+    
+    Args:
+        vectors (list): List of vector objects
+        
+    Returns:
+        list: Lists of vector objects, in input order
+    """
+    batches = []
+    batch, batch_bytes = [], 0
+    for vector in vectors:
+        size = _estimate_vector_bytes(vector)
+        if batch and (len(batch) >= settings.upsert_max_batch_vectors or batch_bytes + size > settings.upsert_max_batch_bytes):
+            batches.append(batch)
+            batch, batch_bytes = [], 0
+        batch.append(vector)
+        batch_bytes += size
+    if batch:
+        batches.append(batch)
+    return batches
+
+def _is_transient(error):
+    """Decide whether a failed upsert is worth retrying
+    
+    Args:
+        error (Exception): The error raised by the Pinecone client
+        
+    Returns:
+        bool: True for rate limiting, server errors and connection problems
+    """
+    status = getattr(error, 'status', None) or getattr(error, 'status_code', None)
+    if isinstance(status, int):
+        return status in _TRANSIENT_STATUSES
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    # urllib3 connection/protocol errors don't share a builtin base class
+    return type(error).__module__.split('.')[0] in ('urllib3', 'requests', 'httpx', 'grpc')
+
+def _upsert_batch(batch):
+    """Upsert one batch, retrying transient errors with exponential backoff and jitter
+    
+    Args:
+        batch (list): List of vector objects
+        
+    Returns:
+        int: Number of vectors upserted
+    """
+    BATCH_SIZE.observe(len(batch), kind="pinecone_upsert")
+    attempt = 0
+    while True:
+        try:
+            with timed("pinecone_upsert"):
+                index.upsert(vectors=batch)
+            return len(batch)
+        except Exception as e:
+            attempt += 1
+            if attempt > settings.upsert_max_retries or not _is_transient(e):
+                raise
+            delay = min(settings.upsert_retry_base_delay * 2 ** (attempt - 1), settings.upsert_retry_max_delay)
+            time.sleep(delay * random.uniform(0.5, 1.0))
+
+def _get_upsert_executor():
+    global _upsert_executor
+    
+    with _upsert_executor_lock:
+        if _upsert_executor is None:
+            _upsert_executor = ThreadPoolExecutor(
+                max_workers=settings.upsert_concurrency,
+                thread_name_prefix="pinecone-upsert"
+            )
+        return _upsert_executor
+
 def store_vectors(vectors):
     """Store vectors in Pinecone
     
+    Vectors are split into batches sized by count and payload bytes, and up to
+    settings.upsert_concurrency batches are upserted in parallel. Transient
+    errors are retried with exponential backoff; a batch that still fails is
+    reported without failing the others.
+    
     Args:
         vectors (list): List of vector objects to store
         
     Returns:
-        int: Number of vectors stored
+        dict: 'upserted_count' and 'failed_batches', a list of {'ids', 'error'}
+            for each batch that could not be stored
     
     Raises:
         HTTPException: If vector database is not initialized
@@ -56,21 +163,35 @@ def store_vectors(vectors):
     if not index:
         raise HTTPException(status_code=500, detail="Vector database not initialized")
     
-    # Upsert vectors in batches (Pinecone has limits)
-    batch_size = 100
-    for i in range(0, len(vectors), batch_size):
-        batch = vectors[i:i+batch_size]
-        index.upsert(vectors=batch)
+    batches = _make_batches(vectors)
+    if len(batches) == 1:
+        futures = None
+    else:
+        executor = _get_upsert_executor()
+        futures = [executor.submit(_upsert_batch, batch) for batch in batches]
+    
+    upserted_count = 0
+    failed_batches = []
+    for i, batch in enumerate(batches):
+        try:
+            upserted_count += futures[i].result() if futures else _upsert_batch(batch)
+        except Exception as e:
+            failed_batches.append({"ids": [vector['id'] for vector in batch], "error": str(e)})
     
-    return len(vectors)
+    if upserted_count:
+        invalidate_index_stats()
+    
+    return {"upserted_count": upserted_count, "failed_batches": failed_batches}
 
-def query_vectors(query_vector, top_k=10, include_metadata=True):
+def query_vectors(query_vector, top_k=10, include_metadata=True, filter=None, min_score=None):
     """Query vectors in Pinecone
     
     Args:
         query_vector (list): Query vector
         top_k (int): Number of results to return
         include_metadata (bool): Whether to include metadata in results
+        filter (dict, optional): Metadata filter, applied by Pinecone during the search
+        min_score (float, optional): Matches scoring below this are dropped
         
     Returns:
         dict: Query results
@@ -81,23 +202,101 @@ def query_vectors(query_vector, top_k=10, include_metadata=True):
     if not index:
         raise HTTPException(status_code=500, detail="Vector database not initialized")
     
-    # Check if index has any vectors
-    stats = index.describe_index_stats()
-    if stats.get('total_vector_count', 0) == 0:
-        return {"matches": []}
-    
-    # Perform similarity search
-    results = index.query(
-        vector=query_vector,
-        top_k=top_k,
-        include_metadata=include_metadata
-    )
+    # Query directly: Pinecone returns no matches for an empty index, while
+    # cached stats can lag behind upserts made by other workers
+    query_args = {"filter": filter} if filter else {}
+    with timed("pinecone_query"):
+        results = index.query(
+            vector=query_vector,
+            top_k=top_k,
+            include_metadata=include_metadata,
+            **query_args
+        )
     
+    # Pinecone has no score threshold, so drop weak matches before they are processed
+    if min_score is not None:
+        return {"matches": [match for match in results.get("matches", []) if match["score"] >= min_score]}
     return results
 
+def delete_vectors(ids):
+    """Delete vectors from Pinecone
+    
+    Args:
+        ids (list): Ids of the vectors to delete
+        
+    Raises:
+        HTTPException: If vector database is not initialized
+    """
+    if not index:
+        raise HTTPException(status_code=500, detail="Vector database not initialized")
+    
+    # Pinecone caps the number of ids per delete request
+    batch_size = 1000
+    for i in range(0, len(ids), batch_size):
+        index.delete(ids=ids[i:i+batch_size])
+    
+    if ids:
+        invalidate_index_stats()
+
+def fetch_metadata(ids):
+    """Fetch the metadata of vectors in Pinecone
+    
+    Args:
+        ids (list): Vector ids
+        
+    Returns:
+        dict: Metadata by vector id, for the ids that are stored
+        
+    Raises:
+        HTTPException: If vector database is not initialized
+    """
+    if not index:
+        raise HTTPException(status_code=500, detail="Vector database not initialized")
+    
+    ids = list(dict.fromkeys(ids))
+    metadata = {}
+    # Fetching takes ids in the URL, so keep batches short
+    batch_size = 100
+    for i in range(0, len(ids), batch_size):
+        fetched = index.fetch(ids=ids[i:i+batch_size]).vectors
+        metadata.update((vector_id, vector.metadata or {}) for vector_id, vector in fetched.items())
+    return metadata
+
+def increment_metadata(field, increments):
+    """Add to a numeric metadata field of vectors in Pinecone
+    
+    Pinecone can only set metadata values, so the current values are fetched
+    and the new ones written with one update request per vector, up to
+    settings.upsert_concurrency at a time. Increments from elsewhere landing
+    between the fetch and the update can be lost, which is acceptable for
+    approximate counters such as usage_count.
+    
+    Args:
+        field (str): Metadata field, treated as 0 where it is missing
+        increments (dict): Amount to add by vector id; unknown ids are ignored
+        
+    Raises:
+        HTTPException: If vector database is not initialized
+    """
+    current = fetch_metadata(list(increments))
+    executor = _get_upsert_executor()
+    futures = [
+        executor.submit(
+            index.update,
+            id=vector_id,
+            set_metadata={field: metadata.get(field, 0) + increments[vector_id]}
+        )
+        for vector_id, metadata in current.items()
+    ]
+    for future in futures:
+        future.result()
+
 def get_index_stats():
     """Get statistics about the Pinecone index
     
+    Statistics are served from a cache that expires after
+    settings.index_stats_ttl_seconds and is invalidated by store_vectors.
+    
     Returns:
         dict: Index statistics
         
@@ -107,4 +306,67 @@ def get_index_stats():
     if not index:
         raise HTTPException(status_code=500, detail="Vector database not initialized")
     
-    return index.describe_index_stats()
+    return _get_cached_stats()
+
+def _refresh_index_stats():
+    """Fetch index statistics from Pinecone and update the cache
+    
+    Returns:
+        dict: Index statistics
+    """
+    global _stats, _stats_fetched_at
+    
+    stats = index.describe_index_stats()
+    with _stats_lock:
+        _stats = stats
+        _stats_fetched_at = time.monotonic()
+    return stats
+
+def _get_cached_stats():
+    """Get index statistics from the cache, fetching them if missing or expired
+    
+    Returns:
+        dict: Index statistics
+    """
+    with _stats_lock:
+        stats = _stats
+        age = time.monotonic() - _stats_fetched_at
+    
+    if stats is None or age > settings.index_stats_ttl_seconds:
+        stats = _refresh_index_stats()
+    return stats
+
+def invalidate_index_stats():
+    """Drop cached index statistics so the next reader fetches fresh ones"""
+    global _stats
+    
+    with _stats_lock:
+        _stats = None
+
+
+class PineconeVectorStore(VectorStore):
+    """VectorStore backed by the module-level Pinecone index"""
+    
+    def __init__(self):
+        if not index:
+            initialize_pinecone()
+    
+    def upsert(self, vectors):
+        return store_vectors(vectors)
+    
+    def query(self, vector, top_k=10, include_metadata=True, nprobe=None, filter=None, min_score=None):
+        # Pinecone manages its own index parameters, so nprobe does not apply
+        return query_vectors(vector, top_k=top_k, include_metadata=include_metadata, filter=filter, min_score=min_score)
+    
+    def stats(self):
+        return get_index_stats()
+    
+    def delete(self, ids):
+        delete_vectors(ids)
+    
+    def fetch_metadata(self, ids):
+        return fetch_metadata(ids)
+    
+    def increment_metadata(self, field, increments):
+        increment_metadata(field, increments)
+    
\ No newline at end of file
@@ -0,0 +1,284 @@
+import sqlite3
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from core.config import settings
+from utils.helpers import get_logger
+
+logger = get_logger("usage_counter")
+
+_INCREMENT = "INSERT INTO {table} (chunk_id, count) VALUES (?, ?) ON CONFLICT (chunk_id) DO UPDATE SET count = count + excluded.count"
+# Return claimed increments to the pending queue
+_REQUEUE = (
+    "INSERT INTO usage_pending (chunk_id, count) SELECT chunk_id, SUM(count) FROM usage_inflight "
+    "WHERE {condition} GROUP BY chunk_id ON CONFLICT (chunk_id) DO UPDATE SET count = count + excluded.count"
+)
+
+class UsageCounter:
+    """Write-behind counter of chunk hits, flushed to usage_count in the vector store
+    
+    record() only touches memory, so requests never wait for a write. The
+    background flusher periodically journals the new hits to SQLite, as
+    pending increments and as all-time totals, and every flush interval
+    applies the coalesced pending increments to the vector store metadata in
+    batches. A crash therefore loses at most one journal interval of hits.
+    
+    Flushes claim the pending increments under a lease, so several workers
+    sharing the journal never apply the same increment twice; increments
+    claimed by a flush that died are requeued once its lease expires.
+    
+    Args:
+        path (str): SQLite file holding the journal
+        lease_seconds (float): Time after which a claimed, unfinished flush is requeued
+        clock (callable): Time source, for tests
+    """
+    
+    def __init__(self, path, lease_seconds=300.0, clock=time.time):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._unjournaled = Counter()
+        # Autocommit mode, so claims can take an explicit write lock with BEGIN IMMEDIATE
+        self._db = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS usage_pending (chunk_id TEXT PRIMARY KEY, count INTEGER NOT NULL)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS usage_inflight (flush_id TEXT NOT NULL, chunk_id TEXT NOT NULL, "
+            "count INTEGER NOT NULL, claimed_at REAL NOT NULL, PRIMARY KEY (flush_id, chunk_id))"
+        )
+        self._db.execute("CREATE TABLE IF NOT EXISTS usage_totals (chunk_id TEXT PRIMARY KEY, count INTEGER NOT NULL)")
+        self._totals = Counter(dict(self._db.execute("SELECT chunk_id, count FROM usage_totals")))
+        self.flushed = 0
+    
+    def record(self, chunk_ids):
+        """Count one hit for each chunk
+        
+        Args:
+            chunk_ids (iterable): Ids of the chunks returned or cited
+        """
+        with self._lock:
+            for chunk_id in chunk_ids:
+                self._unjournaled[chunk_id] += 1
+                self._totals[chunk_id] += 1
+    
+    def journal(self):
+        """Write the hits recorded since the last call to the journal
+        
+        Returns:
+            int: Number of hits journaled
+        """
+        with self._lock:
+            hits, self._unjournaled = self._unjournaled, Counter()
+        if not hits:
+            return 0
+        
+        rows = list(hits.items())
+        try:
+            with self._transaction() as db:
+                db.executemany(_INCREMENT.format(table="usage_pending"), rows)
+                db.executemany(_INCREMENT.format(table="usage_totals"), rows)
+        except Exception:
+            # Keep the hits for the next attempt
+            with self._lock:
+                self._unjournaled.update(hits)
+            raise
+        return sum(hits.values())
+    
+    @contextmanager
+    def _transaction(self):
+        """Run statements in one transaction holding the journal's write lock"""
+        with self._db_lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._db
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+    
+    def _claim(self):
+        """Requeue expired claims, then claim every pending increment
+        
+        Returns:
+            tuple: (flush id, dict of increment by chunk id)
+        """
+        flush_id = uuid.uuid4().hex
+        now = self._clock()
+        expired = now - self.lease_seconds
+        with self._transaction() as db:
+            db.execute(_REQUEUE.format(condition="claimed_at < ?"), (expired,))
+            db.execute("DELETE FROM usage_inflight WHERE claimed_at < ?", (expired,))
+            increments = dict(db.execute("SELECT chunk_id, count FROM usage_pending"))
+            db.execute("DELETE FROM usage_pending")
+            db.executemany(
+                "INSERT INTO usage_inflight (flush_id, chunk_id, count, claimed_at) VALUES (?, ?, ?, ?)",
+                [(flush_id, chunk_id, count, now) for chunk_id, count in increments.items()]
+            )
+        return flush_id, increments
+    
+    def _finish(self, flush_id, chunk_ids):
+        """Drop the claims of increments that have been applied"""
+        with self._transaction() as db:
+            db.executemany(
+                "DELETE FROM usage_inflight WHERE flush_id = ? AND chunk_id = ?",
+                [(flush_id, chunk_id) for chunk_id in chunk_ids]
+            )
+    
+    def _release(self, flush_id):
+        """Return the unapplied increments of a failed flush to the pending queue"""
+        with self._transaction() as db:
+            db.execute(_REQUEUE.format(condition="flush_id = ?"), (flush_id,))
+            db.execute("DELETE FROM usage_inflight WHERE flush_id = ?", (flush_id,))
+    
+    def flush(self, apply, batch_size=100):
+        """Journal new hits and apply every pending increment
+        
+        Args:
+            apply (callable): Function applying a dict of increment by chunk id
+                to the stored usage counts
+            batch_size (int): Chunks per apply call
+        
+        Returns:
+            int: Number of chunks whose usage count was updated
+        """
+        self.journal()
+        flush_id, increments = self._claim()
+        items = list(increments.items())
+        try:
+            for i in range(0, len(items), batch_size):
+                batch = dict(items[i:i + batch_size])
+                apply(batch)
+                self._finish(flush_id, batch)
+        except Exception:
+            self._release(flush_id)
+            raise
+        
+        self._refresh_totals()
+        self.flushed += len(items)
+        return len(items)
+    
+    def _refresh_totals(self):
+        """Reload the totals from the journal, to include hits recorded by other workers"""
+        with self._db_lock:
+            totals = Counter(dict(self._db.execute("SELECT chunk_id, count FROM usage_totals")))
+        with self._lock:
+            totals.update(self._unjournaled)
+            self._totals = totals
+    
+    def most_used(self, limit=10):
+        """Get the chunks with the most recorded hits
+        
+        Args:
+            limit (int): Number of chunks to return
+        
+        Returns:
+            list: (chunk id, hits) pairs, most used first
+        """
+        with self._lock:
+            return self._totals.most_common(limit)
+    
+    def stats(self):
+        """Get counter statistics
+        
+        Returns:
+            dict: Chunks with recorded hits, hits not yet journaled and chunks flushed
+        """
+        with self._lock:
+            return {
+                "tracked_chunks": len(self._totals),
+                "unjournaled_hits": sum(self._unjournaled.values()),
+                "flushed_chunks": self.flushed,
+            }
+    
+    def close(self):
+        with self._db_lock:
+            self._db.close()
+
+# Usage counter, opened on first use
+_counter = None
+_counter_lock = threading.Lock()
+
+# Background flusher thread and its stop signal
+_flusher = None
+_stop_flusher = threading.Event()
+
+def get_usage_counter():
+    """Get the usage counter, opening its journal if needed
+    
+    Returns:
+        UsageCounter: The process-wide usage counter
+    """
+    global _counter
+    
+    with _counter_lock:
+        if _counter is None:
+            _counter = UsageCounter(settings.usage_journal_path, lease_seconds=settings.usage_flush_lease_seconds)
+        return _counter
+
+def record_chunk_hits(chunk_ids):
+    """Count a hit for each chunk returned by a search or cited in an answer
+    
+    Args:
+        chunk_ids (iterable): Chunk ids
+    """
+    if settings.usage_tracking_enabled:
+        get_usage_counter().record(chunk_ids)
+
+def flush_usage():
+    """Journal recorded hits and apply pending increments to the vector store
+    
+    Returns:
+        int: Number of chunks whose usage count was updated
+    """
+    from services.vector_store import increment_usage_counts
+    return get_usage_counter().flush(increment_usage_counts, batch_size=settings.usage_flush_batch_size)
+
+def _flush_loop():
+    last_flush = time.monotonic()
+    while not _stop_flusher.wait(settings.usage_journal_interval_seconds):
+        try:
+            if time.monotonic() - last_flush >= settings.usage_flush_interval_seconds:
+                last_flush = time.monotonic()
+                flush_usage()
+            else:
+                get_usage_counter().journal()
+        except Exception as e:
+            logger.error(f"Failed to flush usage counts: {str(e)}")
+
+def start_usage_flusher():
+    """Start the background thread journaling and flushing usage counts"""
+    global _flusher
+    
+    if not settings.usage_tracking_enabled or _flusher is not None:
+        return
+    get_usage_counter()
+    _stop_flusher.clear()
+    _flusher = threading.Thread(target=_flush_loop, name="usage-flusher", daemon=True)
+    _flusher.start()
+
+def stop_usage_flusher():
+    """Stop the flusher, apply what is pending and close the journal"""
+    global _flusher, _counter
+    
+    if _flusher is not None:
+        _stop_flusher.set()
+        _flusher.join(timeout=5)
+        _flusher = None
+        try:
+            flush_usage()
+        except Exception as e:
+            # The hits are journaled (or kept in memory until close) and applied by the next flush
+            logger.error(f"Failed to flush usage counts on shutdown: {str(e)}")
+    
+    with _counter_lock:
+        if _counter is not None:
+            try:
+                _counter.journal()
+            except Exception as e:
+                logger.error(f"Failed to journal usage counts: {str(e)}")
+            _counter.close()
+            _counter = None
@@ -0,0 +1,324 @@
+from abc import ABC, abstractmethod
+import os
+import threading
+from fastapi import HTTPException
+from core.config import settings
+
+class VectorStore(ABC):
+    """Interface implemented by every vector database backend
+    
+    Vectors are dicts with 'id', 'values' and 'metadata' keys, and query
+    results use Pinecone's shape: {"matches": [{"id", "score", "metadata"}]}.
+    Query filters also use Pinecone's metadata filter language, restricted to
+    the $eq, $in, $gt, $gte, $lt, $lte and $and operators.
+    """
+    
+    @abstractmethod
+    def upsert(self, vectors):
+        """Insert or overwrite vectors
+        
+        Args:
+            vectors (list): List of vector objects to store
+            
+        Returns:
+            dict: 'upserted_count' and 'failed_batches', a list of {'ids', 'error'}
+                for each batch that could not be stored
+        """
+    
+    @abstractmethod
+    def query(self, vector, top_k=10, include_metadata=True, nprobe=None, filter=None, min_score=None):
+        """Find the vectors most similar to a query vector
+        
+        Args:
+            vector (list): Query vector
+            top_k (int): Number of results to return
+            include_metadata (bool): Whether to include metadata in results
+            nprobe (int, optional): Lists to scan, for backends with an IVF index
+            filter (dict, optional): Metadata filter the matches must satisfy
+            min_score (float, optional): Matches scoring below this are dropped
+            
+        Returns:
+            dict: Query results with a 'matches' list ordered by score
+        """
+    
+    @abstractmethod
+    def stats(self):
+        """Get statistics about the store
+        
+        Returns:
+            dict: Statistics including 'dimension' and 'total_vector_count'
+        """
+    
+    @abstractmethod
+    def delete(self, ids):
+        """Delete vectors by id
+        
+        Args:
+            ids (list): Ids of the vectors to delete
+        """
+    
+    @abstractmethod
+    def fetch_metadata(self, ids):
+        """Get the metadata of stored vectors
+        
+        Args:
+            ids (list): Vector ids
+            
+        Returns:
+            dict: Metadata by vector id, for the ids that are stored
+        """
+    
+    @abstractmethod
+    def increment_metadata(self, field, increments):
+        """Add to a numeric metadata field of stored vectors
+        
+        Args:
+            field (str): Metadata field, treated as 0 where it is missing
+            increments (dict): Amount to add by vector id; unknown ids are ignored
+        """
+    
+    def close(self):
+        """Release resources held by the store"""
+
+# Active vector store, created from settings on first use
+_store = None
+_store_lock = threading.Lock()
+
+def initialize_vector_store():
+    """Create the vector store selected by settings.vector_store_backend
+    
+    Returns:
+        VectorStore: The active vector store
+        
+    Raises:
+        ValueError: If the configured backend is unknown
+    """
+    global _store
+    
+    with _store_lock:
+        if _store is not None:
+            return _store
+        
+        backend = settings.vector_store_backend.lower()
+        if backend == "pinecone":
+            from services.pinecone_service import PineconeVectorStore
+            _store = PineconeVectorStore()
+        elif backend == "local":
+            from services.local_vector_store import LocalVectorStore
+            from core.embeddings import get_model_dimension
+            _store = LocalVectorStore(
+                settings.local_vector_store_path,
+                get_model_dimension(),
+                index_type=settings.local_vector_index,
+                nlist=settings.local_ivf_nlist,
+                nprobe=settings.local_ivf_nprobe
+            )
+        else:
+            raise ValueError(f"Unknown vector store backend: {settings.vector_store_backend}")
+        
+        return _store
+
+def vector_store_id():
+    """Identify the vector store that chunks are written to
+    
+    Chunks recorded as stored in one store are missing from any other, so the
+    embedding store keys its chunk fingerprints on this id.
+    
+    Returns:
+        str: Backend, index name or directory, and settings.vector_store_generation
+    """
+    backend = settings.vector_store_backend.lower()
+    if backend == "pinecone":
+        target = settings.pinecone_index
+    else:
+        target = os.path.abspath(settings.local_vector_store_path)
+    return f"{backend}:{target}:{settings.vector_store_generation}"
+
+def get_vector_store():
+    """Get the active vector store, initializing it if needed
+    
+    Returns:
+        VectorStore: The active vector store
+        
+    Raises:
+        HTTPException: If the vector store cannot be initialized
+    """
+    if _store is not None:
+        return _store
+    
+    try:
+        return initialize_vector_store()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Vector database not initialized: {str(e)}")
+
+def close_vector_store():
+    """Close the active vector store"""
+    global _store
+    
+    with _store_lock:
+        if _store is not None:
+            _store.close()
+            _store = None
+
+def store_vectors(vectors):
+    """Store vectors in the active vector store
+    
+    Args:
+        vectors (list): List of vector objects to store
+        
+    Returns:
+        dict: 'upserted_count' and 'failed_batches'
+    """
+    return get_vector_store().upsert(vectors)
+
+def query_vectors(query_vector, top_k=10, include_metadata=True, nprobe=None, filter=None, min_score=None):
+    """Query the active vector store
+    
+    Args:
+        query_vector (list): Query vector
+        top_k (int): Number of results to return
+        include_metadata (bool): Whether to include metadata in results
+        nprobe (int, optional): Lists to scan, for backends with an IVF index
+        filter (dict, optional): Metadata filter the matches must satisfy
+        min_score (float, optional): Matches scoring below this are dropped
+        
+    Returns:
+        dict: Query results
+    """
+    return get_vector_store().query(
+        query_vector,
+        top_k=top_k,
+        include_metadata=include_metadata,
+        nprobe=nprobe,
+        filter=filter,
+        min_score=min_score
+    )
+
+def build_metadata_filter(filters):
+    """Translate typed search filters into a vector store metadata filter
+    
+    Args:
+        filters (SearchFilters): Filters from a search request, or None
+        
+    Returns:
+        dict or None: Pinecone-style metadata filter, or None if nothing is restricted
+    """
+    if filters is None:
+        return None
+    
+    conditions = []
+    if filters.journal:
+        conditions.append({"journal": {"$in": filters.journal}})
+    if filters.publish_year_min is not None or filters.publish_year_max is not None:
+        year = {}
+        if filters.publish_year_min is not None:
+            year["$gte"] = filters.publish_year_min
+        if filters.publish_year_max is not None:
+            year["$lte"] = filters.publish_year_max
+        conditions.append({"publish_year": year})
+    if filters.doi:
+        conditions.append({"doi": {"$eq": filters.doi}})
+    # $in on a list field matches any element, so each required key is its own condition
+    for key in filters.attribute_keys or []:
+        conditions.append({"attribute_keys": {"$in": [key]}})
+    
+    if not conditions:
+        return None
+    return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+def get_index_stats():
+    """Get statistics about the active vector store
+    
+    Returns:
+        dict: Index statistics
+    """
+    return get_vector_store().stats()
+
+def delete_vectors(ids):
+    """Delete vectors from the active vector store
+    
+    Args:
+        ids (list): Ids of the vectors to delete
+    """
+    if ids:
+        get_vector_store().delete(ids)
+        from services.lexical_index import unindex_chunks
+        unindex_chunks(ids)
+
+def get_usage_counts(ids):
+    """Read the usage_count metadata of chunks in the active vector store
+    
+    Args:
+        ids (list): Chunk ids
+        
+    Returns:
+        dict: Usage count by chunk id, for the chunks that are stored
+    """
+    if not ids:
+        return {}
+    return {
+        vector_id: metadata.get("usage_count", 0)
+        for vector_id, metadata in get_vector_store().fetch_metadata(ids).items()
+    }
+
+def increment_usage_counts(increments):
+    """Add hits to the usage_count metadata of chunks in the active vector store
+    
+    Args:
+        increments (dict): Hits to add by chunk id
+    """
+    if increments:
+        get_vector_store().increment_metadata("usage_count", increments)
+
+_COMPARISONS = {"$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<="}
+
+def metadata_filter_sql(filter, column):
+    """Translate a metadata filter into an SQLite condition on a JSON column
+    
+    Equality and membership use json_each, which yields a scalar field's value
+    or each element of a list field, so {"$in": [...]} matches any element the
+    way Pinecone does.
+    
+    Args:
+        filter (dict): Metadata filter
+        column (str): SQL expression holding the JSON metadata
+        
+    Returns:
+        tuple: (SQL condition, list of parameters)
+        
+    Raises:
+        ValueError: If the filter uses an unsupported operator
+    """
+    conditions = []
+    params = []
+    for field, condition in filter.items():
+        if field == "$and":
+            for part in condition:
+                sql, part_params = metadata_filter_sql(part, column)
+                conditions.append(sql)
+                params.extend(part_params)
+            continue
+        if field.startswith("$"):
+            raise ValueError(f"Unsupported metadata filter operator: {field}")
+        
+        path = f'$."{field}"'
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        for operator, value in condition.items():
+            if operator in ("$eq", "$in"):
+                values = value if operator == "$in" else [value]
+                if not values:
+                    conditions.append("0")
+                    continue
+                placeholders = ",".join("?" * len(values))
+                conditions.append(
+                    f"EXISTS (SELECT 1 FROM json_each({column}, ?) WHERE json_each.value IN ({placeholders}))"
+                )
+                params.extend([path, *values])
+            elif operator in _COMPARISONS:
+                conditions.append(f"json_extract({column}, ?) {_COMPARISONS[operator]} ?")
+                params.extend([path, value])
+            else:
+                raise ValueError(f"Unsupported metadata filter operator: {operator}")
+    
+    return " AND ".join(f"({condition})" for condition in conditions) or "1", params
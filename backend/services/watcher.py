@@ -0,0 +1,402 @@
+"""Ingestion daemon that watches a directory for new journal files.
+
+Files dropped into settings.watch_directory are chunked in a process pool and
+fed through the ingestion pipeline. Each file is recorded in a SQLite log once
+it has been ingested, so a restarted daemon resumes with the files it had not
+finished. New files are picked up from file-system events (watchdog), so only
+the startup catch-up scan lists the whole directory; rescanning it instead
+must be asked for with --poll (WATCH_POLL_SECONDS).
+    
+    python -m services.watcher --directory /data/incoming
+"""
+import argparse
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from fastapi.concurrency import run_in_threadpool
+from core.config import settings
+from services.ingestion import run_ingestion_pipeline
+from utils.documents import chunk_document, is_chunk_file, is_supported_file
+from utils.helpers import get_logger
+
+logger = get_logger("ingestion_watcher")
+
+class ProcessedFilesLog:
+    """Log of ingested files, keyed on path, size and modification time
+    
+    A file counts as processed only once all its chunks are stored and the
+    log row is committed, so a crash at any point leaves the file to be
+    ingested again. Files that failed, or had chunks that could not be
+    stored, are tried again once retry_seconds have passed. Changing a file
+    changes its size or mtime, so it is ingested again too.
+    
+    Args:
+        path (str): SQLite file holding the log
+        retry_seconds (float): Time before a failed or partial file is retried
+    """
+    
+    def __init__(self, path, retry_seconds=600.0):
+        self.path = path
+        self.retry_seconds = retry_seconds
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS processed_files "
+            "(path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, status TEXT NOT NULL, "
+            "chunks_stored INTEGER NOT NULL DEFAULT 0, chunks_failed INTEGER NOT NULL DEFAULT 0, "
+            "error TEXT, processed_at REAL NOT NULL)"
+        )
+        self._db.commit()
+    
+    def is_processed(self, path, size, mtime_ns):
+        """Check whether this version of a file needs no ingesting now
+        
+        Args:
+            path (str): File path
+            size (int): File size in bytes
+            mtime_ns (int): Modification time in nanoseconds
+        
+        Returns:
+            bool: True if the log has the file with the same size and mtime,
+                completed or failed less than retry_seconds ago
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT size, mtime_ns, status, processed_at FROM processed_files WHERE path = ?", (path,)
+            ).fetchone()
+        if row is None or tuple(row[:2]) != (size, mtime_ns):
+            return False
+        return row[2] == "completed" or time.time() - row[3] < self.retry_seconds
+    
+    def retry_due(self):
+        """List the failed or partial files whose retry time has come
+        
+        Returns:
+            list: Paths to ingest again
+        """
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT path FROM processed_files WHERE status != 'completed' AND processed_at <= ?",
+                (time.time() - self.retry_seconds,)
+            ).fetchall()
+        return [path for path, in rows]
+    
+    def record(self, path, size, mtime_ns, status, chunks_stored=0, chunks_failed=0, error=None):
+        """Record the outcome of ingesting a file
+        
+        Args:
+            path (str): File path
+            size (int): File size in bytes when it was read
+            mtime_ns (int): Modification time in nanoseconds when it was read
+            status (str): "completed", "partial" (some chunks failed) or "failed"
+            chunks_stored (int): Chunks stored from the file
+            chunks_failed (int): Chunks that could not be stored
+            error (str, optional): Why the file failed
+        """
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO processed_files "
+                "(path, size, mtime_ns, status, chunks_stored, chunks_failed, error, processed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (path, size, mtime_ns, status, chunks_stored, chunks_failed, error, time.time())
+            )
+    
+    def stats(self):
+        """Count logged files by status
+        
+        Returns:
+            dict: Number of files per status
+        """
+        with self._lock:
+            return dict(self._db.execute("SELECT status, COUNT(*) FROM processed_files GROUP BY status"))
+    
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+async def _aiter(records):
+    for record in records:
+        yield record
+
+class DirectoryWatcher:
+    """Watch a directory and ingest every new or changed file
+    
+    Paths arrive from file-system events and are ingested once no event has
+    been seen for them for settle_seconds, so files still being written are
+    not read half-way. Up to max_in_flight files are processed at a time.
+    
+    Args:
+        directory (str): Directory to watch
+        log (ProcessedFilesLog): Log of processed files
+        workers (int, optional): Chunking processes; None uses every CPU and 0
+            chunks in threads of this process
+        recursive (bool): Also watch subdirectories
+        settle_seconds (float): Quiet time before a changed file is read
+        max_in_flight (int): Files processed concurrently
+        max_chars (int): Maximum characters per document chunk
+        poll_seconds (float, optional): Rescan the directory this often instead
+            of using file-system events, which need watchdog
+    """
+    
+    def __init__(self, directory, log, workers=None, recursive=True, settle_seconds=2.0, max_in_flight=4, max_chars=2000,
+                 poll_seconds=None):
+        self.directory = os.path.abspath(directory)
+        self.log = log
+        self.workers = workers
+        self.recursive = recursive
+        self.settle_seconds = settle_seconds
+        self.max_in_flight = max_in_flight
+        self.max_chars = max_chars
+        self.poll_seconds = poll_seconds
+        self.files_processed = 0
+        self._pool = None
+        self._loop = None
+        self._queue = None
+        self._queued = set()
+        self._changed = {}  # path -> time of its last event, until it settles
+    
+    def _stat(self, path):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
+    
+    def _enqueue(self, path):
+        if path not in self._queued:
+            self._queued.add(path)
+            self._queue.put_nowait(path)
+    
+    def notify(self, path):
+        """Report a file-system event for a path; safe to call from any thread
+        
+        Args:
+            path (str): Path of the created, modified or moved-in file
+        """
+        if is_supported_file(path):
+            self._loop.call_soon_threadsafe(self._changed.__setitem__, os.path.abspath(path), time.monotonic())
+    
+    def scan(self):
+        """List the supported files that are not in the log yet, or changed since
+        
+        Returns:
+            list: Paths to ingest
+        """
+        pending = []
+        for root, dirs, files in os.walk(self.directory):
+            if not self.recursive:
+                dirs.clear()
+            for name in files:
+                path = os.path.join(root, name)
+                if not is_supported_file(path):
+                    continue
+                stat = self._stat(path)
+                if stat is not None and not self.log.is_processed(path, *stat):
+                    pending.append(path)
+        return pending
+    
+    async def _settle(self):
+        """Move paths that have been quiet for settle_seconds onto the queue"""
+        while True:
+            await asyncio.sleep(max(self.settle_seconds / 2, 0.05))
+            now = time.monotonic()
+            for path, last_event in list(self._changed.items()):
+                if now - last_event >= self.settle_seconds:
+                    del self._changed[path]
+                    self._enqueue(path)
+    
+    async def _chunk(self, path):
+        if self._pool is None:
+            return await run_in_threadpool(chunk_document, path, self.max_chars)
+        return await self._loop.run_in_executor(self._pool, partial(chunk_document, path, self.max_chars))
+    
+    async def process_file(self, path):
+        """Chunk a file, ingest the chunks and log the outcome
+        
+        Args:
+            path (str): File to ingest
+        """
+        stat = self._stat(path)
+        if stat is None or self.log.is_processed(path, *stat):
+            return
+        
+        try:
+            records = await self._chunk(path)
+            # One upload per file version. A document file holds its whole
+            # document, so chunks missing from a changed one can be deleted;
+            # a chunk file may hold only part of its documents.
+            summary = await run_ingestion_pipeline(
+                _aiter(records), skip_invalid=True, upload_id=f"file:{path}:{stat[0]}:{stat[1]}",
+                replace_documents=not is_chunk_file(path)
+            )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Failed to ingest {path}: {str(e)}")
+            await run_in_threadpool(self.log.record, path, *stat, "failed", error=str(e))
+            return
+        
+        await run_in_threadpool(
+            self.log.record, path, *stat, "partial" if summary["chunks_failed"] else "completed",
+            chunks_stored=summary["chunks_stored"], chunks_failed=summary["chunks_failed"]
+        )
+        self.files_processed += 1
+        logger.info(
+            f"Ingested {path}: {summary['chunks_stored']} chunks stored, "
+            f"{summary['chunks_skipped']} unchanged, {summary['chunks_failed']} failed"
+        )
+    
+    async def _worker(self):
+        while True:
+            path = await self._queue.get()
+            self._queued.discard(path)
+            try:
+                await self.process_file(path)
+            finally:
+                self._queue.task_done()
+    
+    def _start_observer(self):
+        """Start a watchdog observer feeding notify()
+        
+        Raises:
+            RuntimeError: If watchdog is not installed
+        """
+        try:
+            from watchdog.events import FileSystemEventHandler
+            from watchdog.observers import Observer
+        except ImportError as e:
+            raise RuntimeError(
+                "The watch daemon needs watchdog for file-system events: pip install watchdog, "
+                "or set WATCH_POLL_SECONDS to rescan the directory instead"
+            ) from e
+        
+        watcher = self
+        
+        class Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                if event.is_directory or event.event_type not in ("created", "modified", "moved", "closed"):
+                    return
+                watcher.notify(getattr(event, "dest_path", "") or event.src_path)
+        
+        observer = Observer()
+        observer.schedule(Handler(), self.directory, recursive=self.recursive)
+        observer.start()
+        return observer
+    
+    async def _poll(self, interval):
+        """Rescan the directory periodically, for file systems without usable events"""
+        while True:
+            await asyncio.sleep(interval)
+            for path in await run_in_threadpool(self.scan):
+                self._enqueue(path)
+    
+    async def _retry(self):
+        """Queue failed and partial files again once their retry time has come"""
+        while True:
+            await asyncio.sleep(max(self.log.retry_seconds / 2, 0.05))
+            for path in await run_in_threadpool(self.log.retry_due):
+                if os.path.exists(path):
+                    self._enqueue(path)
+    
+    async def run(self, once=False):
+        """Ingest pending files, then keep ingesting new ones
+        
+        Args:
+            once (bool): Stop after the files present at startup are ingested
+        """
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        if self.workers != 0:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        
+        tasks = [asyncio.create_task(self._worker()) for _ in range(self.max_in_flight)]
+        observer = None
+        try:
+            if not once:
+                tasks.append(asyncio.create_task(self._retry()))
+                if self.poll_seconds:
+                    tasks.append(asyncio.create_task(self._poll(self.poll_seconds)))
+                else:
+                    # Watch before scanning so files arriving during the scan are not missed
+                    observer = self._start_observer()
+                    tasks.append(asyncio.create_task(self._settle()))
+            
+            pending = await run_in_threadpool(self.scan)
+            logger.info(f"Watching {self.directory}: {len(pending)} files to catch up on")
+            for path in pending:
+                self._enqueue(path)
+            
+            if once:
+                await self._queue.join()
+            else:
+                await asyncio.gather(*tasks)
+        finally:
+            if observer is not None:
+                observer.stop()
+                observer.join()
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+
+async def run_watcher(directory, once=False, poll_seconds=None):
+    """Run the ingestion daemon on a directory with the configured settings
+    
+    Args:
+        directory (str): Directory to watch
+        once (bool): Stop after the files present at startup are ingested
+        poll_seconds (float, optional): Rescan interval replacing file-system
+            events, defaults to settings.watch_poll_seconds
+    
+    Returns:
+        DirectoryWatcher: The watcher, after it stopped
+    """
+    from services.vector_store import initialize_vector_store, close_vector_store
+    from services.lexical_index import close_lexical_index
+    from services.embedding_store import close_embedding_store
+    
+    await run_in_threadpool(initialize_vector_store)
+    log = ProcessedFilesLog(settings.watch_processed_log_path, retry_seconds=settings.watch_retry_seconds)
+    watcher = DirectoryWatcher(
+        directory,
+        log,
+        workers=settings.watch_chunk_workers,
+        recursive=settings.watch_recursive,
+        settle_seconds=settings.watch_settle_seconds,
+        max_in_flight=settings.watch_max_files_in_flight,
+        max_chars=settings.watch_chunk_max_chars,
+        poll_seconds=poll_seconds or settings.watch_poll_seconds
+    )
+    try:
+        await watcher.run(once=once)
+    finally:
+        log.close()
+        close_vector_store()
+        close_lexical_index()
+        close_embedding_store()
+    return watcher
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--directory", default=settings.watch_directory, help="Directory to watch")
+    parser.add_argument("--once", action="store_true", help="Ingest the files present now and exit")
+    parser.add_argument("--poll", type=float, metavar="SECONDS",
+                        help="Rescan the directory this often instead of using file-system events")
+    args = parser.parse_args()
+    if not args.directory:
+        parser.error("set --directory or WATCH_DIRECTORY")
+    
+    try:
+        asyncio.run(run_watcher(args.directory, once=args.once, poll_seconds=args.poll))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
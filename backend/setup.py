@@ -10,9 +10,15 @@ setup(
         "pinecone>=3.0.0",
         "python-multipart>=0.0.6",
         "python-dotenv>=1.0.0",
-        "sentence-transformers>=2.2.2",
+        "sentence-transformers>=3.2.0",
         "pytest>=7.3.1",
         "httpx>=0.24.1",
-        "openai>=1.0.0"
+        "openai>=1.0.0",
+        "tiktoken>=0.5.0",
+        "watchdog>=3.0.0"
     ],
+    extras_require={
+        # EMBEDDING_BACKEND=onnx
+        "onnx": ["onnxruntime>=1.17.0", "optimum[onnxruntime]>=1.23.1"],
+    },
 )
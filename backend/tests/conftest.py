@@ -0,0 +1,100 @@
+import hashlib
+import os
+import sys
+import numpy as np
+import pytest
+
+# Add parent directory to path to import app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import core.embeddings
+import services.answer_cache
+import services.jobs
+from core.config import settings
+from services.embedding_store import close_embedding_store
+from services.lexical_index import close_lexical_index
+from services.usage_counter import stop_usage_flusher
+
+MODEL_DIMENSION = 384  # all-MiniLM-L6-v2
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "requires_model: runs against the real embedding model, skipped when it is not cached locally")
+
+def _model_cached():
+    from huggingface_hub import try_to_load_from_cache
+    return isinstance(try_to_load_from_cache(f"sentence-transformers/{core.embeddings.MODEL_NAME}", "config.json"), str)
+
+class HashEmbeddingModel:
+    """Stand-in for the SentenceTransformer with deterministic, hash-seeded unit vectors
+    
+    Equal texts get equal embeddings and different texts near-orthogonal ones,
+    so tests run without loading the model or downloading it from the Hub.
+    """
+    
+    def get_sentence_embedding_dimension(self):
+        return MODEL_DIMENSION
+    
+    def _embed(self, text):
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+        vector = np.random.default_rng(seed).standard_normal(MODEL_DIMENSION).astype(np.float32)
+        return vector / np.linalg.norm(vector)
+    
+    def encode(self, sentences, batch_size=32, convert_to_numpy=True, **kwargs):
+        if isinstance(sentences, str):
+            return self._embed(sentences)
+        return np.array([self._embed(text) for text in sentences], dtype=np.float32).reshape(len(sentences), MODEL_DIMENSION)
+    
+    def start_multi_process_pool(self, target_devices=None):
+        return {}
+    
+    @staticmethod
+    def stop_multi_process_pool(pool):
+        pass
+    
+    def encode_multi_process(self, sentences, pool, batch_size=32, chunk_size=None, **kwargs):
+        return self.encode(list(sentences), batch_size=batch_size)
+
+@pytest.fixture(autouse=True)
+def embedding_model(request, monkeypatch):
+    """Replace the embedding model with HashEmbeddingModel unless the test is marked requires_model"""
+    if request.node.get_closest_marker("requires_model"):
+        if core.embeddings.model is None and not _model_cached():
+            pytest.skip(f"{core.embeddings.MODEL_NAME} is not in the local Hugging Face cache")
+        return
+    monkeypatch.setattr(core.embeddings, "model", HashEmbeddingModel())
+    monkeypatch.setattr(core.embeddings, "_pool", None)
+
+def _close_state():
+    stop_usage_flusher()
+    close_lexical_index()
+    close_embedding_store()
+
+@pytest.fixture(autouse=True)
+def isolated_state(monkeypatch, tmp_path):
+    """Keep every SQLite file and spool directory the app writes inside tmp_path
+    
+    Without this, tests reaching the usage journal, lexical index, answer cache
+    or job queue under default settings leave their files in backend/ and the
+    next run starts from that state.
+    """
+    _close_state()
+    state_dir = tmp_path / "state"
+    state_dir.mkdir()
+    
+    monkeypatch.setattr(settings, "usage_journal_path", str(state_dir / "usage_counts.sqlite3"))
+    monkeypatch.setattr(settings, "lexical_index_path", str(state_dir / "lexical_index.sqlite3"))
+    monkeypatch.setattr(settings, "answer_cache_path", str(state_dir / "answer_cache.sqlite3"))
+    monkeypatch.setattr(settings, "embedding_store_path", str(state_dir / "embedding_store.sqlite3"))
+    monkeypatch.setattr(settings, "watch_processed_log_path", str(state_dir / "watch_processed.sqlite3"))
+    monkeypatch.setattr(settings, "ingest_jobs_db_path", str(state_dir / "ingestion_jobs.sqlite3"))
+    monkeypatch.setattr(settings, "ingest_spool_dir", str(state_dir / "ingestion_spool"))
+    monkeypatch.setattr(services.jobs, "_initialized", False)
+    
+    # The process-wide answer caches are built at import time and connect on first use
+    for cache in (services.answer_cache.answer_cache, services.answer_cache.semantic_answer_cache):
+        monkeypatch.setattr(cache, "path", settings.answer_cache_path)
+        monkeypatch.setattr(cache, "_initialized", False)
+    monkeypatch.setattr(services.answer_cache.semantic_answer_cache, "_entries", None)
+    
+    yield
+    _close_state()
@@ -0,0 +1,119 @@
+import os
+import sys
+from fastapi.testclient import TestClient
+
+# Add parent directory to path to import app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import api.qa
+import api.search
+from core.config import settings
+from services.answer_cache import AnswerCache, SemanticAnswerCache
+from main import app
+
+MATCH = {
+    "id": "doc_01",
+    "score": 0.9,
+    "metadata": {
+        "id": "doc_01", "source_doc_id": "doc", "chunk_index": 1,
+        "section_heading": "Intro", "journal": "J", "publish_year": 2020,
+        "usage_count": 0, "link": "", "text": "Legumes fix nitrogen."
+    }
+}
+
+def test_answer_cache_key_eviction_and_ttl(tmp_path):
+    """Keys depend on the chunk set and prompt version; old and excess entries are dropped"""
+    now = [1000.0]
+    cache = AnswerCache(str(tmp_path / "answers.sqlite3"), max_entries=2, ttl_seconds=60, clock=lambda: now[0])
+    chunks = [("a", "text a"), ("b", "text b")]
+    
+    key = AnswerCache.make_key("What is  Mucuna?", chunks, "gpt-4", "1")
+    assert key == AnswerCache.make_key("what is mucuna?", chunks, "gpt-4", "1")
+    assert key != AnswerCache.make_key("what is mucuna?", chunks[::-1], "gpt-4", "1")
+    assert key != AnswerCache.make_key("what is mucuna?", [("a", "edited"), ("b", "text b")], "gpt-4", "1")
+    assert key != AnswerCache.make_key("what is mucuna?", chunks, "gpt-4", "2")
+    
+    cache.set("k1", "one")
+    now[0] += 1
+    cache.set("k2", "two")
+    now[0] += 1
+    assert cache.get("k1") == "one"  # k1 becomes most recently used
+    now[0] += 1
+    cache.set("k3", "three")
+    assert cache.get("k2") is None
+    assert cache.get("k1") == "one"
+    
+    now[0] += 61
+    assert cache.get("k3") is None
+    assert cache.stats()["hits"] == 2
+
+def test_semantic_cache_requires_similar_question_and_chunks(tmp_path):
+    """Near-duplicate questions reuse answers only while their evidence overlaps"""
+    path = str(tmp_path / "answers.sqlite3")
+    cache = SemanticAnswerCache(path, threshold=0.9, min_overlap=0.5)
+    cache.add("legumes soil fertility", [1.0, 0.0, 0.0], ["a", "b", "c"], "They fix nitrogen.", 2.5)
+    
+    close = [0.95, 0.31, 0.0]
+    assert cache.lookup("how do legumes improve soil?", close, ["a", "b", "d"]) == "They fix nitrogen."
+    assert cache.lookup("how do legumes improve soil?", close, ["x", "y", "c"]) is None
+    assert cache.lookup("what is crop rotation?", [0.0, 1.0, 0.0], ["a", "b", "c"]) is None
+    
+    stats = cache.stats()
+    assert stats["hits"] == 1 and stats["lookups"] == 3
+    assert stats["latency_saved_seconds"] == 2.5
+    audit = cache.audit_log()
+    assert audit[0]["question"] == "how do legumes improve soil?"
+    assert audit[0]["matched_question"] == "legumes soil fertility"
+    
+    # The index is reloaded from disk by a fresh instance
+    assert SemanticAnswerCache(path, threshold=0.9, min_overlap=0.5).lookup("q", close, ["a", "b", "c"]) == "They fix nitrogen."
+
+def test_question_answer_reports_cache_hit(monkeypatch, tmp_path):
+    """A repeated question over the same chunks is answered from the cache"""
+    calls = []
+    
+    def fake_query_vectors(query_vector, top_k=10, include_metadata=True, **kwargs):
+        return {"matches": [dict(MATCH, metadata=dict(MATCH["metadata"]))]}
+    
+    async def fake_generate_answer(question, context):
+        calls.append(question)
+        return "Legumes fix nitrogen."
+    
+    monkeypatch.setattr(api.search, "query_vectors", fake_query_vectors)
+    monkeypatch.setattr(api.qa, "generate_answer", fake_generate_answer)
+    monkeypatch.setattr(api.qa, "answer_cache", AnswerCache(str(tmp_path / "answers.sqlite3")))
+    monkeypatch.setattr(api.qa, "semantic_answer_cache", SemanticAnswerCache(str(tmp_path / "answers.sqlite3")))
+    
+    client = TestClient(app)
+    first = client.post("/api/question_answer", json={"question": "Why grow legumes?"})
+    second = client.post("/api/question_answer", json={"question": "why grow  legumes?"})
+    
+    assert first.headers["X-Answer-Cache"] == "miss"
+    assert second.headers["X-Answer-Cache"] == "hit"
+    assert second.json() == first.json()
+    assert len(calls) == 1
+
+def test_lexical_question_skips_semantic_cache(monkeypatch, tmp_path):
+    """Lexical questions never embed the question, even with the semantic cache enabled"""
+    async def no_embedding(text):
+        raise AssertionError("lexical question answering must not embed the question")
+    
+    async def fake_generate_answer(question, context):
+        return "Legumes fix nitrogen."
+    
+    def fake_lexical_query(query, top_k=10, filter=None):
+        return {"matches": [dict(MATCH, metadata=dict(MATCH["metadata"]))]}
+    
+    monkeypatch.setattr(settings, "semantic_cache_enabled", True)
+    monkeypatch.setattr(api.search, "lexical_query", fake_lexical_query)
+    monkeypatch.setattr(api.search, "get_query_embedding_async", no_embedding)
+    monkeypatch.setattr(api.qa, "get_query_embedding_async", no_embedding)
+    monkeypatch.setattr(api.qa, "generate_answer", fake_generate_answer)
+    monkeypatch.setattr(api.qa, "answer_cache", AnswerCache(str(tmp_path / "answers.sqlite3")))
+    monkeypatch.setattr(api.qa, "semantic_answer_cache", SemanticAnswerCache(str(tmp_path / "answers.sqlite3")))
+    
+    client = TestClient(app)
+    for expected in ("miss", "hit"):
+        response = client.post("/api/question_answer", json={"question": "Why grow legumes?", "mode": "lexical"})
+        assert response.status_code == 200
+        assert response.headers["X-Answer-Cache"] == expected
@@ -0,0 +1,44 @@
+import os
+import sys
+from fastapi.testclient import TestClient
+
+# Add parent directory to path to import app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import api.search
+import core.embeddings
+from main import app
+
+def test_batch_similarity_search_preserves_order_and_isolates_errors(monkeypatch):
+    """Queries are embedded in one batch and a failing query does not fail the others"""
+    encode_calls = []
+    original_generate_embeddings = core.embeddings.generate_embeddings
+    
+    def counting_generate_embeddings(texts, *args, **kwargs):
+        encode_calls.append(list(texts))
+        return original_generate_embeddings(texts, *args, **kwargs)
+    
+    def fake_query_vectors(query_vector, top_k=10, include_metadata=True, **kwargs):
+        if top_k == 3:
+            raise RuntimeError("index unavailable")
+        return {"matches": [{
+            "id": f"doc_{top_k}",
+            "score": 0.9,
+            "metadata": {"id": f"doc_{top_k}", "source_doc_id": "doc", "text": "Legumes fix nitrogen."}
+        }]}
+    
+    monkeypatch.setattr(core.embeddings, "generate_embeddings", counting_generate_embeddings)
+    monkeypatch.setattr(api.search, "query_vectors", fake_query_vectors)
+    
+    client = TestClient(app)
+    response = client.post("/api/similarity_search/batch", json={"queries": [
+        {"query": "batch query one", "k": 1},
+        {"query": "batch query two", "k": 3},
+        {"query": "batch query three", "k": 2},
+    ]})
+    
+    assert response.status_code == 200
+    items = response.json()["results"]
+    assert [item["results"][0]["id"] if item["results"] else None for item in items] == ["doc_1", None, "doc_2"]
+    assert "index unavailable" in items[1]["error"]
+    assert encode_calls == [["batch query one", "batch query two", "batch query three"]]
@@ -0,0 +1,55 @@
+import asyncio
+import os
+import sys
+import time
+import httpx
+
+# Add parent directory to path to import app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import api.qa
+import api.search
+from core.config import settings
+from main import app
+
+MATCH = {
+    "id": "doc_01",
+    "score": 0.9,
+    "metadata": {
+        "id": "doc_01", "source_doc_id": "doc", "chunk_index": 1,
+        "section_heading": "Intro", "journal": "J", "publish_year": 2020,
+        "usage_count": 0, "link": "", "text": "Legumes fix nitrogen."
+    }
+}
+
+def test_concurrent_question_answer_requests_overlap(monkeypatch):
+    """Blocking vector queries and LLM calls must not serialize concurrent requests"""
+    def slow_query_vectors(query_vector, top_k=10, include_metadata=True, **kwargs):
+        time.sleep(0.2)
+        return {"matches": [dict(MATCH, metadata=dict(MATCH["metadata"]))]}
+    
+    async def slow_generate_answer(question, context):
+        await asyncio.sleep(0.3)
+        return "Legumes fix nitrogen."
+    
+    monkeypatch.setattr(api.search, "query_vectors", slow_query_vectors)
+    monkeypatch.setattr(api.qa, "generate_answer", slow_generate_answer)
+    monkeypatch.setattr(settings, "answer_cache_enabled", False)
+    monkeypatch.setattr(settings, "semantic_cache_enabled", False)
+    
+    async def run(concurrency):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            responses = await asyncio.gather(*(
+                client.post("/api/question_answer", json={"question": f"question {i}"})
+                for i in range(concurrency)
+            ))
+        return [response.status_code for response in responses]
+    
+    start = time.perf_counter()
+    statuses = asyncio.run(run(8))
+    elapsed = time.perf_counter() - start
+    
+    assert statuses == [200] * 8
+    # Serialized, 8 requests would take 8 * 0.5s = 4s
+    assert elapsed < 2.0
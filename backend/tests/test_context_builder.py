@@ -0,0 +1,50 @@
+import os
+import sys
+
+# Add parent directory to path to import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.chunks import ChunkMetadata
+from models.search import SimilaritySearchResult
+from services.context_builder import build_context, count_tokens, format_chunk
+
+def make_result(chunk_id, doc, index, score, text):
+    metadata = ChunkMetadata(
+        id=chunk_id, source_doc_id=doc, chunk_index=index, section_heading=f"Section {index}",
+        journal="J", publish_year=2020, usage_count=0, attributes={}, link=f"https://example.com/{doc}"
+    )
+    return SimilaritySearchResult(id=chunk_id, score=score, metadata=metadata, text=text)
+
+def test_build_context_merges_dedupes_and_respects_budget():
+    """Adjacent chunks merge, near-duplicates are dropped and citations are per document"""
+    results = [
+        make_result("a1", "doc_a", 1, 0.9, "Velvet bean fixes nitrogen in tropical soils."),
+        make_result("a2", "doc_a", 2, 0.8, "It also suppresses weeds between maize rows."),
+        make_result("b1", "doc_b", 5, 0.7, "Velvet bean fixes nitrogen in tropical soils!"),
+        make_result("c1", "doc_c", 1, 0.6, "Cowpea is drought tolerant."),
+    ]
+    
+    context, citations, chunks, metrics = build_context(results, token_budget=10_000)
+    
+    assert context.count("CHUNK ") == 2
+    assert "Velvet bean fixes nitrogen in tropical soils.\nIt also suppresses weeds" in context
+    assert "SECTION: Section 1 / Section 2" in context
+    assert [chunk_id for chunk_id, _ in chunks] == ["a1", "a2", "c1"]
+    assert [citation.source_doc_id for citation in citations] == ["doc_a", "doc_c"]
+    assert metrics["chunks_dropped_duplicate"] == 1
+    assert metrics["tokens_saved"] > 0
+    
+    # A budget with room for a1 and the shorter c1 skips a2, which does not fit
+    first = format_chunk(1, results[0].text, "doc_a", "Section 1")
+    second = format_chunk(2, results[3].text, "doc_c", "Section 1")
+    budget = count_tokens(first) + count_tokens(second)
+    context, citations, chunks, metrics = build_context(results, token_budget=budget)
+    assert [chunk_id for chunk_id, _ in chunks] == ["a1", "c1"]
+    assert context == first + second
+    assert metrics["context_tokens"] == count_tokens(first + second) <= budget
+    assert metrics["chunks_dropped_budget"] == 1
+    
+    # Room for a1 alone leaves out everything after it
+    context, citations, chunks, metrics = build_context(results, token_budget=count_tokens(first))
+    assert context == first
+    assert metrics["chunks_dropped_budget"] == 2
@@ -0,0 +1,141 @@
+import asyncio
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pytest
+
+# Add parent directory to path to import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.embedding_server import EmbeddingServer, RemoteEmbeddingModel
+from core.embeddings import generate_embedding, generate_embeddings, get_model_dimension, load_model, QueryEmbeddingBatcher, QueryEmbeddingCache
+
+@pytest.mark.requires_model
+def test_generate_embeddings_preserves_input_order():
+    """Batched embeddings come back in input order even though they are length-sorted"""
+    texts = [
+        "Velvet bean improves soil fertility through nitrogen fixation and biomass.",
+        "Mucuna",
+        "Cover crops reduce erosion.",
+    ]
+    
+    embeddings = generate_embeddings(texts, batch_size=2, num_workers=0)
+    
+    assert embeddings.shape == (len(texts), get_model_dimension())
+    for text, embedding in zip(texts, embeddings):
+        assert np.allclose(embedding, generate_embedding(text), atol=1e-5)
+
+def test_generate_embeddings_empty_input():
+    """An empty batch returns an empty array with the model dimension"""
+    embeddings = generate_embeddings([])
+    assert embeddings.shape == (0, get_model_dimension())
+
+def test_query_cache_normalizes_and_evicts_least_recently_used():
+    """Queries differing only in case/whitespace share an entry; the LRU entry is evicted"""
+    cache = QueryEmbeddingCache(max_size=2)
+    cache.set("How do legumes improve soil?", [1.0])
+    cache.set("cover crops", [2.0])
+    
+    assert cache.get("  how do LEGUMES   improve soil? ") == [1.0]
+    cache.set("mulch", [3.0])
+    
+    assert cache.get("cover crops") is None
+    assert cache.get("how do legumes improve soil?") == [1.0]
+    assert cache.stats()["hits"] == 2
+    assert cache.stats()["misses"] == 1
+
+def test_query_cache_ttl_and_shared_disk(tmp_path):
+    """Entries expire after the TTL and are shared through the disk tier"""
+    now = [1000.0]
+    path = str(tmp_path / "query_cache.sqlite3")
+    writer = QueryEmbeddingCache(ttl_seconds=60, disk_path=path, clock=lambda: now[0])
+    reader = QueryEmbeddingCache(ttl_seconds=60, disk_path=path, clock=lambda: now[0])
+    
+    writer.set("nitrogen fixation", [0.5, 0.25])
+    assert reader.get("nitrogen fixation") == [0.5, 0.25]
+    assert reader.stats()["disk_hits"] == 1
+    
+    # Another model or backend (e.g. int8 ONNX) never sees these entries
+    quantized = QueryEmbeddingCache(ttl_seconds=60, disk_path=path, model_name="all-MiniLM-L6-v2:onnx-qint8-avx2", clock=lambda: now[0])
+    assert quantized.get("nitrogen fixation") is None
+    
+    now[0] += 61
+    assert writer.get("nitrogen fixation") is None
+    assert reader.get("nitrogen fixation") is None
+
+def test_load_model_rejects_unknown_backend():
+    """Backend selection fails loudly instead of silently falling back"""
+    with pytest.raises(ValueError):
+        load_model("tensorrt")
+
+def test_query_batcher_coalesces_concurrent_queries():
+    """Queries arriving while a batch encodes share one encode call, capped at the max batch size"""
+    calls = []
+    def encode(texts):
+        calls.append(list(texts))
+        return [[float(len(text))] for text in texts]
+    
+    batcher = QueryEmbeddingBatcher(encode=encode, window_ms=20, max_batch_size=4)
+    async def run():
+        return await asyncio.gather(*(batcher.embed("q" * i) for i in range(1, 8)))
+    
+    embeddings = asyncio.run(run())
+    
+    # The first query finds the batcher idle and is encoded on its own
+    assert embeddings == [[float(i)] for i in range(1, 8)]
+    assert [len(batch) for batch in calls] == [1, 4, 2]
+    assert batcher.stats()["mean_batch_size"] == 7 / 3
+
+def test_query_batcher_propagates_encode_errors():
+    """Every caller in a failed batch sees the error"""
+    def encode(texts):
+        raise RuntimeError("model unavailable")
+    
+    batcher = QueryEmbeddingBatcher(encode=encode, window_ms=1, max_batch_size=8)
+    async def run():
+        return await asyncio.gather(batcher.embed("a"), batcher.embed("b"), return_exceptions=True)
+    
+    assert [str(result) for result in asyncio.run(run())] == ["model unavailable"] * 2
+
+class RecordingModel:
+    """Deterministic model that records the size of every encode call"""
+    
+    def __init__(self):
+        self.calls = []
+    
+    def get_sentence_embedding_dimension(self):
+        return 3
+    
+    def encode(self, sentences, batch_size=32, convert_to_numpy=True, **kwargs):
+        self.calls.append(len(sentences))
+        if "fail" in sentences:
+            raise ValueError("cannot encode")
+        return np.array([[len(text), i, 1.0] for i, text in enumerate(sentences)], dtype=np.float32)
+
+def test_embedding_server_serves_concurrent_clients(tmp_path):
+    """Workers get their own embeddings back from the shared server, and errors keep the connection usable"""
+    model = RecordingModel()
+    server = EmbeddingServer(str(tmp_path / "embeddings.sock"), model)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        client = RemoteEmbeddingModel(server.server_address, timeout=5)
+        assert client.get_sentence_embedding_dimension() == 3
+        assert client.encode("abcd")[0] == 4.0
+        
+        texts = [["x" * i] * 5 for i in range(1, 9)]
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(client.encode, texts))
+        for batch, embeddings in zip(texts, results):
+            assert embeddings.shape == (5, 3)
+            assert set(embeddings[:, 0]) == {len(batch[0])}
+        
+        with pytest.raises(RuntimeError, match="cannot encode"):
+            client.encode(["fail"])
+        assert client.encode(["ok"]).shape == (1, 3)
+    finally:
+        server.shutdown()
+        server.server_close()
+    
+    assert not os.path.exists(server.server_address)
@@ -0,0 +1,342 @@
+import asyncio
+import json
+import os
+import sys
+import time
+from fastapi.testclient import TestClient
+
+# Add parent directory to path to import app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+import services.embedding_store
+import services.ingestion
+import services.jobs
+from core.config import settings
+from main import app
+from services.ingestion import InvalidChunkError, run_ingestion_pipeline
+from utils.json_stream import JSONRecordParser
+
+def make_chunks(n):
+    return [
+        {
+            "id": f"doc_{i:03d}", "source_doc_id": "doc", "chunk_index": i,
+            "section_heading": "Results", "journal": "Journal of Agronomy",
+            "publish_year": 2021, "usage_count": 0, "attributes": ["legumes"],
+            "link": "https://example.com/doc", "text": f"Chunk {i} about legumes and soil fertility."
+        }
+        for i in range(n)
+    ]
+
+async def aiter(records):
+    for record in records:
+        yield record
+
+@pytest.fixture
+def stored(monkeypatch, tmp_path):
+    """Capture upserted batches and keep the job queue in a temporary directory"""
+    batches = []
+    def store_vectors(vectors):
+        batches.append(vectors)
+        return {"upserted_count": len(vectors), "failed_batches": []}
+    
+    monkeypatch.setattr(services.ingestion, "store_vectors", store_vectors)
+    monkeypatch.setattr(services.ingestion, "get_usage_counts", lambda ids: {})
+    monkeypatch.setattr(settings, "ingest_batch_size", 4)
+    monkeypatch.setattr(settings, "ingest_jobs_db_path", str(tmp_path / "jobs.sqlite3"))
+    monkeypatch.setattr(settings, "ingest_spool_dir", str(tmp_path / "spool"))
+    monkeypatch.setattr(settings, "ingest_job_poll_seconds", 0.05)
+    monkeypatch.setattr(settings, "vector_store_backend", "local")
+    monkeypatch.setattr(settings, "local_vector_store_path", str(tmp_path / "vector_store"))
+    monkeypatch.setattr(settings, "lexical_index_enabled", False)
+    monkeypatch.setattr(settings, "embedding_store_path", str(tmp_path / "embedding_store.sqlite3"))
+    monkeypatch.setattr(services.jobs, "_initialized", False)
+    services.embedding_store.close_embedding_store()
+    yield batches
+    services.embedding_store.close_embedding_store()
+
+def test_parser_handles_arrays_and_ndjson_split_anywhere():
+    """Records come out identical however the document is split into pieces"""
+    chunks = make_chunks(5)
+    for document in (json.dumps(chunks, indent=2), "\n".join(json.dumps(c) for c in chunks)):
+        for step in (1, 7, len(document)):
+            parser = JSONRecordParser()
+            records = []
+            for i in range(0, len(document), step):
+                records += parser.feed(document[i:i + step])
+            records += parser.close()
+            assert records == chunks
+
+def test_parser_rejects_malformed_separators_and_fails_fast():
+    """Missing or doubled separators are errors, and invalid records fail before they complete"""
+    for document in ("[{},,{}]", "[{} {}]", "[{},]", "[,{}]", '{"a": 1}{"b": 2}', '[{"a": 1}] {}'):
+        for step in (1, len(document)):
+            parser = JSONRecordParser()
+            with pytest.raises(ValueError):
+                for i in range(0, len(document), step):
+                    parser.feed(document[i:i + step])
+                parser.close()
+    
+    parser = JSONRecordParser()
+    assert parser.feed('[{"id": "doc_000", "text": "' + "legumes " * 1000) == []
+    with pytest.raises(ValueError, match="unexpected character"):
+        parser.feed('", "chunk_index": one')
+
+def test_pipeline_stores_bounded_batches_in_order(stored):
+    """The pipeline upserts every chunk, batch by batch, in input order"""
+    summary = asyncio.run(run_ingestion_pipeline(aiter(make_chunks(10))))
+    
+    assert summary["chunks_stored"] == 10
+    assert [len(batch) for batch in stored] == [4, 4, 2]
+    assert [v["id"] for batch in stored for v in batch] == [f"doc_{i:03d}" for i in range(10)]
+
+def test_pipeline_invalid_chunks_raise_or_are_skipped(stored):
+    """Invalid chunks fail a strict run but are reported and skipped with skip_invalid"""
+    records = make_chunks(6)
+    records[2] = {"id": "broken", "invalid_field": "value"}
+    
+    with pytest.raises(InvalidChunkError):
+        asyncio.run(run_ingestion_pipeline(aiter([dict(r) for r in records])))
+    
+    summary = asyncio.run(run_ingestion_pipeline(aiter(records), skip_invalid=True))
+    assert summary["chunks_stored"] == 5
+    assert summary["chunks_failed"] == 1
+    assert summary["failed_chunks"][0]["id"] == "broken"
+
+def test_reupload_skips_unchanged_chunks_and_deletes_vanished_ones(stored, monkeypatch):
+    """Only changed chunks are upserted, stored embeddings are reused, and dropped chunks are deleted"""
+    encoded = []
+    deleted = []
+    original_generate_embeddings_async = services.ingestion.generate_embeddings_async
+    
+    async def counting_generate_embeddings_async(texts, *args, **kwargs):
+        encoded.extend(texts)
+        return await original_generate_embeddings_async(texts, *args, **kwargs)
+    
+    monkeypatch.setattr(services.ingestion, "generate_embeddings_async", counting_generate_embeddings_async)
+    monkeypatch.setattr(services.ingestion, "delete_vectors", deleted.extend)
+    monkeypatch.setattr(settings, "ingest_delete_vanished_chunks", True)
+    
+    first = asyncio.run(run_ingestion_pipeline(aiter(make_chunks(10))))
+    assert (first["chunks_embedded"], first["chunks_reused"], first["chunks_skipped"]) == (10, 0, 0)
+    assert len(encoded) == 10
+    
+    records = make_chunks(9)
+    records[1]["journal"] = "Soil Biology"  # metadata change: same text, so the embedding is reused
+    records[2]["text"] = "Revised chunk about legumes."  # text change: encoded again
+    stored.clear()
+    encoded.clear()
+    
+    second = asyncio.run(run_ingestion_pipeline(aiter(records), replace_documents=True))
+    
+    assert [v["id"] for batch in stored for v in batch] == ["doc_001", "doc_002"]
+    assert encoded == ["Revised chunk about legumes."]
+    assert (second["chunks_embedded"], second["chunks_reused"], second["chunks_skipped"]) == (1, 1, 7)
+    assert second["chunks_deleted"] == 1
+    assert deleted == ["doc_009"]
+    
+    third = asyncio.run(run_ingestion_pipeline(aiter(records), replace_documents=True))
+    assert third["chunks_skipped"] == 9
+    assert third["chunks_deleted"] == 0
+
+def test_chunks_are_upserted_again_for_another_vector_store(stored, monkeypatch, tmp_path):
+    """Chunks stored in one index are not skipped for a different index or a new store generation"""
+    chunks = make_chunks(4)
+    asyncio.run(run_ingestion_pipeline(aiter(chunks)))
+    
+    def reupload():
+        # The store id is read when the embedding store opens, as on a restart
+        services.embedding_store.close_embedding_store()
+        return asyncio.run(run_ingestion_pipeline(aiter(chunks)))
+    
+    assert reupload()["chunks_skipped"] == 4
+    
+    monkeypatch.setattr(settings, "local_vector_store_path", str(tmp_path / "other_vector_store"))
+    summary = reupload()
+    assert (summary["chunks_skipped"], summary["chunks_reused"], summary["chunks_embedded"]) == (0, 4, 0)
+    assert reupload()["chunks_skipped"] == 4
+    
+    monkeypatch.setattr(settings, "vector_store_generation", "2")
+    assert reupload()["chunks_stored"] == 4
+
+def test_reupserted_chunks_keep_their_usage_counts(stored, monkeypatch):
+    """Changed chunks keep the usage_count accumulated in the vector store instead of the uploaded one"""
+    requested = []
+    def get_usage_counts(ids):
+        requested.extend(ids)
+        return {"doc_001": 7, "doc_002": 3}
+    
+    chunks = make_chunks(3)
+    asyncio.run(run_ingestion_pipeline(aiter(chunks)))
+    monkeypatch.setattr(services.ingestion, "get_usage_counts", get_usage_counts)
+    
+    chunks[1]["journal"] = "Soil Biology"
+    stored.clear()
+    asyncio.run(run_ingestion_pipeline(aiter(chunks + make_chunks(5)[3:])))
+    
+    # Only chunks stored before are looked up; new ones keep the uploaded count
+    assert requested == ["doc_001"]
+    assert {v["id"]: v["metadata"]["usage_count"] for batch in stored for v in batch} == {"doc_001": 7, "doc_003": 0, "doc_004": 0}
+
+def test_usage_counts_are_probed_per_document_without_the_embedding_store(stored, monkeypatch):
+    """Without fingerprints, one chunk per document is looked up, and only stored documents fetch the rest"""
+    requested = []
+    def get_usage_counts(ids):
+        requested.append(sorted(ids))
+        return {chunk_id: 5 for chunk_id in ids if chunk_id.startswith("old_")}
+    
+    monkeypatch.setattr(settings, "embedding_store_enabled", False)
+    monkeypatch.setattr(services.ingestion, "get_usage_counts", get_usage_counts)
+    old = [dict(chunk, id=f"old_{i}", source_doc_id="old") for i, chunk in enumerate(make_chunks(3))]
+    new = [dict(chunk, id=f"new_{i}", source_doc_id="new") for i, chunk in enumerate(make_chunks(5))]
+    
+    asyncio.run(run_ingestion_pipeline(aiter(old + new)))
+    
+    # One probe per document, then the chunks of the stored one; the later batch of new chunks looks up nothing
+    assert requested == [["new_0", "old_0"], ["old_0", "old_1", "old_2"]]
+    assert {v["id"]: v["metadata"]["usage_count"] for batch in stored for v in batch} == {
+        **{f"old_{i}": 5 for i in range(3)}, **{f"new_{i}": 0 for i in range(5)}
+    }
+
+def test_document_split_across_uploads_keeps_earlier_chunks(stored, monkeypatch):
+    """Chunks of a document sent in several uploads are only deleted by an upload replacing it"""
+    deleted = []
+    monkeypatch.setattr(services.ingestion, "delete_vectors", deleted.extend)
+    chunks = make_chunks(4)
+    
+    asyncio.run(run_ingestion_pipeline(aiter(chunks[:2])))
+    second = asyncio.run(run_ingestion_pipeline(aiter(chunks[2:]), replace_documents=True))
+    assert second["chunks_deleted"] == 0
+    
+    monkeypatch.setattr(settings, "ingest_delete_vanished_chunks", True)
+    third = asyncio.run(run_ingestion_pipeline(aiter(chunks[:2])))
+    assert third["chunks_deleted"] == 0
+    assert deleted == []
+    
+    fourth = asyncio.run(run_ingestion_pipeline(aiter(chunks[:2]), replace_documents=True))
+    assert fourth["chunks_deleted"] == 2
+    assert deleted == ["doc_002", "doc_003"]
+
+def test_upload_job_runs_in_background_and_reports_progress(stored):
+    """Uploads return a job id immediately and the job status reports the outcome"""
+    records = make_chunks(9) + [{"id": "broken", "invalid_field": "value"}]
+    payload = "\n".join(json.dumps(record) for record in records)
+    
+    with TestClient(app) as client:
+        response = client.put(
+            "/api/upload",
+            files={"file": ("chunks.ndjson", payload, "application/x-ndjson")},
+            data={"schema_version": "1.0"}
+        )
+        assert response.status_code == 202
+        job_id = response.json()["job_id"]
+        
+        deadline = time.time() + 10
+        while time.time() < deadline:
+            status = client.get(f"/api/upload/{job_id}").json()
+            if status["status"] in ("completed", "failed"):
+                break
+            time.sleep(0.05)
+    
+    assert status["status"] == "completed"
+    assert status["progress"] == 1.0
+    assert status["chunks_stored"] == 9
+    assert status["chunks_failed"] == 1
+    assert status["chunks_embedded"] == 9
+    assert status["failed_chunks"][0]["id"] == "broken"
+
+def test_interrupted_job_resumes_after_finished_records(stored, tmp_path):
+    """A job whose worker died is reclaimed after its lease and skips finished records"""
+    spool = tmp_path / "upload.json"
+    spool.write_text(json.dumps(make_chunks(10)))
+    job = services.jobs.enqueue_job(str(spool))
+    
+    # Simulate a crash after the first two batches were stored
+    services.jobs._update_job(job["id"], status="running", records_done=8, chunks_stored=8)
+    services.jobs._update_job(job["id"], updated_at=0)
+    
+    claimed = services.jobs._claim_next_job()
+    assert claimed["id"] == job["id"]
+    asyncio.run(services.jobs._process_job(claimed))
+    
+    finished = services.jobs.get_job(job["id"])
+    assert finished["status"] == "completed"
+    assert finished["chunks_stored"] == 10
+    assert [v["id"] for batch in stored for v in batch] == ["doc_008", "doc_009"]
+
+def test_running_jobs_keep_their_lease_and_stop_when_reclaimed(stored, monkeypatch, tmp_path):
+    """A batch outlasting the lease keeps the job, and a run whose job was reclaimed stops writing"""
+    monkeypatch.setattr(settings, "ingest_job_lease_seconds", 0.3)
+    original_pipeline = services.jobs.run_ingestion_pipeline
+    spool = tmp_path / "upload.json"
+    spool.write_text(json.dumps(make_chunks(8)))
+    
+    claims = []
+    async def slow_pipeline(records, **kwargs):
+        await asyncio.sleep(0.6)
+        claims.append(services.jobs._claim_next_job())
+        return await original_pipeline(records, **kwargs)
+    
+    monkeypatch.setattr(services.jobs, "run_ingestion_pipeline", slow_pipeline)
+    job = services.jobs.enqueue_job(str(spool))
+    asyncio.run(services.jobs._process_job(services.jobs._claim_next_job()))
+    assert claims == [None]
+    assert services.jobs.get_job(job["id"])["attempts"] == 1
+    assert services.jobs.get_job(job["id"])["status"] == "completed"
+    
+    spool.write_text(json.dumps([dict(chunk, text=chunk["text"] + " Revised.") for chunk in make_chunks(8)]))
+    job = services.jobs.enqueue_job(str(spool))
+    claimed = services.jobs._claim_next_job()
+    async def reclaimed_pipeline(records, **kwargs):
+        # Another worker takes the job over once it looks abandoned
+        services.jobs._update_job(job["id"], run_started_at=claimed["run_started_at"] + 1)
+        return await original_pipeline(records, **kwargs)
+    
+    monkeypatch.setattr(services.jobs, "run_ingestion_pipeline", reclaimed_pipeline)
+    stored.clear()
+    asyncio.run(services.jobs._process_job(claimed))
+    assert len(stored) == 1
+    assert services.jobs.get_job(job["id"])["records_done"] == 0
+    assert spool.exists()
+
+def test_shutdown_requeues_running_jobs_without_using_an_attempt(stored, monkeypatch, tmp_path):
+    """Jobs interrupted by stopping the workers go back on the queue with their attempts unchanged"""
+    started = []
+    async def endless_pipeline(records, **kwargs):
+        started.append(True)
+        await asyncio.sleep(60)
+    
+    monkeypatch.setattr(services.jobs, "run_ingestion_pipeline", endless_pipeline)
+    spool = tmp_path / "upload.json"
+    spool.write_text(json.dumps(make_chunks(2)))
+    job = services.jobs.enqueue_job(str(spool))
+    
+    async def deploy():
+        services.jobs.start_job_workers()
+        while not started:
+            await asyncio.sleep(0.01)
+        await services.jobs.stop_job_workers()
+    
+    for _ in range(settings.ingest_job_max_attempts + 1):
+        started.clear()
+        asyncio.run(deploy())
+        requeued = services.jobs.get_job(job["id"])
+        assert (requeued["status"], requeued["attempts"]) == ("queued", 0)
+    assert spool.exists()
+
+def test_failed_jobs_remove_their_spooled_files(stored, tmp_path):
+    """Spooled files of jobs that failed or ran out of attempts are deleted"""
+    broken = tmp_path / "broken.json"
+    broken.write_text('[{"id": "doc_000"}, {oops}]')
+    job = services.jobs.enqueue_job(str(broken))
+    asyncio.run(services.jobs._process_job(services.jobs._claim_next_job()))
+    assert services.jobs.get_job(job["id"])["status"] == "failed"
+    assert not broken.exists()
+    
+    abandoned = tmp_path / "abandoned.json"
+    abandoned.write_text(json.dumps(make_chunks(2)))
+    job = services.jobs.enqueue_job(str(abandoned))
+    services.jobs._update_job(job["id"], status="running", attempts=settings.ingest_job_max_attempts, updated_at=0)
+    assert services.jobs._claim_next_job() is None
+    assert services.jobs.get_job(job["id"])["status"] == "failed"
+    assert not abandoned.exists()
@@ -0,0 +1,121 @@
+import os
+import sys
+import pytest
+from fastapi.testclient import TestClient
+
+# Add parent directory to path to import app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import api.search
+import services.lexical_index as lexical_index
+from core.config import settings
+from services.lexical_index import LexicalIndex
+from main import app
+
+TEXTS = {
+    "brca": "Mutations in BRCA1 raise breast cancer risk.",
+    "lime": "Agricultural lime (CaCO3) raises soil pH in acidic soils.",
+    "soil": "Soil organic matter improves soil structure and soil water retention.",
+    "doi": "See 10.1234/velvet-bean for the field trial protocol.",
+}
+
+def make_records(texts):
+    return [
+        {"id": chunk_id, "metadata": {"text": text, "source_doc_id": f"{chunk_id}.pdf", "journal": "J"}}
+        for chunk_id, text in texts.items()
+    ]
+
+def test_bm25_ranks_exact_terms_and_survives_reopen(tmp_path):
+    """Exact terms such as gene names, formulas and DOIs find their chunk, across restarts"""
+    path = str(tmp_path / "lexical.sqlite3")
+    index = LexicalIndex(path)
+    index.add(make_records(TEXTS))
+    
+    assert index.query("BRCA1 mutations")["matches"][0]["id"] == "brca"
+    assert index.query("caco3")["matches"][0]["id"] == "lime"
+    assert index.query("10.1234/velvet-bean")["matches"][0]["id"] == "doi"
+    assert [m["id"] for m in index.query("soil")["matches"]][:2] == ["soil", "lime"]
+    assert index.query("nothing matches this")["matches"] == []
+    
+    # Replacing and deleting chunks hides their old postings
+    index.add(make_records({"lime": "Gypsum supplies calcium without changing pH."}))
+    index.delete(["brca"])
+    assert index.query("caco3")["matches"] == []
+    assert index.query("brca1")["matches"] == []
+    index.close()
+    
+    reopened = LexicalIndex(path)
+    assert len(reopened) == 3
+    assert reopened.query("gypsum")["matches"][0]["metadata"]["source_doc_id"] == "lime.pdf"
+    assert reopened.query("brca1")["matches"] == []
+    reopened.add(make_records({"new": "Nitrogen fixation by legumes."}))
+    assert reopened.query("legumes")["matches"][0]["id"] == "new"
+    reopened.close()
+
+def test_indexes_sharing_a_file_see_each_others_writes(tmp_path):
+    """Processes writing one index never reuse each other's documents and query each other's chunks"""
+    path = str(tmp_path / "lexical.sqlite3")
+    first, second = LexicalIndex(path), LexicalIndex(path)
+    first.add(make_records({"brca": TEXTS["brca"]}))
+    second.add(make_records({"lime": TEXTS["lime"]}))
+    first.add(make_records({"soil": TEXTS["soil"]}))
+    
+    assert {m["id"] for m in first.query("brca1 caco3")["matches"]} == {"brca", "lime"}
+    assert second.query("soil structure")["matches"][0]["id"] == "soil"
+    
+    # Replacements and deletions by one process hide the old postings in the other
+    second.add(make_records({"brca": "Gypsum supplies calcium."}))
+    first.delete(["lime"])
+    assert first.query("brca1")["matches"] == []
+    assert first.query("gypsum")["matches"][0]["id"] == "brca"
+    assert second.query("caco3")["matches"] == []
+    assert len(first) == len(second) == 2
+    
+    # A compaction by a newly opened process makes the others reload
+    for i in range(40):
+        second.add(make_records({f"extra_{i}": "Extra chunk about cover crops."}))
+    second.delete([f"extra_{i}" for i in range(40)])
+    third = LexicalIndex(path)
+    assert third._segments == len(third._postings)
+    third.add(make_records({"doi": TEXTS["doi"]}))
+    for index in (first, second, third):
+        assert index.query("cover crops")["matches"] == []
+        assert index.query("10.1234/velvet-bean")["matches"][0]["id"] == "doi"
+        assert len(index) == 3
+        index.close()
+
+@pytest.fixture
+def search_index(monkeypatch, tmp_path):
+    """Serve searches from a lexical index populated in a temporary directory"""
+    monkeypatch.setattr(settings, "lexical_index_path", str(tmp_path / "lexical.sqlite3"))
+    lexical_index.close_lexical_index()
+    lexical_index.index_chunks(make_records(TEXTS))
+    yield
+    lexical_index.close_lexical_index()
+
+def test_lexical_and_hybrid_search_modes(monkeypatch, search_index):
+    """Lexical mode skips the embedding model; hybrid fuses both result lists"""
+    async def no_embedding(text):
+        raise AssertionError("lexical search must not embed the query")
+    
+    async def fake_embedding(text):
+        return [0.0] * 384
+    
+    def fake_query_vectors(query_vector, top_k=10, include_metadata=True, **kwargs):
+        return {"matches": [
+            {"id": "soil", "score": 0.9, "metadata": {"id": "soil", "source_doc_id": "soil.pdf", "text": TEXTS["soil"]}},
+            {"id": "lime", "score": 0.8, "metadata": {"id": "lime", "source_doc_id": "lime.pdf", "text": TEXTS["lime"]}},
+        ]}
+    
+    client = TestClient(app)
+    monkeypatch.setattr(api.search, "get_query_embedding_async", no_embedding)
+    response = client.post("/api/similarity_search", json={"query": "CaCO3 lime", "mode": "lexical"})
+    assert response.status_code == 200
+    assert response.json()["results"][0]["id"] == "lime"
+    
+    monkeypatch.setattr(api.search, "get_query_embedding_async", fake_embedding)
+    monkeypatch.setattr(api.search, "query_vectors", fake_query_vectors)
+    response = client.post("/api/similarity_search", json={"query": "CaCO3 lime", "mode": "hybrid", "k": 2})
+    assert response.status_code == 200
+    # "lime" is ranked by both retrievers, so it beats the vector-only top hit
+    assert [result["id"] for result in response.json()["results"]] == ["lime", "soil"]
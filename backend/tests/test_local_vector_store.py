@@ -0,0 +1,174 @@
+import os
+import sys
+import numpy as np
+
+# Add parent directory to path to import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.search import SearchFilters
+from services.local_vector_store import LocalVectorStore
+from services.vector_store import build_metadata_filter
+
+DIMENSION = 8
+
+def make_vectors(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return [
+        {"id": f"chunk_{i}", "values": rng.standard_normal(DIMENSION).tolist(), "metadata": {"chunk_index": i}}
+        for i in range(n)
+    ]
+
+def test_query_returns_exact_cosine_top_k(tmp_path):
+    """Top-k matches the brute-force cosine ranking, including metadata"""
+    store = LocalVectorStore(str(tmp_path), DIMENSION, initial_capacity=4)
+    vectors = make_vectors(50)
+    assert store.upsert(vectors)["upserted_count"] == 50
+    
+    query = vectors[7]["values"]
+    matrix = np.array([v["values"] for v in vectors])
+    expected = np.argsort(-(matrix @ query / np.linalg.norm(matrix, axis=1)))[:5]
+    
+    matches = store.query(query, top_k=5)["matches"]
+    assert [m["id"] for m in matches] == [f"chunk_{i}" for i in expected]
+    assert matches[0]["id"] == "chunk_7"
+    assert abs(matches[0]["score"] - 1.0) < 1e-5
+    assert matches[0]["metadata"] == {"chunk_index": 7}
+    store.close()
+
+def test_upsert_overwrites_delete_and_reopen(tmp_path):
+    """Upserts replace existing ids, deletes hide rows, and state survives reopening"""
+    store = LocalVectorStore(str(tmp_path), DIMENSION)
+    vectors = make_vectors(10)
+    store.upsert(vectors)
+    store.upsert([dict(vectors[3], metadata={"chunk_index": 99})])
+    store.delete(["chunk_5", "missing"])
+    assert store.stats()["total_vector_count"] == 9
+    store.close()
+    
+    reopened = LocalVectorStore(str(tmp_path), DIMENSION)
+    assert reopened.stats() == {"dimension": DIMENSION, "total_vector_count": 9}
+    assert reopened.query(vectors[3]["values"], top_k=1)["matches"][0]["metadata"] == {"chunk_index": 99}
+    ids = [m["id"] for m in reopened.query(vectors[5]["values"], top_k=10)["matches"]]
+    assert "chunk_5" not in ids and len(ids) == 9
+    reopened.close()
+
+def test_ivf_index_trains_incrementally_and_persists(tmp_path):
+    """The IVF index trains once enough vectors arrive, keeps indexing inserts and reloads from disk"""
+    store = LocalVectorStore(str(tmp_path), DIMENSION, index_type="ivf", nlist=4, nprobe=1)
+    vectors = make_vectors(300)
+    store.upsert(vectors[:200])
+    assert store._ivf.trained
+    store.upsert(vectors[200:])
+    
+    flat = np.array([v["values"] for v in vectors])
+    query = vectors[250]["values"]
+    expected = np.argsort(-(flat @ query / np.linalg.norm(flat, axis=1)))[:5]
+    
+    # Scanning every list is exact; a single list still finds the query's own vector
+    matches = store.query(query, top_k=5, nprobe=4)["matches"]
+    assert [m["id"] for m in matches] == [f"chunk_{i}" for i in expected]
+    assert store.query(query, top_k=1)["matches"][0]["id"] == "chunk_250"
+    store.close()
+    
+    reopened = LocalVectorStore(str(tmp_path), DIMENSION, index_type="ivf", nlist=4)
+    assert reopened._ivf.trained
+    assert [m["id"] for m in reopened.query(query, top_k=5, nprobe=4)["matches"]] == [m["id"] for m in matches]
+    reopened.close()
+
+def test_ivf_upsert_moves_rows_between_lists(tmp_path):
+    """A re-upserted vector assigned to another list is only found through its new list"""
+    store = LocalVectorStore(str(tmp_path), DIMENSION, index_type="ivf", nlist=4, nprobe=4)
+    vectors = make_vectors(300)
+    store.upsert(vectors)
+    store.query(vectors[0]["values"], top_k=5)
+    
+    moved = [-value for value in vectors[0]["values"]]
+    store.upsert([dict(vectors[0], values=moved)])
+    
+    ids = [m["id"] for m in store.query(moved, top_k=300)["matches"]]
+    assert ids[0] == "chunk_0"
+    assert len(ids) == len(set(ids)) == 300
+    store.close()
+
+def test_query_applies_metadata_filter_and_min_score(tmp_path):
+    """Typed filters are pushed into the query so k counts only matching chunks"""
+    store = LocalVectorStore(str(tmp_path), DIMENSION)
+    vectors = make_vectors(40)
+    for i, vector in enumerate(vectors):
+        vector["metadata"] = {
+            "journal": "Soil Science" if i % 2 else "Agronomy",
+            "publish_year": 2000 + i % 10,
+            "doi": f"10.1/{i}",
+            "attribute_keys": ["region", "crop"] if i % 4 == 1 else ["region"],
+        }
+    store.upsert(vectors)
+    
+    query = vectors[0]["values"]
+    filters = SearchFilters(journal=["Soil Science"], publish_year_min=2003, publish_year_max=2007, attribute_keys=["crop"])
+    matches = store.query(query, top_k=5, filter=build_metadata_filter(filters))["matches"]
+    expected = [i for i in range(40) if i % 2 and 3 <= i % 10 <= 7 and i % 4 == 1]
+    assert len(matches) == min(5, len(expected))
+    assert all(int(m["id"].split("_")[1]) in expected for m in matches)
+    
+    matches = store.query(query, top_k=5, filter=build_metadata_filter(SearchFilters(doi="10.1/12")))["matches"]
+    assert [m["id"] for m in matches] == ["chunk_12"]
+    
+    matches = store.query(query, top_k=40, min_score=0.5)["matches"]
+    assert matches and all(m["score"] >= 0.5 for m in matches)
+    assert build_metadata_filter(SearchFilters()) is None
+    store.close()
+
+def test_increment_metadata_adds_to_existing_counts(tmp_path):
+    """Increments start missing fields at zero, add to existing values and skip unknown ids"""
+    store = LocalVectorStore(str(tmp_path), DIMENSION)
+    vectors = make_vectors(3)
+    store.upsert([dict(vectors[0], metadata={"usage_count": 4}), vectors[1]])
+    store.increment_metadata("usage_count", {"chunk_0": 2, "chunk_1": 1, "missing": 5})
+    
+    matches = {m["id"]: m["metadata"] for m in store.query(vectors[0]["values"], top_k=2)["matches"]}
+    assert matches["chunk_0"] == {"usage_count": 6}
+    assert matches["chunk_1"] == {"chunk_index": 1, "usage_count": 1}
+    assert store.fetch_metadata(["chunk_0", "chunk_2", "missing"]) == {"chunk_0": {"usage_count": 6}}
+    store.close()
+
+def test_processes_sharing_a_store_allocate_distinct_rows(tmp_path):
+    """Stores opened on one directory never reuse each other's rows and see each other's writes"""
+    first = LocalVectorStore(str(tmp_path), DIMENSION, initial_capacity=2)
+    second = LocalVectorStore(str(tmp_path), DIMENSION, initial_capacity=2)
+    vectors = make_vectors(12)
+    first.upsert(vectors[:3])
+    second.upsert(vectors[3:8])
+    first.upsert(vectors[8:])
+    
+    for store in (first, second):
+        assert store.stats()["total_vector_count"] == 12
+        for vector in vectors:
+            assert store.query(vector["values"], top_k=1)["matches"][0]["id"] == vector["id"]
+    
+    second.delete(["chunk_0"])
+    first.upsert([dict(vectors[1], values=vectors[2]["values"])])
+    assert first.stats()["total_vector_count"] == second.stats()["total_vector_count"] == 11
+    assert "chunk_0" not in {m["id"] for m in first.query(vectors[0]["values"], top_k=12)["matches"]}
+    assert {m["id"] for m in second.query(vectors[2]["values"], top_k=2)["matches"]} == {"chunk_1", "chunk_2"}
+    first.close()
+    second.close()
+
+def test_ivf_trained_by_another_process_is_picked_up(tmp_path):
+    """A store sees the IVF index another process trained, and rows it appended or moved"""
+    writer = LocalVectorStore(str(tmp_path), DIMENSION, index_type="ivf", nlist=4, nprobe=4)
+    reader = LocalVectorStore(str(tmp_path), DIMENSION, index_type="ivf", nlist=4, nprobe=4)
+    vectors = make_vectors(200)
+    assert reader.query(vectors[0]["values"], top_k=1)["matches"] == []
+    
+    writer.upsert(vectors[:160])
+    assert writer._ivf.trained
+    assert reader.query(vectors[5]["values"], top_k=1)["matches"][0]["id"] == "chunk_5"
+    assert reader._ivf.trained
+    
+    writer.upsert(vectors[160:])
+    writer.upsert([dict(vectors[5], values=(-np.asarray(vectors[5]["values"])).tolist())])
+    assert reader.query(vectors[190]["values"], top_k=1)["matches"][0]["id"] == "chunk_190"
+    flipped = (-np.asarray(vectors[5]["values"])).tolist()
+    assert reader.query(flipped, top_k=1)["matches"][0]["id"] == "chunk_5"
+    writer.close()
+    reader.close()
@@ -0,0 +1,66 @@
+import os
+import sys
+from fastapi.testclient import TestClient
+
+# Add parent directory to path to import app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import services.pinecone_service as pinecone_service
+import services.vector_store as vector_store
+from core.metrics import Histogram, STAGE_SECONDS, server_timing
+from main import app
+
+class StubIndex:
+    """Index stand-in answering every query with one chunk"""
+    
+    def describe_index_stats(self):
+        return {"dimension": 384, "total_vector_count": 1}
+    
+    def query(self, vector, top_k=10, include_metadata=True, **kwargs):
+        return {"matches": [{
+            "id": "doc_01",
+            "score": 0.9,
+            "metadata": {"id": "doc_01", "source_doc_id": "doc", "text": "Legumes fix nitrogen."}
+        }]}
+
+def test_histogram_renders_cumulative_buckets():
+    """Buckets are cumulative and end with +Inf, followed by count and sum"""
+    histogram = Histogram("test_batch_size", "Test batch sizes", ["kind"], buckets=(1, 10), registry=[])
+    histogram.observe(1, kind="a")
+    histogram.observe(5, kind="a")
+    histogram.observe(50, kind="a")
+    
+    assert histogram.collect() == [
+        "# HELP test_batch_size Test batch sizes",
+        "# TYPE test_batch_size histogram",
+        'test_batch_size_bucket{kind="a",le="1.0"} 1',
+        'test_batch_size_bucket{kind="a",le="10.0"} 2',
+        'test_batch_size_bucket{kind="a",le="+Inf"} 3',
+        'test_batch_size_count{kind="a"} 3',
+        'test_batch_size_sum{kind="a"} 56.0',
+    ]
+
+def test_server_timing_sums_repeated_stages():
+    assert server_timing([("embed", 0.002), ("vector_query", 0.01), ("embed", 0.003)], total=0.02) == (
+        "embed;dur=5.0, vector_query;dur=10.0, total;dur=20.0"
+    )
+
+def test_search_reports_stage_timings(monkeypatch):
+    """Stages timed in worker threads show up in Server-Timing and in /metrics"""
+    monkeypatch.setattr(pinecone_service, "index", StubIndex())
+    monkeypatch.setattr(vector_store, "_store", pinecone_service.PineconeVectorStore())
+    before = STAGE_SECONDS.count(stage="pinecone_query")
+    
+    client = TestClient(app)
+    response = client.post("/api/similarity_search", json={"query": "nitrogen fixation", "min_score": 0})
+    
+    assert response.status_code == 200
+    stages = [entry.split(";")[0] for entry in response.headers["Server-Timing"].split(", ")]
+    for stage in ("embed", "vector_query", "pinecone_query", "build_response", "total"):
+        assert stage in stages
+    assert STAGE_SECONDS.count(stage="pinecone_query") == before + 1
+    
+    metrics = client.get("/metrics")
+    assert metrics.status_code == 200
+    assert 'citeme_stage_duration_seconds_count{stage="pinecone_query"}' in metrics.text
+    assert 'citeme_http_request_duration_seconds_count{method="POST",route="/api/similarity_search",status="200"}' in metrics.text
@@ -0,0 +1,78 @@
+import os
+import sys
+
+# Add parent directory to path to import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import services.pinecone_service as pinecone_service
+from core.config import settings
+
+class ApiError(Exception):
+    def __init__(self, status):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+
+class FlakyIndex:
+    """Index stand-in that rate-limits each batch once and rejects batches containing 'bad'"""
+    
+    def __init__(self):
+        self.seen = set()
+        self.stored = []
+    
+    def upsert(self, vectors):
+        first_id = vectors[0]["id"]
+        if any(vector["id"] == "bad" for vector in vectors):
+            raise ApiError(400)
+        if first_id not in self.seen:
+            self.seen.add(first_id)
+            raise ApiError(429)
+        self.stored.extend(vector["id"] for vector in vectors)
+        return {"upserted_count": len(vectors)}
+
+def make_vector(vector_id, text="soil"):
+    return {"id": vector_id, "values": [0.1] * 4, "metadata": {"text": text}}
+
+def test_store_vectors_retries_transient_errors_and_reports_failed_batches(monkeypatch):
+    """Rate-limited batches are retried; a rejected batch is reported without failing the rest"""
+    index = FlakyIndex()
+    monkeypatch.setattr(pinecone_service, "index", index)
+    monkeypatch.setattr(settings, "upsert_max_batch_vectors", 3)
+    monkeypatch.setattr(settings, "upsert_retry_base_delay", 0.001)
+    
+    vectors = [make_vector(f"chunk_{i}") for i in range(7)] + [make_vector("bad")]
+    result = pinecone_service.store_vectors(vectors)
+    
+    assert result["upserted_count"] == 6
+    assert sorted(index.stored) == sorted(f"chunk_{i}" for i in range(6))
+    assert len(result["failed_batches"]) == 1
+    assert result["failed_batches"][0]["ids"] == ["chunk_6", "bad"]
+    assert "400" in result["failed_batches"][0]["error"]
+
+def test_batches_are_bounded_by_payload_bytes(monkeypatch):
+    """Large metadata shrinks batches so each request stays under the byte limit"""
+    monkeypatch.setattr(settings, "upsert_max_batch_bytes", 5000)
+    vectors = [make_vector(f"chunk_{i}", text="x" * 2000) for i in range(5)]
+    
+    batches = pinecone_service._make_batches(vectors)
+    
+    assert [len(batch) for batch in batches] == [2, 2, 1]
+    assert [v["id"] for batch in batches for v in batch] == [v["id"] for v in vectors]
+
+def test_query_vectors_pushes_filter_down_and_applies_min_score(monkeypatch):
+    """The metadata filter is sent with the query and weak matches are dropped"""
+    calls = []
+    
+    class RecordingIndex:
+        def query(self, **kwargs):
+            calls.append(kwargs)
+            return {"matches": [{"id": "a", "score": 0.8}, {"id": "b", "score": 0.2}]}
+    
+    monkeypatch.setattr(pinecone_service, "index", RecordingIndex())
+    # Possibly stale stats (e.g. an empty count cached before another worker's upsert) are not consulted
+    monkeypatch.setattr(pinecone_service, "_get_cached_stats", lambda: {"total_vector_count": 0})
+    
+    metadata_filter = {"journal": {"$in": ["Agronomy"]}}
+    results = pinecone_service.query_vectors([0.1] * 4, top_k=2, filter=metadata_filter, min_score=0.5)
+    
+    assert calls[0]["filter"] == metadata_filter
+    assert [match["id"] for match in results["matches"]] == ["a"]
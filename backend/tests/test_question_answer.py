@@ -1,3 +1,4 @@
+import json
 from fastapi.testclient import TestClient
 import pytest
 import os
@@ -53,3 +54,39 @@ def test_question_answer_endpoint():
         assert "source_doc_id" in citation
         assert "section_heading" in citation
         assert "link" in citation
+
+def test_question_answer_stream_sends_citations_then_tokens(monkeypatch):
+    """The streaming endpoint emits citations first, then answer tokens, then done"""
+    import api.qa
+    import api.search
+    
+    def fake_query_vectors(query_vector, top_k=10, include_metadata=True, **kwargs):
+        return {"matches": [{
+            "id": "mucuna_01",
+            "score": 0.9,
+            "metadata": {
+                "id": "mucuna_01", "source_doc_id": "extension_brief_mucuna.pdf", "chunk_index": 1,
+                "section_heading": "Why Grow Velvet Bean?", "journal": "Extension Brief",
+                "publish_year": 2020, "usage_count": 0, "link": "https://example.com/mucuna",
+                "text": "Velvet bean fixes nitrogen."
+            }
+        }]}
+    
+    async def fake_stream_answer(question, context):
+        for text in ["Velvet bean ", "fixes nitrogen."]:
+            yield text
+    
+    monkeypatch.setattr(api.search, "query_vectors", fake_query_vectors)
+    monkeypatch.setattr(api.qa, "stream_answer", fake_stream_answer)
+    
+    response = client.post("/api/question_answer/stream", json={"question": "Why grow velvet bean?"})
+    
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = [
+        (block.split("\n")[0][len("event: "):], json.loads(block.split("\n")[1][len("data: "):]))
+        for block in response.text.strip().split("\n\n")
+    ]
+    assert [name for name, _ in events] == ["citations", "token", "token", "done"]
+    assert events[0][1][0]["source_doc_id"] == "extension_brief_mucuna.pdf"
+    assert "".join(data["text"] for name, data in events if name == "token") == "Velvet bean fixes nitrogen."
@@ -0,0 +1,51 @@
+import os
+import subprocess
+import sys
+import time
+from fastapi.testclient import TestClient
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Add parent directory to path to import app
+sys.path.append(BACKEND_DIR)
+
+IMPORT_SCRIPT = """
+import sys, time
+start = time.perf_counter()
+import main
+print(time.perf_counter() - start)
+print("torch" in sys.modules, "sentence_transformers" in sys.modules, "openai" in sys.modules)
+"""
+
+def test_app_import_is_fast_and_skips_model_libraries():
+    """Importing the app must not load torch, the embedding model or the OpenAI SDK"""
+    env = dict(os.environ)
+    env.setdefault("OPENAI_API_KEY", "test")
+    result = subprocess.run(
+        [sys.executable, "-c", IMPORT_SCRIPT],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True
+    )
+    elapsed, loaded = result.stdout.strip().splitlines()[-2:]
+    
+    assert loaded == "False False False"
+    assert float(elapsed) < 1.0
+
+def test_ready_after_warmup(monkeypatch, tmp_path):
+    """Health answers immediately; readiness flips once the warmup batch has run"""
+    import services.jobs
+    from core.config import settings
+    from main import app
+    
+    monkeypatch.setattr(settings, "vector_store_backend", "local")
+    monkeypatch.setattr(settings, "local_vector_store_path", str(tmp_path / "vector_store"))
+    monkeypatch.setattr(settings, "ingest_jobs_db_path", str(tmp_path / "jobs.sqlite3"))
+    monkeypatch.setattr(services.jobs, "_initialized", False)
+    
+    with TestClient(app) as client:
+        assert client.get("/api/health").json() == {"status": "ok"}
+        
+        deadline = time.monotonic() + 10
+        while client.get("/api/ready").status_code != 200:
+            assert time.monotonic() < deadline, "warmup did not finish"
+            time.sleep(0.05)
+        assert client.get("/api/ready").json() == {"status": "ready"}
@@ -0,0 +1,78 @@
+import os
+import sys
+import pytest
+from fastapi.testclient import TestClient
+
+# Add parent directory to path to import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import api.search
+import services.usage_counter
+from main import app
+from services.usage_counter import UsageCounter
+
+def test_usage_counts_are_coalesced_and_survive_restart(tmp_path):
+    """Hits are applied as one increment per chunk, in batches, and journaled hits outlive the process"""
+    path = str(tmp_path / "usage.sqlite3")
+    counter = UsageCounter(path)
+    counter.record(["a", "b", "a"])
+    counter.record(["a", "c"])
+    
+    applied = []
+    assert counter.flush(applied.append, batch_size=2) == 3
+    assert sorted(applied[0].items()) + sorted(applied[1].items()) == sorted({"a": 3, "b": 1, "c": 1}.items())
+    assert all(len(batch) <= 2 for batch in applied)
+    assert counter.flush(applied.append) == 0
+    
+    counter.record(["b"])
+    counter.journal()
+    counter.close()
+    
+    reopened = UsageCounter(path)
+    assert reopened.most_used(2) == [("a", 3), ("b", 2)]
+    applied = []
+    reopened.flush(applied.append)
+    assert applied == [{"b": 1}]
+
+def test_failed_and_abandoned_flushes_are_requeued(tmp_path):
+    """A failing apply returns its increments, and a dead flush's claim is requeued after the lease"""
+    now = [1000.0]
+    path = str(tmp_path / "usage.sqlite3")
+    counter = UsageCounter(path, lease_seconds=60, clock=lambda: now[0])
+    counter.record(["a", "a", "b"])
+    
+    def failing_apply(batch):
+        raise RuntimeError("index unavailable")
+    
+    with pytest.raises(RuntimeError):
+        counter.flush(failing_apply)
+    
+    # A flush that claims the increments and never finishes (e.g. its worker died)
+    counter._claim()
+    other = UsageCounter(path, lease_seconds=60, clock=lambda: now[0])
+    applied = []
+    assert other.flush(applied.append) == 0
+    
+    now[0] += 61
+    assert other.flush(applied.append) == 2
+    assert applied == [{"a": 2, "b": 1}]
+
+def test_search_hits_are_listed_by_most_used_chunks(monkeypatch, tmp_path):
+    """Similarity search results are counted and served by the most used chunks endpoint"""
+    def fake_query_vectors(query_vector, top_k=10, include_metadata=True, **kwargs):
+        return {"matches": [
+            {"id": f"chunk_{i}", "score": 0.9 - i / 10, "metadata": {"id": f"chunk_{i}", "source_doc_id": "doc", "text": "Compost feeds soil life."}}
+            for i in range(top_k)
+        ]}
+    
+    monkeypatch.setattr(api.search, "query_vectors", fake_query_vectors)
+    monkeypatch.setattr(services.usage_counter, "_counter", UsageCounter(str(tmp_path / "usage.sqlite3")))
+    
+    client = TestClient(app)
+    for k in (1, 3, 2):
+        response = client.post("/api/similarity_search", json={"query": f"usage query {k}", "k": k, "mode": "vector"})
+        assert response.status_code == 200
+    
+    response = client.get("/api/stats/most_used_chunks", params={"limit": 2})
+    assert response.status_code == 200
+    assert response.json() == {"chunks": [{"id": "chunk_0", "usage_count": 3}, {"id": "chunk_1", "usage_count": 2}]}
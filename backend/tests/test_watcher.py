@@ -0,0 +1,158 @@
+import asyncio
+import json
+import os
+import sys
+
+# Add parent directory to path to import app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+import services.embedding_store
+import services.ingestion
+import services.watcher
+from core.config import settings
+from services.watcher import DirectoryWatcher, ProcessedFilesLog
+from utils.documents import chunk_document
+
+PAPER = """# Nitrogen fixation in legumes
+
+Legumes host rhizobia that fix atmospheric nitrogen.
+
+## Results
+
+Fixation rates rose with soil moisture.
+
+## Discussion
+
+Intercropping with cereals improved yields.
+"""
+
+@pytest.fixture
+def watched(monkeypatch, tmp_path):
+    """A watch directory, a processed-files log and captured upserts and deletes"""
+    stored, deleted = [], []
+    def store_vectors(vectors):
+        stored.extend(v["id"] for v in vectors)
+        return {"upserted_count": len(vectors), "failed_batches": []}
+    
+    monkeypatch.setattr(services.ingestion, "store_vectors", store_vectors)
+    monkeypatch.setattr(services.ingestion, "delete_vectors", deleted.extend)
+    monkeypatch.setattr(services.ingestion, "get_usage_counts", lambda ids: {})
+    monkeypatch.setattr(settings, "lexical_index_enabled", False)
+    monkeypatch.setattr(settings, "ingest_delete_vanished_chunks", True)
+    monkeypatch.setattr(settings, "embedding_store_path", str(tmp_path / "embedding_store.sqlite3"))
+    services.embedding_store.close_embedding_store()
+    
+    directory = tmp_path / "incoming"
+    directory.mkdir()
+    log = ProcessedFilesLog(str(tmp_path / "processed.sqlite3"))
+    yield directory, log, stored, deleted
+    log.close()
+    services.embedding_store.close_embedding_store()
+
+def test_chunk_document_splits_at_headings_with_sidecar_metadata(tmp_path):
+    """Documents become one chunk per section, carrying their sidecar's metadata"""
+    (tmp_path / "paper.md").write_text(PAPER)
+    (tmp_path / "paper.meta.json").write_text(json.dumps({"doc_id": "legumes", "journal": "Journal of Agronomy", "publish_year": 2020}))
+    
+    chunks = chunk_document(str(tmp_path / "paper.md"))
+    
+    assert [c["section_heading"] for c in chunks] == ["Nitrogen fixation in legumes", "Results", "Discussion"]
+    assert chunks[1]["id"] == "legumes_02_results"
+    assert {c["journal"] for c in chunks} == {"Journal of Agronomy"}
+    assert chunks[2]["text"] == "Intercropping with cereals improved yields."
+
+def test_watcher_resumes_from_log_and_reingests_changed_files(watched):
+    """Logged files are skipped on restart, changed files are ingested again"""
+    directory, log, stored, deleted = watched
+    (directory / "paper.md").write_text(PAPER)
+    (directory / "paper.meta.json").write_text(json.dumps({"doc_id": "legumes"}))
+    chunks = [{
+        "id": "soil_01", "source_doc_id": "soil", "chunk_index": 1, "section_heading": "Abstract",
+        "journal": "Soil Science", "publish_year": 2019, "usage_count": 0, "attributes": [],
+        "link": "", "text": "Soil organic matter and microbial activity."
+    }]
+    (directory / "soil.ndjson").write_text("\n".join(json.dumps(c) for c in chunks))
+    
+    watcher = DirectoryWatcher(str(directory), log, workers=0)
+    asyncio.run(watcher.run(once=True))
+    assert watcher.files_processed == 2
+    assert sorted(stored) == ["legumes_01_nitrogen-fixation-in-legumes", "legumes_02_results", "legumes_03_discussion", "soil_01"]
+    assert log.stats() == {"completed": 2}
+    
+    # A restarted daemon has nothing left to do
+    watcher = DirectoryWatcher(str(directory), log, workers=0)
+    assert watcher.scan() == []
+    
+    # Dropping the discussion re-ingests the file and deletes its chunk
+    (directory / "paper.md").write_text(PAPER.split("## Discussion")[0] + "More detail.\n")
+    asyncio.run(watcher.run(once=True))
+    assert watcher.files_processed == 1
+    assert stored[-1] == "legumes_02_results"
+    assert deleted == ["legumes_03_discussion"]
+
+def test_polling_watcher_picks_up_new_files(watched):
+    """With poll_seconds set, files added after startup are found by rescanning"""
+    directory, log, stored, deleted = watched
+    (directory / "paper.meta.json").write_text(json.dumps({"doc_id": "legumes"}))
+    watcher = DirectoryWatcher(str(directory), log, workers=0, poll_seconds=0.05)
+    
+    async def scenario():
+        task = asyncio.create_task(watcher.run())
+        await asyncio.sleep(0.1)
+        (directory / "paper.md").write_text(PAPER)
+        for _ in range(100):
+            if watcher.files_processed:
+                break
+            await asyncio.sleep(0.05)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+    
+    asyncio.run(scenario())
+    assert watcher.files_processed == 1
+    assert len(stored) == 3
+
+def test_failed_files_are_retried_after_the_backoff(watched, monkeypatch):
+    """A failed file is skipped until retry_seconds have passed, then ingested again"""
+    directory, log, stored, deleted = watched
+    (directory / "paper.md").write_text(PAPER)
+    (directory / "paper.meta.json").write_text(json.dumps({"doc_id": "legumes"}))
+    
+    async def rate_limited(*args, **kwargs):
+        raise RuntimeError("rate limited")
+    
+    monkeypatch.setattr(services.watcher, "run_ingestion_pipeline", rate_limited)
+    watcher = DirectoryWatcher(str(directory), log, workers=0)
+    asyncio.run(watcher.run(once=True))
+    assert log.stats() == {"failed": 1}
+    assert watcher.scan() == []
+    assert log.retry_due() == []
+    
+    monkeypatch.setattr(services.watcher, "run_ingestion_pipeline", services.ingestion.run_ingestion_pipeline)
+    log.retry_seconds = 0
+    assert log.retry_due() == [str(directory / "paper.md")]
+    asyncio.run(watcher.run(once=True))
+    assert log.stats() == {"completed": 1}
+    assert len(stored) == 3
+
+def test_files_with_failed_chunks_are_logged_partial_and_retried(watched, monkeypatch):
+    """A file whose chunks were not all stored is retried, and only its missing chunks are upserted"""
+    directory, log, stored, deleted = watched
+    (directory / "paper.md").write_text(PAPER)
+    (directory / "paper.meta.json").write_text(json.dumps({"doc_id": "legumes"}))
+    
+    def store_vectors(vectors):
+        stored.extend(v["id"] for v in vectors[:-1])
+        return {"upserted_count": len(vectors) - 1, "failed_batches": [{"ids": [vectors[-1]["id"]], "error": "timeout"}]}
+    
+    with monkeypatch.context() as patch:
+        patch.setattr(services.ingestion, "store_vectors", store_vectors)
+        watcher = DirectoryWatcher(str(directory), log, workers=0)
+        asyncio.run(watcher.run(once=True))
+    assert log.stats() == {"partial": 1}
+    
+    log.retry_seconds = 0
+    stored.clear()
+    asyncio.run(watcher.run(once=True))
+    assert log.stats() == {"completed": 1}
+    assert stored == ["legumes_03_discussion"]
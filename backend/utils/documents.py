@@ -0,0 +1,204 @@
+import datetime
+import json
+import os
+import re
+from utils.json_stream import JSONRecordParser
+
+# Files that already contain chunk records, one JSON object each
+CHUNK_FILE_EXTENSIONS = {".json", ".ndjson", ".jsonl"}
+# Documents that are split into chunks here
+DOCUMENT_EXTENSIONS = {".md", ".markdown", ".txt", ".pdf"}
+SUPPORTED_EXTENSIONS = CHUNK_FILE_EXTENSIONS | DOCUMENT_EXTENSIONS
+
+# Metadata for a document lives in a sidecar next to it: paper.pdf -> paper.meta.json
+METADATA_SUFFIX = ".meta.json"
+
+_HEADING_PATTERN = re.compile(r"^#{1,6}\s+(.+?)\s*#*\s*$")
+
+def is_supported_file(path):
+    """Check whether a file can be ingested
+    
+    Args:
+        path (str): File path
+    
+    Returns:
+        bool: True for chunk files and documents, False for sidecars, hidden
+            and temporary files and anything else
+    """
+    name = os.path.basename(path)
+    if name.startswith(".") or name.endswith(METADATA_SUFFIX):
+        return False
+    return os.path.splitext(name)[1].lower() in SUPPORTED_EXTENSIONS
+
+def is_chunk_file(path):
+    """Check whether a file holds chunks in the upload format rather than a document
+    
+    Args:
+        path (str): File path
+    
+    Returns:
+        bool: True for .json, .ndjson and .jsonl files
+    """
+    return os.path.splitext(path)[1].lower() in CHUNK_FILE_EXTENSIONS
+
+def slugify(text):
+    """Make a short identifier-safe slug of a heading"""
+    return re.sub(r"[^a-z0-9]+", "-", text.lower()).strip("-")[:40] or "section"
+
+def extract_document_metadata(file_path):
+    """Read a document's metadata from its sidecar file, with defaults
+    
+    Args:
+        file_path (str): Path to the document
+    
+    Returns:
+        dict: doc_id, doi, journal, publish_year and link
+    """
+    stem = os.path.splitext(os.path.basename(file_path))[0]
+    metadata = {}
+    sidecar = os.path.join(os.path.dirname(file_path), stem + METADATA_SUFFIX)
+    if os.path.exists(sidecar):
+        with open(sidecar, encoding="utf-8") as f:
+            metadata = json.load(f)
+    
+    return {
+        "doc_id": str(metadata.get("doc_id") or stem),
+        "doi": metadata.get("doi", "Unknown"),
+        "journal": metadata.get("journal", "Unknown"),
+        "publish_year": int(metadata.get("publish_year", datetime.date.today().year)),
+        "link": metadata.get("link", ""),
+        "attributes": metadata.get("attributes", {}),
+    }
+
+def extract_document_content(file_path):
+    """Extract the text of a document
+    
+    Args:
+        file_path (str): Path to a Markdown, text or PDF document
+    
+    Returns:
+        str: The document text
+    
+    Raises:
+        ImportError: For PDFs when pypdf is not installed
+    """
+    if file_path.lower().endswith(".pdf"):
+        from pypdf import PdfReader
+        return "\n\n".join(page.extract_text() or "" for page in PdfReader(file_path).pages)
+    
+    with open(file_path, encoding="utf-8", errors="replace") as f:
+        return f.read()
+
+def split_by_headings(content, default_heading="Body"):
+    """Split a document into sections at Markdown headings
+    
+    Args:
+        content (str): Document text
+        default_heading (str): Heading for text before the first heading
+    
+    Returns:
+        list: Sections as dicts with 'heading' and 'content', empty ones dropped
+    """
+    sections = []
+    heading, lines = default_heading, []
+    for line in content.splitlines():
+        match = _HEADING_PATTERN.match(line)
+        if match:
+            sections.append({"heading": heading, "content": "\n".join(lines).strip()})
+            heading, lines = match.group(1), []
+        else:
+            lines.append(line)
+    sections.append({"heading": heading, "content": "\n".join(lines).strip()})
+    return [section for section in sections if section["content"]]
+
+def split_text(text, max_chars):
+    """Split text into pieces of at most max_chars at paragraph boundaries
+    
+    Paragraphs longer than max_chars are split at sentence ends, and
+    failing that at max_chars.
+    
+    Args:
+        text (str): Text to split
+        max_chars (int): Maximum characters per piece
+    
+    Returns:
+        list: The pieces, in order
+    """
+    pieces, current = [], ""
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = paragraph.strip()
+        while len(paragraph) > max_chars:
+            cut = paragraph.rfind(". ", 0, max_chars)
+            cut = cut + 1 if cut > 0 else max_chars
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(paragraph[:cut].strip())
+            paragraph = paragraph[cut:].strip()
+        if not paragraph:
+            continue
+        if current and len(current) + 2 + len(paragraph) > max_chars:
+            pieces.append(current)
+            current = paragraph
+        else:
+            current = f"{current}\n\n{paragraph}" if current else paragraph
+    if current:
+        pieces.append(current)
+    return pieces
+
+def read_chunk_file(file_path):
+    """Read the chunk records of a JSON array or NDJSON file
+    
+    Args:
+        file_path (str): Path to the file
+    
+    Returns:
+        list: The raw chunk records
+    
+    Raises:
+        ValueError: If the file is malformed
+    """
+    parser = JSONRecordParser()
+    records = []
+    with open(file_path, encoding="utf-8") as f:
+        while text := f.read(1 << 16):
+            records.extend(parser.feed(text))
+    records.extend(parser.close())
+    return records
+
+def chunk_document(file_path, max_chars=2000):
+    """Turn a file into raw chunk records
+    
+    Chunk files are read as they are. Documents are split into sections at
+    their headings and long sections into pieces of at most max_chars, each
+    carrying the document's metadata from its sidecar file.
+    
+    Args:
+        file_path (str): Path to the file
+        max_chars (int): Maximum characters per document chunk
+    
+    Returns:
+        list: Raw chunk records, ready for the ingestion pipeline
+    """
+    if is_chunk_file(file_path):
+        return read_chunk_file(file_path)
+    
+    metadata = extract_document_metadata(file_path)
+    chunks = []
+    for section in split_by_headings(extract_document_content(file_path)):
+        for text in split_text(section["content"], max_chars):
+            index = len(chunks) + 1
+            chunks.append({
+                "id": f"{metadata['doc_id']}_{index:02d}_{slugify(section['heading'])}",
+                "source_doc_id": metadata["doc_id"],
+                "chunk_index": index,
+                "section_heading": section["heading"],
+                "doi": metadata["doi"],
+                "journal": metadata["journal"],
+                "publish_year": metadata["publish_year"],
+                "usage_count": 0,
+                "attributes": metadata["attributes"],
+                "link": metadata["link"],
+                "text": text
+            })
+    return chunks
@@ -0,0 +1,280 @@
+import codecs
+import json
+import re
+
+_WHITESPACE = re.compile(r"[ \t\r\n]*")
+# Characters that delimit the structure of a record outside strings
+_STRUCTURAL = re.compile(r'["\[\]{}]')
+# Characters that end or escape within a string
+_STRING_SPECIAL = re.compile(r'["\\]')
+# Anything that cannot appear outside strings in valid JSON
+_INVALID_BARE = re.compile(r"[^ \t\r\n0-9+\-.eE:,truefalsn]")
+# A number or literal that may still be incomplete
+_ATOM = re.compile(r"[0-9+\-.eEtruefalsn]+")
+
+class JSONRecordParser:
+    """Incremental parser for a JSON array of objects or NDJSON
+    
+    Feed it text as it arrives and it returns every record completed so far,
+    keeping only the unparsed tail in memory. The format is detected from the
+    first non-whitespace character: '[' for a JSON array, anything else for
+    newline-delimited JSON. Array records must be separated by exactly one
+    comma and NDJSON records by a newline.
+    
+    Complete records are decoded in one pass. A record split across pieces is
+    scanned for its end as the pieces arrive, resuming where the previous scan
+    stopped, and decoded once it is complete; characters that cannot appear
+    in JSON and mismatched brackets fail the scan right away.
+    
+    Args:
+        max_record_size (int): Characters a single record may span before the
+            parser gives up waiting for it to complete
+    """
+    
+    def __init__(self, max_record_size=16 << 20):
+        self.max_record_size = max_record_size
+        self._decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._mode = None  # "array" or "ndjson"
+        self._expect = "record"  # "first", "record", "separator" or "newline"
+        self._done = False
+        self.records_parsed = 0
+        # Scan state of a record split across pieces
+        self._partial = None
+        self._partial_size = 0
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+    
+    def feed(self, text):
+        """Add text and parse every complete record
+        
+        Args:
+            text (str): The next piece of the document
+            
+        Returns:
+            list: Records completed by this piece
+            
+        Raises:
+            ValueError: If the document is malformed
+        """
+        return self._parse(text, final=False)
+    
+    def close(self):
+        """Parse what is left at the end of the document
+        
+        Returns:
+            list: Records completed by the end of input
+            
+        Raises:
+            ValueError: If the document is truncated or malformed
+        """
+        records = self._parse("", final=True)
+        if self._mode == "array" and not self._done:
+            raise ValueError("Unexpected end of JSON array")
+        return records
+    
+    def _error(self, message):
+        return ValueError(f"Invalid JSON in record {self.records_parsed + 1}: {message}")
+    
+    def _scan(self, text, pos):
+        """Advance the scan of a split record through text
+        
+        Args:
+            text (str): Text continuing the record
+            pos (int): Offset in text to resume from
+        
+        Returns:
+            int or None: Offset just past the end of the record, or None if
+                text ends before the record does
+        
+        Raises:
+            ValueError: On a character that cannot appear in JSON or a
+                mismatched bracket
+        """
+        size = len(text)
+        while pos < size:
+            if self._escape:
+                self._escape = False
+                pos += 1
+                continue
+            if self._in_string:
+                match = _STRING_SPECIAL.search(text, pos)
+                if match is None:
+                    return None
+                pos = match.end()
+                if match.group() == "\\":
+                    self._escape = True
+                    continue
+                self._in_string = False
+                if not self._stack:
+                    return pos
+                continue
+            
+            match = _STRUCTURAL.search(text, pos)
+            bad = _INVALID_BARE.search(text, pos, size if match is None else match.start())
+            if bad is not None:
+                raise self._error(f"unexpected character {bad.group()!r}")
+            if match is None:
+                return None
+            pos = match.end()
+            char = match.group()
+            if char == '"':
+                self._in_string = True
+            elif char in "[{":
+                self._stack.append("]" if char == "[" else "}")
+            elif not self._stack or self._stack.pop() != char:
+                raise self._error(f"unexpected {char!r}")
+            elif not self._stack:
+                return pos
+        return None
+    
+    def _start_partial(self, text):
+        """Keep the scanned start of a split record until the rest arrives"""
+        self._partial = [text]
+        self._partial_size = len(text)
+        if self._partial_size > self.max_record_size:
+            raise self._error(f"record exceeds {self.max_record_size} characters")
+    
+    def _finish_record(self, record, records):
+        records.append(record)
+        self.records_parsed += 1
+        self._expect = "separator" if self._mode == "array" else "newline"
+    
+    def _parse(self, text, final):
+        records = []
+        
+        if self._partial is not None:
+            end = self._scan(text, 0)
+            if end is None:
+                if final:
+                    raise self._error("unexpected end of input")
+                self._partial.append(text)
+                self._partial_size += len(text)
+                if self._partial_size > self.max_record_size:
+                    raise self._error(f"record exceeds {self.max_record_size} characters")
+                return records
+            
+            self._partial.append(text[:end])
+            record_text = "".join(self._partial)
+            self._partial = None
+            try:
+                record, _ = self._decoder.raw_decode(record_text)
+            except json.JSONDecodeError as e:
+                raise self._error(e.msg) from e
+            self._finish_record(record, records)
+            text = text[end:]
+        
+        buffer = self._buffer + text
+        pos = 0
+        while True:
+            whitespace = _WHITESPACE.match(buffer, pos)
+            if self._expect == "newline" and "\n" in whitespace.group():
+                self._expect = "record"
+            pos = whitespace.end()
+            if pos == len(buffer):
+                break
+            
+            if self._done:
+                raise ValueError(f"Unexpected data after JSON array at offset {pos}")
+            
+            char = buffer[pos]
+            if self._mode is None:
+                if char == "[":
+                    self._mode = "array"
+                    self._expect = "first"
+                    pos += 1
+                    continue
+                self._mode = "ndjson"
+            
+            if self._mode == "array":
+                if char == "]" and self._expect != "record":
+                    self._done = True
+                    pos += 1
+                    continue
+                if char == "," and self._expect == "separator":
+                    self._expect = "record"
+                    pos += 1
+                    continue
+                if self._expect == "separator" or char in ",]":
+                    raise ValueError(f"Unexpected {char!r} after record {self.records_parsed} of the JSON array")
+            elif self._expect == "newline":
+                raise ValueError(f"Expected a newline after NDJSON record {self.records_parsed}")
+            
+            try:
+                record, end = self._decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError as e:
+                if char in '{["':
+                    # Either invalid or not complete yet: scan to tell which
+                    self._stack, self._in_string, self._escape = [], False, False
+                    if self._scan(buffer, pos) is not None:
+                        raise self._error(e.msg) from e
+                    if final:
+                        raise self._error("unexpected end of input") from e
+                    self._start_partial(buffer[pos:])
+                    pos = len(buffer)
+                    break
+                if final or _ATOM.fullmatch(buffer, pos) is None:
+                    raise self._error(e.msg) from e
+                break
+            
+            # A number or literal may continue in the next piece
+            if end == len(buffer) and not final and not isinstance(record, (dict, list, str)):
+                break
+            
+            self._finish_record(record, records)
+            pos = end
+        
+        self._buffer = buffer[pos:]
+        return records
+
+async def iter_json_records(upload_file, chunk_size=1 << 16):
+    """Yield records from an uploaded JSON array or NDJSON file without loading it whole
+    
+    Args:
+        upload_file: Object with an async read(size) method, such as fastapi.UploadFile
+        chunk_size (int): Bytes read per step
+        
+    Yields:
+        Any: Each top-level record in the file
+        
+    Raises:
+        ValueError: If the document is malformed
+    """
+    parser = JSONRecordParser()
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    
+    while True:
+        data = await upload_file.read(chunk_size)
+        if not data:
+            break
+        for record in parser.feed(decoder.decode(data)):
+            yield record
+    
+    for record in parser.feed(decoder.decode(b"", final=True)) + parser.close():
+        yield record
+
+def read_first_record(file_obj, chunk_size=1 << 16):
+    """Parse only the first record of a binary JSON array or NDJSON file
+    
+    Args:
+        file_obj: Binary file object, positioned at the start of the document
+        chunk_size (int): Bytes read per step
+        
+    Returns:
+        Any: The first record, or None if the document holds no records
+        
+    Raises:
+        ValueError: If the start of the document is malformed
+    """
+    parser = JSONRecordParser()
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    
+    while True:
+        data = file_obj.read(chunk_size)
+        records = parser.feed(decoder.decode(data, final=not data))
+        if records:
+            return records[0]
+        if not data:
+            records = parser.close()
+            return records[0] if records else None
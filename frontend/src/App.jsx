@@ -1,41 +1,56 @@
-import { useState, useEffect } from 'react'
+import { useState, useEffect, useRef } from 'react'
 import QuestionForm from './components/QuestionForm'
 import AnswerDisplay from './components/AnswerDisplay'
 import CitationChart from './components/CitationChart'
 import DarkModeToggle from './components/DarkModeToggle'
-import { getAnswer } from './services/api'
+import { streamAnswer } from './services/api'
 
 function App() {
   const [isLoading, setIsLoading] = useState(false)
+  const [isStreaming, setIsStreaming] = useState(false)
   const [error, setError] = useState(null)
   const [answerData, setAnswerData] = useState(null)
   const [sessionCitations, setSessionCitations] = useState([])
+  const streamRef = useRef(null)
 
-  // Update session citations whenever we get new answer data with citations
-  useEffect(() => {
-    if (answerData && answerData.citations && answerData.citations.length > 0) {
-      // Track the new answer's citations separately to avoid duplicate counting
-      const newCitations = answerData.citations.map(citation => ({
-        ...citation,
-        answerId: Date.now() // Add a unique ID to group citations by answer
-      }));
-      setSessionCitations(prevCitations => [...prevCitations, ...newCitations]);
-    }
-  }, [answerData])
+  // Stop any in-flight answer stream when the app unmounts
+  useEffect(() => () => streamRef.current?.abort(), [])
 
-  const handleQuestionSubmit = async (question) => {
+  const handleQuestionSubmit = (question) => {
+    // A new question cancels the previous answer's generation
+    streamRef.current?.abort()
     setIsLoading(true)
+    setIsStreaming(true)
     setError(null)
-    
-    try {
-      const data = await getAnswer(question)
-      setAnswerData(data)
-    } catch (err) {
-      setError(err.message || 'Failed to get answer. Please try again.')
-      setAnswerData(null)
-    } finally {
-      setIsLoading(false)
-    }
+    setAnswerData(null)
+
+    streamRef.current = streamAnswer(question, {
+      onCitations: (citations) => {
+        // Citations arrive as soon as retrieval finishes, before the answer
+        setIsLoading(false)
+        setAnswerData({ answer: '', citations })
+        if (citations.length > 0) {
+          // Track the new answer's citations separately to avoid duplicate counting
+          const answerId = Date.now() // Add a unique ID to group citations by answer
+          setSessionCitations(prevCitations => [
+            ...prevCitations,
+            ...citations.map(citation => ({ ...citation, answerId })),
+          ])
+        }
+      },
+      onToken: (text) => {
+        setAnswerData(prev => ({ ...prev, answer: prev.answer + text }))
+      },
+      onDone: () => {
+        setIsStreaming(false)
+      },
+      onError: (err) => {
+        setError(err.message || 'Failed to get answer. Please try again.')
+        setAnswerData(null)
+        setIsLoading(false)
+        setIsStreaming(false)
+      },
+    })
   }
 
   return (
@@ -53,7 +68,7 @@ function App() {
           <div className="bg-white dark:bg-gray-800 rounded-xl shadow-md hover:shadow-lg transition-shadow duration-300 border border-gray-200 dark:border-gray-700 p-6">
             <QuestionForm 
               onSubmit={handleQuestionSubmit} 
-              isLoading={isLoading} 
+              isLoading={isLoading || isStreaming} 
             />
           </div>
           
@@ -82,6 +97,7 @@ function App() {
                   <AnswerDisplay 
                     answer={answerData.answer} 
                     citations={answerData.citations} 
+                    isStreaming={isStreaming}
                   />
                 </div>
               </div>
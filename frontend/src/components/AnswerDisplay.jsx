@@ -2,22 +2,28 @@ import { useState } from 'react';
 
 /**
  * Component for displaying the answer with citations
+ * While isStreaming is true the answer is still arriving and is rendered progressively
  */
-const AnswerDisplay = ({ answer, citations }) => {
+const AnswerDisplay = ({ answer, citations, isStreaming = false }) => {
   const [showCitations, setShowCitations] = useState(true);
 
-  if (!answer) {
+  if (!answer && !isStreaming) {
     return null;
   }
 
+  const paragraphs = (answer || '').split('\n');
+
   return (
     <div className="space-y-6">
       <div>
         <h2 className="text-xl font-semibold text-gray-800 dark:text-gray-100 mb-4">Answer</h2>
         <div className="prose prose-blue max-w-none text-gray-700 dark:text-gray-300">
-          {answer.split('\n').map((paragraph, i) => (
+          {paragraphs.map((paragraph, i) => (
             paragraph ? <p key={i} className="mb-4">{paragraph}</p> : <br key={i} />
           ))}
+          {isStreaming && (
+            <span className="inline-block w-2 h-5 align-text-bottom bg-gray-500 dark:bg-gray-400 animate-pulse" aria-label="Generating answer" />
+          )}
         </div>
       </div>
 
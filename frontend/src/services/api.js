@@ -37,6 +37,100 @@ export const getAnswer = async (question, k = 10, minScore = 0.25) => {
   }
 };
 
+/**
+ * Parse one Server-Sent Event block into its event name and JSON payload
+ * @param {string} block - Raw event text without the trailing blank line
+ * @returns {{event: string, data: any} | null} - Parsed event, or null for comments/keep-alives
+ */
+const parseSseEvent = (block) => {
+  let event = 'message';
+  const dataLines = [];
+
+  block.split('\n').forEach((line) => {
+    if (line.startsWith('event:')) {
+      event = line.slice(6).trim();
+    } else if (line.startsWith('data:')) {
+      dataLines.push(line.slice(5).trimStart());
+    }
+  });
+
+  if (dataLines.length === 0) {
+    return null;
+  }
+  return { event, data: JSON.parse(dataLines.join('\n')) };
+};
+
+/**
+ * Stream an answer from the API as it is generated
+ * @param {string} question - The user's question
+ * @param {object} handlers - Callbacks: onCitations(citations), onToken(text), onDone(), onError(error)
+ * @param {number} k - Number of results to retrieve (default: 10)
+ * @param {number} minScore - Minimum similarity score (default: 0.25)
+ * @returns {AbortController} - Abort it to stop the stream; the server then cancels generation
+ */
+export const streamAnswer = (question, handlers, k = 10, minScore = 0.25) => {
+  const { onCitations, onToken, onDone, onError } = handlers;
+  const controller = new AbortController();
+
+  const run = async () => {
+    const response = await fetch(`${API_URL}/api/question_answer/stream`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+        Accept: 'text/event-stream',
+      },
+      body: JSON.stringify({
+        question,
+        k,
+        min_score: minScore,
+      }),
+      signal: controller.signal,
+    });
+
+    if (!response.ok) {
+      const errorData = await response.json();
+      throw new Error(errorData.detail || 'Failed to get answer');
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    for (;;) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+
+      let boundary;
+      while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+        const parsed = parseSseEvent(buffer.slice(0, boundary));
+        buffer = buffer.slice(boundary + 2);
+        if (!parsed) continue;
+
+        if (parsed.event === 'citations') {
+          onCitations?.(parsed.data);
+        } else if (parsed.event === 'token') {
+          onToken?.(parsed.data.text);
+        } else if (parsed.event === 'done') {
+          onDone?.();
+          return;
+        } else if (parsed.event === 'error') {
+          throw new Error(parsed.data.detail || 'Failed to get answer');
+        }
+      }
+    }
+    onDone?.();
+  };
+
+  run().catch((error) => {
+    if (error.name === 'AbortError') return;
+    console.error('Error streaming answer:', error);
+    onError?.(error);
+  });
+
+  return controller;
+};
+
 /**
  * Perform a direct similarity search
  * @param {string} query - The search query